@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+import metrics
+
+class ArtifactCache:
+    def __init__(self, cache_dir: str = "cache", max_size_gb: float = 20.0, max_age_days: float = 30.0):
+        """初始化跨运行的产物缓存
+
+        缓存键由 arxiv_id 和生成该产物的全部输入（提示词、模型名、
+        参考音色、编码参数等）的哈希组成，输入不变时直接复用上次的产物。
+
+        Args:
+            cache_dir: 缓存目录
+            max_size_gb: 缓存总大小上限（GB），0表示不限
+            max_age_days: 缓存条目的最长保留天数，0表示不限
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_gb * 1024 ** 3)
+        self.max_age_seconds = max_age_days * 86400
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(arxiv_id: str, **inputs: Any) -> str:
+        """根据论文ID和生成输入计算缓存键
+
+        Args:
+            arxiv_id: 论文ID
+            inputs: 影响产物内容的所有输入
+
+        Returns:
+            缓存键
+        """
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return f"{arxiv_id.replace('/', '_')}-{digest.hexdigest()[:32]}"
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        """计算文件内容的哈希，用于以上游产物作为输入的阶段"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_path(self, stage: str, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, stage, f"{key}{ext}")
+
+    def _count(self, stage: str, field: str):
+        with self._lock:
+            stage_stats = self.stats.setdefault(stage, {"hits": 0, "misses": 0, "stores": 0})
+            stage_stats[field] += 1
+        metrics.count(f"cache.{stage}.{field}")
+
+    def fetch(self, stage: str, key: str, output_path: str) -> bool:
+        """尝试从缓存恢复产物到指定路径
+
+        Args:
+            stage: 阶段名
+            key: 缓存键
+            output_path: 产物输出路径
+
+        Returns:
+            命中缓存时返回True
+        """
+        entry = self._entry_path(stage, key, os.path.splitext(output_path)[1])
+        if not os.path.exists(entry):
+            self._count(stage, "misses")
+            return False
+
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            # 复制而不是硬链接: 各阶段之后会原地重写输出文件，共用inode会把缓存条目一起改掉
+            temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copy2(entry, temp_path)
+            os.replace(temp_path, output_path)
+            # 更新访问时间，供按最近使用淘汰
+            os.utime(entry)
+        except OSError as e:
+            print(f"读取缓存失败: {e}")
+            self._count(stage, "misses")
+            return False
+
+        self._count(stage, "hits")
+        return True
+
+    def store(self, stage: str, key: str, path: str):
+        """将新生成的产物写入缓存
+
+        Args:
+            stage: 阶段名
+            key: 缓存键
+            path: 产物文件路径
+        """
+        entry = self._entry_path(stage, key, os.path.splitext(path)[1])
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            temp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copy2(path, temp_path)
+            os.replace(temp_path, entry)
+        except OSError as e:
+            print(f"写入缓存失败: {e}")
+            return
+        self._count(stage, "stores")
+
+    def evict(self) -> int:
+        """按存放时间和总大小淘汰缓存条目
+
+        先删除超过最长保留天数的条目，再按最近使用时间从旧到新删除，
+        直到总大小低于上限。
+
+        Returns:
+            删除的条目数
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        now = time.time()
+        removed = 0
+        total_size = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            expired = self.max_age_seconds > 0 and now - mtime > self.max_age_seconds
+            oversized = self.max_size_bytes > 0 and total_size > self.max_size_bytes
+            if not expired and not oversized:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+
+        if removed:
+            print(f"已淘汰{removed}个缓存条目，当前缓存大小 {total_size / 1024 ** 2:.1f}MB")
+        return removed
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        """打印并返回本次运行各阶段的缓存命中情况"""
+        print("\n缓存命中统计:")
+        for stage, stage_stats in sorted(self.stats.items()):
+            total = stage_stats["hits"] + stage_stats["misses"]
+            rate = stage_stats["hits"] / total * 100 if total else 0.0
+            print(f"  {stage}: 命中 {stage_stats['hits']} / 未命中 {stage_stats['misses']} "
+                  f"(命中率 {rate:.0f}%), 新写入 {stage_stats['stores']}")
+        return self.stats
@@ -1,64 +1,351 @@
 import arxiv
 import datetime
 import os
+import re
 import json
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Iterator, Optional, Set
+
+# 已处理论文索引的保留窗口，早于高水位线这么久的记录不会再被查询到
+PROCESSED_RETENTION_DAYS = 7
+
+def load_papers(path: str) -> List[Dict[str, Any]]:
+    """读取保存的论文列表，支持JSON和逐篇追加写入的JSON Lines文件
+    
+    Args:
+        path: 论文文件路径
+        
+    Returns:
+        论文信息字典列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            # 获取中断时最后一行可能不完整
+            papers = []
+            for line in f:
+                try:
+                    papers.append(json.loads(line))
+                except ValueError:
+                    break
+            return papers
+        return json.load(f)
 
 class ArxivPaperFetcher:
-    def __init__(self, save_dir: str = "data"):
+    def __init__(self, save_dir: str = "data", state_file: Optional[str] = None, page_size: int = 100,
+                 delay_seconds: float = 3.0, retries: int = 3, backoff: float = 5.0, store: Any = None,
+                 export_json: bool = False):
         """初始化ArXiv论文获取器
         
         Args:
             save_dir: 保存数据的目录
+            state_file: 增量获取状态文件，默认为save_dir下的fetch_state.json
+            page_size: 每次请求获取的论文数
+            delay_seconds: 两次请求之间的最短间隔（秒），arXiv API要求至少3秒
+            retries: 一页请求失败后的最大重试次数
+            backoff: 重试的初始等待时间（秒），每次重试翻倍
+            store: 论文库（PaperStore）。设置时论文、每天获取的论文列表和已处理索引都以论文库为准，
+                增量获取的高水位线仍保存在state_file中；为None时全部保存在文件中
+            export_json: 有论文库时是否仍把当天的论文导出为JSON文件，没有论文库时总会写文件
         """
         self.save_dir = save_dir
+        self.state_file = state_file or os.path.join(save_dir, "fetch_state.json")
+        self.page_size = page_size
+        self.delay_seconds = delay_seconds
+        self.retries = retries
+        self.backoff = backoff
+        self.store = store
+        self.export_json = export_json or store is None
+        # 每个类别最近一次获取到的论文，用于推进高水位线
+        self._last_fetched: Dict[str, List[Dict[str, Any]]] = {}
         os.makedirs(save_dir, exist_ok=True)
         
-    def fetch_daily_papers(self, category: str = "cs.AI", max_results: int = 10) -> List[Dict[str, Any]]:
+    def fetch_daily_papers(self, category: str = "cs.AI", max_results: int = 10, incremental: bool = False,
+                           save: bool = True) -> List[Dict[str, Any]]:
         """获取每日最新的AI领域论文
         
         Args:
             category: arXiv类别，默认为cs.AI（人工智能）
             max_results: 获取的论文数量
+            incremental: 是否只获取上次高水位线之后、且尚未处理过的论文
+            save: 是否保存为当天获取的论文（写入论文库，或导出为JSON文件）
             
         Returns:
             包含论文信息的字典列表
         """
-        # 获取今天的日期
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        papers = list(self.iter_papers(category, max_results, incremental=incremental, save=False))
+        if save:
+            self._save_papers(papers)
+        else:
+            print(f"已获取{category}的{len(papers)}篇论文")
+        return papers
+    
+    def iter_papers(self, category: str = "cs.AI", max_results: int = 10, incremental: bool = False,
+                    save: bool = True) -> Iterator[Dict[str, Any]]:
+        """逐页获取论文，每篇论文到达后立即产出
         
-        # 构建查询
+        下游不必等全部论文获取完就可以开始处理第一页。某一页请求失败时按指数退避重试，
+        从失败的位置继续获取，已产出的论文不会重复产出。
+        
+        Args:
+            category: arXiv类别
+            max_results: 获取的论文数量
+            incremental: 是否只获取上次高水位线之后、且尚未处理过的论文
+            save: 是否边获取边保存为当天获取的论文，论文库按页批量写入，JSON Lines文件逐篇追加
+            
+        Yields:
+            论文信息字典
+            
+        Raises:
+            arxiv.ArxivError: 重试后仍然失败
+        """
+        query = f"cat:{category}"
+        processed = set()
+        sort_order = arxiv.SortOrder.Descending
+        if incremental:
+            category_state = self._load_state().get(category, {})
+            processed = self._processed_ids(category_state)
+            high_water_mark = category_state.get("high_water_mark")
+            if high_water_mark:
+                # 只查询高水位线之后提交的论文，边界处的重复由已处理索引过滤
+                now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M")
+                query = f"{query} AND submittedDate:[{high_water_mark} TO {now}]"
+                # 从高水位线起按提交时间正序获取: 新论文多于max_results时本次处理最早的一批，
+                # 高水位线只越过确实获取到的论文，其余的留给下次运行
+                sort_order = arxiv.SortOrder.Ascending
+                print(f"增量获取 {category} 中 {high_water_mark} 之后提交的论文")
+        
+        # 构建查询，增量获取时已处理的论文不占max_results的名额，一直翻页到获取够新论文为止
         search = arxiv.Search(
-            query=f"cat:{category}",
-            max_results=max_results,
+            query=query,
+            max_results=float("inf") if incremental else max_results,
             sort_by=arxiv.SortCriterion.SubmittedDate,
-            sort_order=arxiv.SortOrder.Descending
+            sort_order=sort_order
         )
+        # 重试由这里按指数退避处理，arxiv库自带的重试没有退避
+        client = arxiv.Client(page_size=self.page_size, delay_seconds=self.delay_seconds, num_retries=0)
+        
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        output_file = None
+        if save and self.export_json:
+            output_file = os.path.join(self.save_dir, f"arxiv_papers_{today}.jsonl")
         
         papers = []
-        for result in search.results():
-            # 提取论文信息
-            paper_info = {
-                "title": result.title,
-                "authors": [author.name for author in result.authors],
-                "affiliations": [getattr(author, 'affiliation', '') for author in result.authors],
-                "summary": result.summary,
-                "published": result.published.strftime("%Y-%m-%d"),
-                "updated": result.updated.strftime("%Y-%m-%d"),
-                "arxiv_id": result.entry_id.split('/')[-1],
-                "pdf_url": result.pdf_url,
-                "primary_category": result.primary_category,
-                "categories": result.categories
-            }
-            papers.append(paper_info)
-        
-        # 保存到JSON文件
-        output_file = os.path.join(self.save_dir, f"arxiv_papers_{today}.json")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(papers, f, ensure_ascii=False, indent=2)
+        # 尚未写入论文库的论文，每满一页批量写入一次
+        unsaved = []
+        saved_pages = 0
+        
+        def flush():
+            nonlocal unsaved, saved_pages
+            self.store.upsert_papers(unsaved)
+            # 第一页替换当天的记录，之后的页追加
+            self.store.set_daily(today, unsaved, append=saved_pages > 0)
+            saved_pages += 1
+            unsaved = []
+        
+        seen = set()
+        offset = 0
+        failures = 0
+        out = open(output_file, 'w', encoding='utf-8') if output_file else None
+        results = client.results(search, offset=offset)
+        try:
+            while len(papers) < max_results:
+                # 只有向arXiv请求下一页时的失败才重试，处理论文时的错误直接抛出
+                try:
+                    result = next(results)
+                except StopIteration:
+                    break
+                # arxiv 1.4.x在连接失败时访问不存在的feed.status，表现为AttributeError
+                except (arxiv.ArxivError, OSError, AttributeError) as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    wait = self.backoff * 2 ** (failures - 1)
+                    print(f"获取{category}第{offset + 1}篇起的论文失败: {e}，{wait:.0f}秒后重试（第{failures}次）")
+                    time.sleep(wait)
+                    # 失败的生成器已经结束，从下一篇未处理的论文重新请求
+                    results = client.results(search, offset=offset)
+                    continue
+                failures = 0
+                paper_info = self._paper_info(result)
+                base_id = self._base_id(paper_info["arxiv_id"])
+                if base_id in processed or base_id in seen:
+                    offset += 1
+                    continue
+                seen.add(base_id)
+                papers.append(paper_info)
+                if out is not None:
+                    out.write(json.dumps(paper_info, ensure_ascii=False) + "\n")
+                    out.flush()
+                if save and self.store is not None:
+                    unsaved.append(paper_info)
+                    if len(unsaved) >= self.page_size:
+                        flush()
+                # 论文保存之后才推进位置，重试时不会跳过它
+                offset += 1
+                yield paper_info
+        finally:
+            if out is not None:
+                out.close()
+            if unsaved or (save and self.store is not None and not saved_pages):
+                flush()
+        
+        self._last_fetched[category] = papers
+        if save:
+            print(f"已获取{category}的{len(papers)}篇论文并保存到 {output_file or self.store.db_path}")
+    
+    @staticmethod
+    def _paper_info(result: arxiv.Result) -> Dict[str, Any]:
+        """提取论文信息"""
+        return {
+            "title": result.title,
+            "authors": [author.name for author in result.authors],
+            "affiliations": [getattr(author, 'affiliation', '') for author in result.authors],
+            "summary": result.summary,
+            "published": result.published.strftime("%Y-%m-%d"),
+            "published_at": result.published.strftime("%Y%m%d%H%M"),
+            "updated": result.updated.strftime("%Y-%m-%d"),
+            "arxiv_id": result.entry_id.split('/')[-1],
+            "pdf_url": result.pdf_url,
+            "primary_category": result.primary_category,
+            "categories": result.categories
+        }
+    
+    def fetch_categories(self, categories: List[str], max_results: int = 10, incremental: bool = False) -> List[Dict[str, Any]]:
+        """获取多个类别的论文并按论文ID去重
+        
+        交叉列出的论文只保留一份，之后的海报、文案、语音和视频都只生成一次。
+        
+        Args:
+            categories: arXiv类别列表
+            max_results: 每个类别获取的论文数量
+            incremental: 是否增量获取
             
-        print(f"已获取{len(papers)}篇论文并保存到 {output_file}")
+        Returns:
+            去重后的论文列表，按类别顺序、类别内按提交时间排列
+        """
+        papers = []
+        seen = set()
+        for category in categories:
+            for paper in self.fetch_daily_papers(category, max_results, incremental=incremental, save=False):
+                base_id = self._base_id(paper["arxiv_id"])
+                if base_id in seen:
+                    continue
+                seen.add(base_id)
+                papers.append(paper)
+        total = sum(len(self._last_fetched.get(category, [])) for category in categories)
+        if total > len(papers):
+            print(f"{total - len(papers)}篇交叉列出的论文已去重")
+        self._save_papers(papers)
         return papers
+    
+    def _save_papers(self, papers: List[Dict[str, Any]]):
+        """保存为当天获取的论文: 写入论文库，需要时导出为当天的JSON文件"""
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        destinations = []
+        if self.store is not None:
+            self.store.upsert_papers(papers)
+            self.store.set_daily(today, papers)
+            destinations.append(self.store.db_path)
+        if self.export_json:
+            output_file = os.path.join(self.save_dir, f"arxiv_papers_{today}.json")
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(papers, f, ensure_ascii=False, indent=2)
+            destinations.append(output_file)
+            
+        print(f"已获取{len(papers)}篇论文并保存到 {'、'.join(destinations)}")
+    
+    def load_daily(self, day: str) -> List[Dict[str, Any]]:
+        """读取某天获取的论文，有论文库时以论文库为准，其中没有记录时读取该天导出的文件
+        
+        Args:
+            day: 日期（YYYY-MM-DD）
+            
+        Returns:
+            论文信息字典列表，该天没有获取过论文时为空列表
+        """
+        if self.store is not None:
+            papers = self.store.daily(day)
+            if papers:
+                return papers
+        # 同一天可能既有流式写入的.jsonl又有非流式运行写入的.json，以较新的为准，同样新时取.jsonl
+        paths = [os.path.join(self.save_dir, f"arxiv_papers_{day}{ext}") for ext in (".jsonl", ".json")]
+        paths = [path for path in paths if os.path.exists(path)]
+        if paths:
+            return load_papers(max(paths, key=os.path.getmtime))
+        return []
+    
+    def _processed_ids(self, category_state: Dict[str, Any]) -> Set[str]:
+        """已处理的论文ID（去掉版本号），有论文库时以其中的processed记录为准"""
+        # 启用论文库之前写入状态文件的记录仍然有效
+        processed = set(category_state.get("processed", {}))
+        if self.store is not None:
+            processed.update(self.store.with_status("processed", "done"))
+        return processed
+    
+    def mark_processed(self, category: str, papers: List[Dict[str, Any]]):
+        """记录已处理完成的论文并推进该类别的高水位线
+        
+        高水位线推进到本次获取的最新论文，但不会越过本次获取却未处理成功的论文，
+        以便它们在下次增量运行时被重新获取。
+        
+        Args:
+            category: arXiv类别
+            papers: 已处理完成的论文列表
+        """
+        state = self._load_state()
+        category_state = state.setdefault(category, {"high_water_mark": None, "processed": {}})
+        processed = category_state.setdefault("processed", {})
+        if self.store is not None:
+            self.store.set_artifacts([{"arxiv_id": paper["arxiv_id"], "stage": "processed", "status": "done"}
+                                      for paper in papers])
+        else:
+            for paper in papers:
+                processed[self._base_id(paper["arxiv_id"])] = paper["published_at"]
+        processed_ids = self._processed_ids(category_state)
+        
+        fetched = self._last_fetched.get(category, [])
+        pending = [p["published_at"] for p in fetched if self._base_id(p["arxiv_id"]) not in processed_ids]
+        if pending:
+            new_mark = min(pending)
+        else:
+            marks = [p["published_at"] for p in fetched + papers]
+            new_mark = max(marks) if marks else None
+        old_mark = category_state.get("high_water_mark")
+        if new_mark and (not old_mark or new_mark > old_mark):
+            category_state["high_water_mark"] = new_mark
+        
+        # 清理远早于高水位线的已处理记录，避免索引无限增长
+        high_water_mark = category_state["high_water_mark"]
+        if high_water_mark:
+            cutoff = datetime.datetime.strptime(high_water_mark, "%Y%m%d%H%M") - datetime.timedelta(days=PROCESSED_RETENTION_DAYS)
+            cutoff_mark = cutoff.strftime("%Y%m%d%H%M")
+            category_state["processed"] = {k: v for k, v in processed.items() if v >= cutoff_mark}
+        
+        self._save_state(state)
+        print(f"{category} 的高水位线更新为 {high_water_mark}，已处理索引共{len(processed_ids)}篇")
+    
+    def _load_state(self) -> Dict[str, Any]:
+        """读取增量获取状态"""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取增量获取状态失败，将重新全量获取: {e}")
+            return {}
+    
+    def _save_state(self, state: Dict[str, Any]):
+        """原子地写入增量获取状态"""
+        temp_file = f"{self.state_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+    
+    @staticmethod
+    def _base_id(arxiv_id: str) -> str:
+        """去掉版本号后的论文ID，新版本不视为新论文"""
+        return re.sub(r"v\d+$", "", arxiv_id)
 
 if __name__ == "__main__":
     fetcher = ArxivPaperFetcher()
@@ -0,0 +1,224 @@
+import os
+import numpy as np
+import soundfile as sf
+from typing import Dict, Any, Optional, Tuple
+
+class _LinearResampler:
+    """分块线性插值重采样，块与块之间保持连续"""
+
+    def __init__(self, in_rate: int, out_rate: int):
+        self.step = in_rate / out_rate
+        # 下一个输出样本在当前块中的输入位置，可以落在上一块最后一个样本与当前块之间（-1到0）
+        self.pos = 0.0
+        self.prev: Optional[np.ndarray] = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self.step == 1.0 or len(block) == 0:
+            return block
+        if self.prev is None:
+            buffer, offset = block, 0
+        else:
+            buffer, offset = np.concatenate([self.prev, block]), 1
+        last = len(block) - 1
+        count = int(np.floor((last - self.pos) / self.step)) + 1 if last >= self.pos else 0
+        positions = self.pos + np.arange(count) * self.step + offset
+        index = np.floor(positions).astype(np.int64)
+        frac = (positions - index)[:, None].astype(np.float32)
+        upper = np.minimum(index + 1, len(buffer) - 1)
+        output = buffer[index] * (1 - frac) + buffer[upper] * frac
+        self.pos += count * self.step - len(block)
+        self.prev = block[-1:]
+        return output
+
+class _LowPassFilter:
+    """分块FIR低通滤波（Blackman窗sinc），降采样前滤掉新奈奎斯特频率以上的成分，避免混叠到可听频段
+
+    输出按滤波器延迟对齐到输入，最后调用flush取出剩余的样本，总长度与输入相同。
+    """
+
+    def __init__(self, cutoff: float, channels: int, taps: int = 255):
+        """
+        Args:
+            cutoff: 截止频率与输入采样率之比（0到0.5）
+            channels: 声道数
+            taps: 滤波器长度，越长过渡带越窄
+        """
+        self.channels = channels
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(taps)
+        self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        self.delay = (taps - 1) // 2
+        self.skip = self.delay
+        # 上一块末尾的taps-1个输入样本
+        self.history: Optional[np.ndarray] = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self.history is None:
+            self.history = np.zeros((len(self.kernel) - 1, self.channels), dtype=np.float32)
+        buffer = np.concatenate([self.history, block])
+        output = np.stack([np.convolve(buffer[:, channel], self.kernel, mode='valid')
+                           for channel in range(buffer.shape[1])], axis=1)
+        self.history = buffer[len(buffer) - len(self.history):]
+        if self.skip:
+            dropped = min(self.skip, len(output))
+            output = output[dropped:]
+            self.skip -= dropped
+        return output
+
+    def flush(self) -> np.ndarray:
+        if self.history is None:
+            # 没有任何输入（空文件）
+            return np.zeros((0, self.channels), dtype=np.float32)
+        return self.process(np.zeros((self.delay, self.channels), dtype=np.float32))
+
+class AudioPostProcessor:
+    def __init__(self, target_rate: int = 44100, channels: int = 2, target_db: float = -20.0,
+                 peak_db: float = -1.0, max_gain_db: float = 20.0, silence_db: float = -45.0,
+                 keep_silence: float = 0.15, pad_seconds: float = 0.0, block_frames: int = 65536):
+        """初始化音频后处理
+
+        对CosyVoice、系统TTS和静音备用方案生成的音频统一做响度归一化、首尾静音裁剪、
+        重采样和声道转换，并可在末尾加入论文之间的停顿。音频按块读写，内存占用与音频长度无关。
+
+        默认输出44.1kHz立体声，与视频编码的音频参数一致，编码和拼接时不需要再重采样。
+
+        Args:
+            target_rate: 输出采样率
+            channels: 输出声道数
+            target_db: 有声部分的目标RMS电平（dBFS）
+            peak_db: 峰值上限（dBFS），增益不会使峰值超过该值
+            max_gain_db: 最大增益（dB），避免把底噪放大成噪声
+            silence_db: 低于该RMS电平（dBFS）的10毫秒窗口视为静音
+            keep_silence: 裁剪首尾静音时保留的余量（秒）
+            pad_seconds: 末尾追加的静音时长（秒），用作论文之间的停顿
+            block_frames: 每次读写的帧数
+        """
+        self.target_rate = target_rate
+        self.channels = channels
+        self.target_db = target_db
+        self.peak_db = peak_db
+        self.max_gain_db = max_gain_db
+        self.silence_db = silence_db
+        self.keep_silence = keep_silence
+        self.pad_seconds = pad_seconds
+        self.block_frames = block_frames
+
+    def settings(self) -> Dict[str, Any]:
+        """影响输出内容的全部参数，用于计算缓存键"""
+        return {
+            "target_rate": self.target_rate, "channels": self.channels, "target_db": self.target_db,
+            "peak_db": self.peak_db, "max_gain_db": self.max_gain_db, "silence_db": self.silence_db,
+            "keep_silence": self.keep_silence, "pad_seconds": self.pad_seconds,
+        }
+
+    def _analyze(self, f: sf.SoundFile) -> Tuple[int, int, float]:
+        """第一遍扫描: 按10毫秒窗口统计能量和峰值，确定裁剪范围和增益
+
+        Returns:
+            (保留部分的起始帧, 结束帧, 线性增益)
+        """
+        window = max(1, f.samplerate // 100)
+        energies = []
+        peaks = []
+        f.seek(0)
+        # 块大小取窗口的整数倍，窗口不会跨块
+        block_frames = max(window, self.block_frames // window * window)
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1)
+            usable = len(mono) // window * window
+            windows = mono[:usable].reshape(-1, window)
+            if usable < len(mono):
+                # 文件末尾不足一个窗口的部分单独成窗
+                tail = np.zeros(window, dtype=np.float32)
+                tail[:len(mono) - usable] = mono[usable:]
+                windows = np.vstack([windows, tail])
+            energies.append(np.mean(windows ** 2, axis=1))
+            peaks.append(np.max(np.abs(windows), axis=1))
+        if not energies:
+            return 0, 0, 1.0
+        energies = np.concatenate(energies)
+        peaks = np.concatenate(peaks)
+
+        voiced = np.flatnonzero(energies > 10 ** (self.silence_db / 10))
+        if len(voiced) == 0:
+            # 整段都是静音（如静音备用音频）时保留原长度，不做增益
+            return 0, f.frames, 1.0
+
+        margin = int(self.keep_silence * f.samplerate)
+        start = max(0, voiced[0] * window - margin)
+        end = min(f.frames, (voiced[-1] + 1) * window + margin)
+
+        rms = np.sqrt(np.mean(energies[voiced]))
+        gain = 10 ** (self.target_db / 20) / max(rms, 1e-9)
+        gain = min(gain, 10 ** (self.max_gain_db / 20))
+        peak = peaks[voiced[0]:voiced[-1] + 1].max()
+        if peak > 0:
+            gain = min(gain, 10 ** (self.peak_db / 20) / peak)
+        return start, end, gain
+
+    def _convert_channels(self, block: np.ndarray) -> np.ndarray:
+        if block.shape[1] == self.channels:
+            return block
+        mono = block.mean(axis=1, keepdims=True)
+        return np.repeat(mono, self.channels, axis=1)
+
+    def process(self, input_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
+        """处理一个音频文件
+
+        Args:
+            input_path: 输入音频路径
+            output_path: 输出路径，为None时原地替换输入文件
+
+        Returns:
+            处理信息: 原始时长、输出时长、裁剪掉的时长和增益（dB）
+        """
+        output_path = output_path or input_path
+        temp_path = f"{output_path}.{os.getpid()}.tmp.wav"
+        with sf.SoundFile(input_path) as f:
+            in_rate = f.samplerate
+            original_seconds = f.frames / in_rate
+            start, end, gain = self._analyze(f)
+            resampler = _LinearResampler(in_rate, self.target_rate)
+            # 线性插值本身不抗混叠，降采样时先低通滤波，截止频率留出10%的过渡带
+            lowpass = (_LowPassFilter(0.45 * self.target_rate / in_rate, self.channels)
+                       if self.target_rate < in_rate else None)
+            written = 0
+            f.seek(start)
+            remaining = end - start
+            try:
+                with sf.SoundFile(temp_path, 'w', samplerate=self.target_rate, channels=self.channels,
+                                  subtype='PCM_16', format='WAV') as out:
+                    while remaining > 0:
+                        block = f.read(min(self.block_frames, remaining), dtype='float32', always_2d=True)
+                        if len(block) == 0:
+                            break
+                        remaining -= len(block)
+                        block = self._convert_channels(block * np.float32(gain))
+                        if lowpass is not None:
+                            block = lowpass.process(block)
+                        block = np.clip(resampler.process(block), -1.0, 1.0)
+                        out.write(block)
+                        written += len(block)
+                    if lowpass is not None:
+                        block = np.clip(resampler.process(lowpass.flush()), -1.0, 1.0)
+                        out.write(block)
+                        written += len(block)
+                    pad_frames = int(self.pad_seconds * self.target_rate)
+                    while pad_frames > 0:
+                        frames = min(self.block_frames, pad_frames)
+                        out.write(np.zeros((frames, self.channels), dtype=np.float32))
+                        written += frames
+                        pad_frames -= frames
+            except BaseException:
+                # 不在输出旁边留下写了一半的临时文件
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        os.replace(temp_path, output_path)
+
+        return {
+            "original_seconds": original_seconds,
+            "seconds": written / self.target_rate,
+            "trimmed_seconds": float(original_seconds - (end - start) / in_rate),
+            "gain_db": float(20 * np.log10(gain)) if gain > 0 else 0.0,
+        }
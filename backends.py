@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 进程启动时间，用于统计冷启动耗时
+PROCESS_START = time.perf_counter()
+
+def current_rss_mb() -> float:
+    """返回当前进程的常驻内存（MB），无法获取时返回0"""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    """返回当前进程的峰值常驻内存（MB），无法获取时返回0"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+class BackendRegistry:
+    def __init__(self):
+        """初始化后端注册表
+
+        注册的只是创建后端的函数，后端在第一次被阶段用到时才导入依赖并初始化，
+        只运行部分阶段时不会为用不到的torch、diffusers等付出导入和加载时间。
+        """
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.load_stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """注册一个后端
+
+        Args:
+            name: 后端名称
+            factory: 创建后端实例的函数，在第一次get时调用
+        """
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """获取后端实例，首次调用时创建
+
+        多个工作线程同时请求同一后端时只创建一次。
+
+        Args:
+            name: 后端名称
+
+        Returns:
+            后端实例
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            if name not in self._instances:
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.load_stats[name] = {
+                    "seconds": time.perf_counter() - start,
+                    "rss_delta_mb": current_rss_mb() - rss_before,
+                }
+                print(f"已加载后端 {name}，用时{self.load_stats[name]['seconds']:.2f}秒，"
+                      f"内存增加{self.load_stats[name]['rss_delta_mb']:.0f}MB")
+            return self._instances[name]
+
+    def loaded(self, name: str) -> Optional[Any]:
+        """返回已创建的后端实例，尚未创建时返回None"""
+        return self._instances.get(name)
+
+    def report(self):
+        """打印各后端的加载耗时和进程内存"""
+        print("\n后端加载统计:")
+        for name, stats in self.load_stats.items():
+            print(f"  {name}: {stats['seconds']:.2f}秒, 内存增加{stats['rss_delta_mb']:.0f}MB")
+        unused = [name for name in self._factories if name not in self._instances]
+        if unused:
+            print(f"  未加载: {', '.join(unused)}")
+        print(f"  总耗时{time.perf_counter() - PROCESS_START:.2f}秒, 峰值内存{peak_rss_mb():.0f}MB")
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from backends import current_rss_mb, peak_rss_mb
+from bench_stubs import FakeArxivServer, FakeOllamaServer, SyntheticTTS, StubDiffusionPipe
+
+# 可以测量的阶段，按流水线顺序排列
+BENCH_STAGES = ["fetch", "poster", "script", "voice", "video", "combine"]
+
+def load_corpus(path: str, scale: int = 1) -> List[Dict[str, Any]]:
+    """读取论文数据并按倍数复制，得到指定规模的测试语料
+
+    复制出的论文使用不同的arxiv_id，各阶段不会把它们当作同一篇论文。
+
+    Args:
+        path: arxiv_papers_*.json 文件路径
+        scale: 复制倍数
+
+    Returns:
+        论文信息字典列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        papers = json.load(f)
+    corpus = []
+    for copy in range(max(1, scale)):
+        for paper in papers:
+            paper = dict(paper)
+            if copy:
+                paper["arxiv_id"] = f"{paper['arxiv_id']}-{copy}"
+                paper["title"] = f"{paper['title']} ({copy})"
+            corpus.append(paper)
+    return corpus
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """计算耗时分布的常用统计量"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        # 最近秩法，样本少时不插值
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+    }
+
+def measure(name: str, items: List[Any], func: Callable[[Any], Any]) -> Tuple[List[Any], Dict[str, Any]]:
+    """逐项执行一个阶段并记录每项的耗时
+
+    Args:
+        name: 阶段名
+        items: 阶段的输入
+        func: 处理单项输入的函数
+
+    Returns:
+        (每项的输出, 阶段统计)
+    """
+    print(f"正在测量阶段 {name}（{len(items)}项）...")
+    latencies = []
+    outputs = []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        outputs.append(func(item))
+        latencies.append(time.perf_counter() - item_start)
+    return outputs, stage_stats(len(items), time.perf_counter() - start, latencies)
+
+def stage_stats(papers: int, seconds: float, latencies: Optional[List[float]] = None) -> Dict[str, Any]:
+    return {
+        "papers": papers,
+        "seconds": seconds,
+        "papers_per_sec": papers / seconds if seconds > 0 else 0.0,
+        "latency": percentiles(latencies or []),
+        "rss_mb": current_rss_mb(),
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(corpus: List[Dict[str, Any]], stages: List[str], work_dir: str,
+                  llm_latency: float = 0.05, tts_rtf: float = 0.05, sd_latency: float = 0.05,
+                  use_sd: bool = True) -> Dict[str, Any]:
+    """用离线替身后端运行各阶段的真实代码并测量
+
+    每个阶段依次处理全部论文，阶段之间不重叠，得到的是单个阶段本身的延迟和吞吐。
+    不使用产物缓存，每次运行都完整地执行各阶段。
+
+    Args:
+        corpus: 测试语料
+        stages: 要测量的阶段，未测量的上游阶段仍会运行以产生输入
+        work_dir: 存放产物的临时目录
+        llm_latency: 假Ollama服务每次请求的延迟（秒）
+        tts_rtf: 合成语音的实时率
+        sd_latency: 替身SD管线每张图像的耗时（秒）
+        use_sd: 海报阶段是否走SD推理路径，否则测量模板海报
+
+    Returns:
+        测量结果
+    """
+    from arxiv_daily_papers import ArxivPaperFetcher
+    from poster_generator import PosterGenerator
+    from script_generator import ScriptGenerator
+    from voice_generator import VoiceGenerator
+    from video_generator import VideoGenerator
+
+    # 阶段之间有依赖，测量后面的阶段时需要运行前面的阶段
+    last = max(BENCH_STAGES.index(stage) for stage in stages)
+    required = BENCH_STAGES[:last + 1]
+    results: Dict[str, Any] = {}
+
+    def run(name, items, func):
+        outputs, stats = measure(name, items, func)
+        if name in stages:
+            results[name] = stats
+        return outputs
+
+    papers = corpus
+    if "fetch" in required:
+        with FakeArxivServer(corpus) as server:
+            original = server.install()
+            try:
+                fetcher = ArxivPaperFetcher(save_dir=os.path.join(work_dir, "data"))
+                start = time.perf_counter()
+                papers = fetcher.fetch_daily_papers(max_results=len(corpus))
+                if "fetch" in stages:
+                    results["fetch"] = stage_stats(len(papers), time.perf_counter() - start)
+                    results["fetch"]["requests"] = server.requests
+            finally:
+                import arxiv
+                arxiv.Client.query_url_format = original
+    indexed = list(enumerate(papers))
+
+    if "poster" in required:
+        pipe = StubDiffusionPipe(sd_latency) if use_sd else None
+        poster_generator = PosterGenerator(save_dir=os.path.join(work_dir, "posters"), use_local_model=use_sd,
+                                           pipe=pipe)
+        posters = run("poster", indexed, lambda item: poster_generator.generate_poster(item[1], item[0]))
+
+    if "script" in required:
+        with FakeOllamaServer(latency=llm_latency) as server:
+            script_generator = ScriptGenerator(save_dir=os.path.join(work_dir, "scripts"), host=server.url)
+            scripts = run("script", indexed, lambda item: script_generator.generate_script(item[1], item[0]))
+
+    if "voice" in required:
+        voice_generator = VoiceGenerator(save_dir=os.path.join(work_dir, "audios"),
+                                         speaker_file=os.path.join(work_dir, "spk2info.pt"),
+                                         model=SyntheticTTS(realtime_factor=tts_rtf))
+        audios = run("voice", indexed,
+                     lambda item: voice_generator.generate_voice(scripts[item[0]], item[1]["arxiv_id"], item[0]))
+
+    if "video" in required:
+        video_generator = VideoGenerator(save_dir=os.path.join(work_dir, "videos"))
+        videos = run("video", indexed,
+                     lambda item: video_generator.generate_video(posters[item[0]], audios[item[0]],
+                                                                 item[1]["arxiv_id"], item[0]))
+
+    if "combine" in required:
+        start = time.perf_counter()
+        final_video = video_generator.combine_videos([video for video in videos if video])
+        if not final_video:
+            raise RuntimeError("合并视频失败")
+        results["combine"] = stage_stats(len(videos), time.perf_counter() - start)
+
+    return results
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基准结果比较，返回超出容差的退化项
+
+    Args:
+        current: 本次结果
+        baseline: 基准结果
+        tolerance: 允许的相对退化比例
+
+    Returns:
+        退化说明列表
+    """
+    regressions = []
+    print(f"\n与基准 {baseline.get('revision') or '?'} 比较:")
+    for stage, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        throughput = stats["papers_per_sec"] / base["papers_per_sec"] if base["papers_per_sec"] else 0.0
+        line = f"  {stage}: 吞吐 {throughput:.2f}x"
+        if throughput and throughput < 1 - tolerance:
+            regressions.append(f"{stage} 吞吐下降到基准的 {throughput:.2f}x")
+        base_p50 = base.get("latency", {}).get("p50")
+        p50 = stats.get("latency", {}).get("p50")
+        if base_p50 and p50:
+            line += f", p50延迟 {p50 / base_p50:.2f}x"
+            if p50 > base_p50 * (1 + tolerance):
+                regressions.append(f"{stage} p50延迟增加到基准的 {p50 / base_p50:.2f}x")
+        print(line)
+    base_rss = baseline.get("peak_rss_mb")
+    if base_rss and current["peak_rss_mb"] > base_rss * (1 + tolerance):
+        regressions.append(f"峰值内存增加到基准的 {current['peak_rss_mb'] / base_rss:.2f}x")
+    print(f"  峰值内存: {current['peak_rss_mb']:.0f}MB（基准 {base_rss or 0:.0f}MB）")
+    return regressions
+
+def main():
+    default_corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "arxiv_papers_2025-05-08.json")
+    parser = argparse.ArgumentParser(description="用离线替身后端测量各阶段的延迟、吞吐和内存")
+    parser.add_argument("--corpus", type=str, default=default_corpus, help="论文数据文件")
+    parser.add_argument("--scale", type=int, default=1, help="语料复制倍数")
+    parser.add_argument("--stages", type=str, default=",".join(BENCH_STAGES),
+                        help="要测量的阶段，逗号分隔，可选 " + ",".join(BENCH_STAGES))
+    parser.add_argument("--template_posters", action="store_true", help="海报阶段测量模板海报而不是SD推理路径")
+    parser.add_argument("--llm_latency", type=float, default=0.05, help="假Ollama服务每次请求的延迟（秒）")
+    parser.add_argument("--tts_rtf", type=float, default=0.05, help="合成语音的实时率")
+    parser.add_argument("--sd_latency", type=float, default=0.05, help="替身SD管线每张图像的耗时（秒）")
+    parser.add_argument("--work_dir", type=str, default=None, help="保存产物的目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--output", type=str, default=None, help="将结果保存为JSON文件")
+    parser.add_argument("--compare", type=str, default=None, help="与之前保存的结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="比较时允许的相对退化比例")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(BENCH_STAGES)
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(sorted(unknown))}")
+
+    corpus = load_corpus(args.corpus, args.scale)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stage_results = run_benchmark(corpus, stages, args.work_dir or temp_dir,
+                                      llm_latency=args.llm_latency, tts_rtf=args.tts_rtf,
+                                      sd_latency=args.sd_latency, use_sd=not args.template_posters)
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus": os.path.basename(args.corpus),
+        "papers": len(corpus),
+        "settings": {
+            "llm_latency": args.llm_latency,
+            "tts_rtf": args.tts_rtf,
+            "sd_latency": args.sd_latency,
+            "template_posters": args.template_posters,
+        },
+        "stages": stage_results,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"] or baseline.get("papers") != results["papers"]:
+            print("警告: 基准结果的语料规模或替身参数不同，比较结果仅供参考")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n发现性能退化:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n未发现超出容差的性能退化")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import re
+import json
+import time
+import zlib
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+from xml.sax.saxutils import escape
+import numpy as np
+from PIL import Image
+
+# 离线基准测试用的替身后端: 回放arXiv数据的Atom服务、假的Ollama服务、
+# 合成语音的TTS模型和不做推理的Stable Diffusion管线。
+# 它们的输出只由输入决定，同一份语料多次运行得到相同的产物。
+
+def _seed(text: str) -> int:
+    """由文本得到稳定的随机种子，不受PYTHONHASHSEED影响"""
+    return zlib.crc32(text.encode("utf-8"))
+
+class _StubServer:
+    """在后台线程中运行的本地HTTP服务"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(self.handler_class):
+            def log_message(self, format, *args):
+                pass
+
+        Handler.stub = stub
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _ArxivHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.stub.requests += 1
+        if self.stub.requests <= self.stub.fail_requests:
+            # 模拟arXiv API限流
+            self.send_error(503)
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        start = int(query.get("start", ["0"])[0])
+        max_results = int(query.get("max_results", ["10"])[0])
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        body = self.stub.feed(start, max_results, query.get("search_query", [""])[0],
+                              query.get("sortOrder", ["descending"])[0]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeArxivServer(_StubServer):
+    handler_class = _ArxivHandler
+
+    def __init__(self, papers: List[Dict[str, Any]], latency: float = 0.0, fail_requests: int = 0):
+        """回放已保存论文数据的arXiv API替身
+
+        按arXiv API的Atom格式分页返回论文。查询条件中只有submittedDate范围生效（按论文的published_at过滤），
+        其余条件被忽略；论文的给定顺序视为按提交时间倒序，正序查询时反向返回。
+
+        Args:
+            papers: 论文信息字典列表，格式与arxiv_papers_*.json相同
+            latency: 每次请求的模拟网络延迟（秒）
+            fail_requests: 前几次请求返回503，用于测试重试
+        """
+        super().__init__()
+        self.papers = papers
+        self.latency = latency
+        self.fail_requests = fail_requests
+
+    def install(self):
+        """让arxiv库的查询请求发往本服务，返回原来的查询地址格式"""
+        import arxiv
+        original = arxiv.Client.query_url_format
+        arxiv.Client.query_url_format = self.url + "/api/query?{}"
+        return original
+
+    def select(self, search_query: str = "", sort_order: str = "descending") -> List[Dict[str, Any]]:
+        """按查询的提交时间范围和排序方向返回论文"""
+        papers = self.papers
+        submitted = re.search(r"submittedDate:\[(\d+) TO (\d+)\]", search_query)
+        if submitted:
+            low, high = submitted.groups()
+            papers = [paper for paper in papers if low <= paper.get("published_at", "") <= high]
+        return list(reversed(papers)) if sort_order == "ascending" else papers
+
+    def feed(self, start: int, max_results: int, search_query: str = "", sort_order: str = "descending") -> str:
+        papers = self.select(search_query, sort_order)
+        entries = [self._entry(paper) for paper in papers[start:start + max_results]]
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+            'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+            '<title>ArXiv Query</title>\n'
+            f'<opensearch:totalResults>{len(papers)}</opensearch:totalResults>\n'
+            f'<opensearch:startIndex>{start}</opensearch:startIndex>\n'
+            f'<opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>\n'
+            + "".join(entries) +
+            '</feed>\n'
+        )
+
+    @staticmethod
+    def _entry(paper: Dict[str, Any]) -> str:
+        published = f"{paper.get('published', '2025-01-01')}T00:00:00Z"
+        if paper.get("published_at"):
+            at = paper["published_at"]
+            published = f"{at[:4]}-{at[4:6]}-{at[6:8]}T{at[8:10]}:{at[10:12]}:00Z"
+        updated = f"{paper.get('updated', paper.get('published', '2025-01-01'))}T00:00:00Z"
+        authors = "".join(f"<author><name>{escape(name)}</name></author>" for name in paper["authors"])
+        categories = "".join(f'<category term="{escape(c)}"/>' for c in paper.get("categories", []))
+        primary = escape(paper.get("primary_category", "cs.AI"))
+        return (
+            "<entry>\n"
+            f"<id>http://arxiv.org/abs/{escape(paper['arxiv_id'])}</id>\n"
+            f"<updated>{updated}</updated>\n"
+            f"<published>{published}</published>\n"
+            f"<title>{escape(paper['title'])}</title>\n"
+            f"<summary>{escape(paper['summary'])}</summary>\n"
+            f"{authors}\n"
+            f'<link href="http://arxiv.org/abs/{escape(paper["arxiv_id"])}" rel="alternate" type="text/html"/>\n'
+            f'<link title="pdf" href="{escape(paper.get("pdf_url", ""))}" rel="related" type="application/pdf"/>\n'
+            f'<arxiv:primary_category term="{primary}"/>\n'
+            f"{categories}\n"
+            "</entry>\n"
+        )
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        stub = self.stub
+        with stub.lock:
+            stub.requests += 1
+            attempt = stub.requests
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+        try:
+            self._chat(attempt)
+        finally:
+            with stub.lock:
+                stub.active -= 1
+
+    def _chat(self, attempt: int):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.startswith("/api/chat"):
+            self.send_error(404)
+            return
+        if attempt <= self.stub.fail_first:
+            self.send_error(500, "model failed to load")
+            return
+        prompt = request["messages"][-1]["content"]
+        pieces = self.stub.reply(prompt)
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for piece in pieces:
+                    if self.stub.token_delay:
+                        time.sleep(self.stub.token_delay)
+                    line = {"model": request.get("model"), "message": {"role": "assistant", "content": piece},
+                            "done": False}
+                    self.wfile.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                done = {"model": request.get("model"), "message": {"role": "assistant", "content": ""},
+                        "done": True, "eval_count": len(pieces)}
+                self.wfile.write(json.dumps(done).encode("utf-8") + b"\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端达到字数预算后提前断开，与Ollama一样停止生成
+                self.stub.cancelled += 1
+            return
+
+        if self.stub.token_delay:
+            time.sleep(self.stub.token_delay * len(pieces))
+        body = json.dumps({
+            "model": request.get("model"),
+            "message": {"role": "assistant", "content": "".join(pieces)},
+            "done": True,
+            "eval_count": len(pieces),
+            "eval_duration": int(self.stub.token_delay * len(pieces) * 1e9),
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeOllamaServer(_StubServer):
+    handler_class = _OllamaHandler
+
+    def __init__(self, latency: float = 0.05, token_delay: float = 0.0, script_chars: int = 300,
+                 fail_first: int = 0):
+        """Ollama /api/chat 的替身
+
+        根据提示词生成固定的中文文案，支持流式和非流式两种响应。
+
+        Args:
+            latency: 首个token之前的模拟延迟（秒）
+            token_delay: 每个token的模拟生成时间（秒）
+            script_chars: 生成文案的大致字数
+            fail_first: 前几个请求返回500，用于测试重试
+        """
+        super().__init__()
+        self.latency = latency
+        self.token_delay = token_delay
+        self.script_chars = script_chars
+        self.fail_first = fail_first
+        self.lock = threading.Lock()
+        # 客户端提前断开的流式请求数
+        self.cancelled = 0
+        # 正在处理的请求数和其最大值
+        self.active = 0
+        self.max_active = 0
+
+    def reply(self, prompt: str) -> List[str]:
+        """返回切分为token的回复"""
+        sentences = ["今天为大家介绍一篇新论文。", "作者提出了一种新的方法。", "实验结果显示效果明显提升。",
+                     "这项工作对相关领域很有启发。", "感谢收听，我们下期再见。"]
+        rng = np.random.default_rng(_seed(prompt))
+        text = ""
+        while len(text) < self.script_chars:
+            text += sentences[rng.integers(len(sentences))]
+        # 以4个字符近似一个token
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+class _PdfHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stub = self.stub
+        with stub.lock:
+            stub.requests += 1
+            attempt = stub.attempts.get(self.path, 0)
+            stub.attempts[self.path] = attempt + 1
+        if stub.latency:
+            time.sleep(stub.latency)
+        if attempt == 0 and stub.throttle_first:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = stub.document(self.path)
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-")[0] or 0)
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with stub.lock:
+                stub.range_requests += 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "text/html" if stub.html else "application/pdf")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if attempt <= int(stub.throttle_first) and stub.truncate_first:
+            # 第一次完整请求只发送一半就断开，模拟下载中断
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+class FakePdfServer(_StubServer):
+    handler_class = _PdfHandler
+
+    def __init__(self, size: int = 256 * 1024, latency: float = 0.0, truncate_first: bool = False,
+                 throttle_first: bool = False, html: bool = False):
+        """论文PDF下载的替身，支持Range请求
+
+        任意路径都返回由路径决定的固定内容，以PDF文件头开始。
+
+        Args:
+            size: 每个PDF的字节数
+            latency: 每次请求的模拟延迟（秒）
+            truncate_first: 每个路径的第一次下载只发送一半内容就断开，用于测试续传
+            throttle_first: 每个路径的第一次请求返回429，用于测试退避
+            html: 返回HTML页面而不是PDF，模拟arXiv尚未生成PDF的论文
+        """
+        super().__init__()
+        self.size = size
+        self.latency = latency
+        self.truncate_first = truncate_first
+        self.throttle_first = throttle_first
+        self.html = html
+        self.lock = threading.Lock()
+        self.attempts: Dict[str, int] = {}
+        self.range_requests = 0
+
+    def document(self, path: str) -> bytes:
+        if self.html:
+            return f"<html><body>PDF for {path} is being generated</body></html>".encode("utf-8")
+        header = f"%PDF-1.4\n% {path}\n".encode("utf-8")
+        rng = np.random.default_rng(_seed(path))
+        return header + rng.integers(0, 256, max(0, self.size - len(header)), dtype=np.uint8).tobytes()
+
+class SyntheticTTS:
+    def __init__(self, sample_rate: int = 24000, chars_per_second: float = 5.0, realtime_factor: float = 0.05):
+        """合成正弦波的TTS模型替身，接口与CosyVoice的推理方法一致
+
+        Args:
+            sample_rate: 输出采样率
+            chars_per_second: 语速，决定每段音频的时长
+            realtime_factor: 合成耗时与音频时长之比，用于模拟推理开销
+        """
+        self.sample_rate = sample_rate
+        self.chars_per_second = chars_per_second
+        self.realtime_factor = realtime_factor
+
+    def _synthesize(self, text: str, stream: bool):
+        duration = max(0.2, len(text) / self.chars_per_second)
+        samples = int(duration * self.sample_rate)
+        frequency = 150 + _seed(text) % 200
+        t = np.arange(samples, dtype=np.float32) / self.sample_rate
+        audio = (0.2 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+        # 流式推理约每秒音频产出一块
+        block = self.sample_rate if stream else samples
+        for start in range(0, samples, block):
+            chunk = audio[start:start + block]
+            if self.realtime_factor:
+                time.sleep(len(chunk) / self.sample_rate * self.realtime_factor)
+            yield {"tts_speech": chunk[None, :]}
+
+    def inference_sft(self, text: str, spk_id: str, stream: bool = False):
+        return self._synthesize(text, stream)
+
+class StubDiffusionPipe:
+    def __init__(self, latency: float = 0.05):
+        """不做推理的Stable Diffusion管线替身，按提示词生成固定的渐变图
+
+        Args:
+            latency: 每张图像的模拟推理时间（秒）
+        """
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, prompt, height: int = 768, width: int = 512, **kwargs):
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency * len(prompts))
+        images = []
+        ramp = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None, None]
+        for text in prompts:
+            color = np.array([(_seed(text) >> shift) & 0xFF for shift in (0, 8, 16)], dtype=np.float32)
+            pixels = np.broadcast_to(color * (0.5 + 0.5 * ramp), (height, width, 3)).astype(np.uint8)
+            images.append(Image.fromarray(pixels, 'RGB'))
+        return SimpleNamespace(images=images)
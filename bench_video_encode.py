@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import numpy as np
+import soundfile as sf
+from PIL import Image, ImageDraw
+
+from video_generator import VideoGenerator
+
+def make_inputs(work_dir: str, duration: float, sample_rate: int = 24000):
+    """生成测试用的海报和音频
+
+    Args:
+        work_dir: 输出目录
+        duration: 音频时长（秒）
+        sample_rate: 音频采样率
+
+    Returns:
+        (海报路径, 音频路径)
+    """
+    poster_path = os.path.join(work_dir, "poster.png")
+    img = Image.new('RGB', (512, 768), color=(240, 248, 255))
+    draw = ImageDraw.Draw(img)
+    for i in range(30):
+        draw.text((20, 30 + i * 24), f"Benchmark poster line {i}", fill=(0, 0, 0))
+    img.save(poster_path)
+
+    # 用带噪声的正弦波代替语音，避免静音让音频编码过于轻松
+    audio_path = os.path.join(work_dir, "audio.wav")
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    rng = np.random.default_rng(0)
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.shape)
+    sf.write(audio_path, audio.astype(np.float32), sample_rate)
+    return poster_path, audio_path
+
+def run_benchmark(duration: float, repeats: int, modes: list) -> dict:
+    """分别用各编码方式生成同一段视频并计时
+
+    Args:
+        duration: 视频时长（秒）
+        repeats: 每种方式的重复次数
+        modes: 要比较的编码方式
+
+    Returns:
+        每种编码方式的耗时统计
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        poster_path, audio_path = make_inputs(work_dir, duration)
+        for mode in modes:
+            generator = VideoGenerator(save_dir=os.path.join(work_dir, mode), encode_mode=mode)
+            timings = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                video_path = generator.generate_video(poster_path, audio_path, "bench", i)
+                timings.append(time.perf_counter() - start)
+                if not video_path:
+                    raise RuntimeError(f"{mode} 编码失败")
+            results[mode] = {
+                "median_seconds": statistics.median(timings),
+                "min_seconds": min(timings),
+                "output_bytes": os.path.getsize(video_path),
+                "realtime_factor": duration / statistics.median(timings),
+            }
+
+    if "still" in results and "moviepy" in results:
+        results["speedup"] = results["moviepy"]["median_seconds"] / results["still"]["median_seconds"]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="比较静态图快速编码与moviepy逐帧编码的速度")
+    parser.add_argument("--duration", type=float, default=60.0, help="测试音频时长（秒）")
+    parser.add_argument("--repeats", type=int, default=3, help="每种方式的重复次数")
+    parser.add_argument("--modes", type=str, default="still,moviepy", help="要比较的编码方式，逗号分隔")
+    parser.add_argument("--output", type=str, default=None, help="将结果保存为JSON文件")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.duration, args.repeats, args.modes.split(","))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
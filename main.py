@@ -1,90 +1,605 @@
 import os
-import json
+import time
 import datetime
 import argparse
-from typing import List, Dict, Any
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
 
-from arxiv_daily_papers import ArxivPaperFetcher
-from poster_generator import PosterGenerator
-from script_generator import ScriptGenerator
-from voice_generator import VoiceGenerator
-from video_generator import VideoGenerator
+# 最先导入，用于统计冷启动耗时
+from backends import BackendRegistry, PROCESS_START, current_rss_mb
+import metrics
+from pipeline import PaperPipeline
+from artifact_cache import ArtifactCache
+from poster_generator import SCHEDULERS
 
-def main():
+# 流水线的全部阶段，video阶段包括最后的视频合并
+STAGES = ["fetch", "poster", "script", "voice", "video"]
+
+def reuse_artifact(directory: str, prefix: str, ext: str):
+    """返回一个阶段函数，复用之前运行中该阶段已生成的产物"""
+    def reuse(job):
+        path = os.path.join(directory, f"{prefix}_{job['index']+1:02d}_{job['paper']['arxiv_id']}{ext}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"未运行该阶段且找不到已有产物: {path}")
+        return path
+    return reuse
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数，常驻工作进程使用同一套参数"""
     parser = argparse.ArgumentParser(description="AI论文每日视频播报生成器")
-    parser.add_argument("--category", type=str, default="cs.AI", help="arXiv类别")
+    parser.add_argument("--category", type=str, default="cs.AI",
+                        help="arXiv类别，多个类别用逗号分隔，交叉列出的论文只处理一次，每个类别生成一份报告")
     parser.add_argument("--max_papers", type=int, default=10, help="获取的论文数量")
     parser.add_argument("--use_local_model", action="store_true", help="使用本地Stable Diffusion模型")
+    parser.add_argument("--sd_device", type=str, default=None, help="Stable Diffusion推理设备，默认有GPU用cuda否则用cpu")
+    parser.add_argument("--sd_dtype", type=str, default="auto", choices=["auto", "fp16", "fp32", "bf16"],
+                        help="Stable Diffusion权重精度，auto在CPU上使用fp32")
+    parser.add_argument("--sd_steps", type=int, default=None, help="Stable Diffusion采样步数")
+    parser.add_argument("--sd_scheduler", type=str, default=None, choices=sorted(SCHEDULERS), help="Stable Diffusion采样器")
+    parser.add_argument("--seed", type=int, default=None, help="海报生成的随机种子")
+    parser.add_argument("--poster_batch_size", type=int, default=1, help="每批送入Stable Diffusion的海报数量，大于1时模板海报也会用进程池批量渲染")
+    parser.add_argument("--poster_clusters", action="store_true",
+                        help="混合海报: 按主题聚类论文，每个主题只用Stable Diffusion生成一张背景，论文文字用模板绘制（需--use_local_model）")
+    parser.add_argument("--cluster_threshold", type=float, default=0.2, help="海报聚类时合并两个主题所需的最低相似度，越高主题越多")
+    parser.add_argument("--max_backgrounds", type=int, default=8, help="混合海报每次最多的主题数，即Stable Diffusion最多生成的背景数")
+    parser.add_argument("--stream_fetch", action="store_true", help="边获取边处理，第一页论文到达后流水线立即开始（单个类别时有效）")
+    parser.add_argument("--fetch_page_size", type=int, default=100, help="每次请求arXiv API获取的论文数")
+    parser.add_argument("--fetch_delay", type=float, default=3.0, help="两次请求arXiv API之间的最短间隔（秒）")
+    parser.add_argument("--fetch_retries", type=int, default=3, help="请求arXiv API失败后的最大重试次数，重试间隔指数增长")
+    parser.add_argument("--incremental", action="store_true", help="只处理上次运行之后新提交且未处理过的论文")
     parser.add_argument("--output_dir", type=str, default="output", help="输出目录")
-    args = parser.parse_args()
+    parser.add_argument("--ollama_host", type=str, default=None, help="Ollama服务地址")
+    parser.add_argument("--script_max_chars", type=int, default=300, help="文案的字数预算，超出后提前结束生成，0表示不限")
+    parser.add_argument("--llm_think", action="store_true", help="允许qwen3输出思考过程（思考内容不会进入文案）")
+    parser.add_argument("--llm_timeout", type=float, default=120.0, help="单篇文案的生成时限（秒）")
+    parser.add_argument("--llm_retries", type=int, default=2, help="文案生成失败后的重试次数，重试间隔指数增长，全部失败时使用模板文案")
+    parser.add_argument("--no_llm_stream", action="store_true", help="不使用流式生成，等待模型完整输出")
+    parser.add_argument("--speaker", type=str, default="default", help="播报使用的说话人名称")
+    parser.add_argument("--speaker_wav", type=str, default="./asset/zero_shot_prompt.wav", help="说话人的参考音频")
+    parser.add_argument("--speaker_text", type=str, default="希望你以后能够做的比我还好呦。", help="参考音频对应的文本")
+    parser.add_argument("--tts_stream", action="store_true", help="按句切分文案并流式合成语音")
+    parser.add_argument("--tts_shards", type=int, default=0,
+                        help="语音合成的工作进程数，每个进程各加载一份模型并按句并行合成，0表示在本进程中合成；可用tts_shards.py测量合适的值")
+    parser.add_argument("--tts_threads", type=int, default=0, help="每个语音合成工作进程的算子内线程数，0表示按CPU核心数平均分配")
+    parser.add_argument("--normalize_audio", action="store_true", help="统一所有音频的响度和采样率，并裁剪首尾静音")
+    parser.add_argument("--audio_target_db", type=float, default=-20.0, help="音频归一化的目标电平（dBFS）")
+    parser.add_argument("--audio_pad", type=float, default=0.0, help="每篇论文音频末尾追加的停顿（秒）")
+    parser.add_argument("--encode_mode", type=str, default="still", choices=["still", "moviepy"],
+                        help="单篇视频的编码方式，still为ffmpeg静态图快速编码")
+    parser.add_argument("--single_pass", action="store_true", help="由海报和音频一次编码生成每日报告，不生成中间的单篇视频")
+    parser.add_argument("--split_clips", action="store_true", help="一次编码模式下同时从报告中切出单篇视频")
+    parser.add_argument("--renditions", type=str, default="",
+                        help="为每份报告额外输出的规格，逗号分隔，如 1080p,720p,vertical 或 1280x720@2M")
+    parser.add_argument("--download_pdfs", action="store_true", help="下载论文PDF全文，保存在<output_dir>/pdfs中")
+    parser.add_argument("--pdf_workers", type=int, default=4, help="并发下载PDF的线程数")
+    parser.add_argument("--pdf_rate", type=float, default=1.0, help="每秒最多发出的PDF下载请求数，0表示不限速")
+    parser.add_argument("--poster_workers", type=int, default=1, help="海报阶段的工作线程数")
+    parser.add_argument("--script_workers", type=int, default=2, help="文案阶段的工作线程数")
+    parser.add_argument("--voice_workers", type=int, default=1, help="语音阶段的工作线程数")
+    parser.add_argument("--video_workers", type=int, default=0, help="视频阶段的并行编码数，0表示按CPU核心数自动分配")
+    parser.add_argument("--encode_threads", type=int, default=0, help="每个视频编码器的线程数，0表示自动选择")
+    parser.add_argument("--cache_dir", type=str, default=None, help="产物缓存目录，默认为<output_dir>/cache")
+    parser.add_argument("--no_cache", action="store_true", help="不使用跨运行的产物缓存")
+    parser.add_argument("--paper_db", type=str, default=None, help="论文库文件，默认为<output_dir>/data/papers.db")
+    parser.add_argument("--no_paper_db", action="store_true", help="不使用论文库，获取的论文和已处理索引保存在JSON文件中")
+    parser.add_argument("--export_json", action="store_true", help="使用论文库时仍把每天获取的论文导出为JSON文件")
+    parser.add_argument("--cache_max_gb", type=float, default=20.0, help="缓存总大小上限（GB）")
+    parser.add_argument("--cache_max_age_days", type=float, default=30.0, help="缓存条目的最长保留天数")
+    parser.add_argument("--memory_budget_mb", type=float, default=0,
+                        help="海报和语音模型的内存预算（MB），超出时释放空闲的模型、用到时再加载，0表示不限")
+    parser.add_argument("--queue_size", type=int, default=2, help="阶段之间队列的最大长度")
+    parser.add_argument("--stages", type=str, default=",".join(STAGES),
+                        help="要运行的阶段，逗号分隔，可选 " + ",".join(STAGES) + "；未运行的阶段复用已有产物")
+    parser.add_argument("--papers_file", type=str, default=None, help="不运行fetch阶段时读取的论文列表，默认为当天获取的文件")
+    parser.add_argument("--metrics_file", type=str, default=None, help="本次运行的指标文件，默认为<output_dir>/metrics/run_<时间>.json")
+    parser.add_argument("--trace_file", type=str, default=None, help="同时导出Chrome trace格式的JSON，可在chrome://tracing或Perfetto中查看")
+    return parser
+
+def parse_stages(value: str) -> List[str]:
+    """解析逗号分隔的阶段列表
+    
+    Raises:
+        ValueError: 包含未知的阶段
+    """
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"未知的阶段: {', '.join(sorted(unknown))}")
+    return stages
+
+def group_by_category(papers: List[Dict[str, Any]], categories: List[str]) -> Dict[str, List[int]]:
+    """按类别分组论文，交叉列出的论文出现在它所属的每个类别中
+    
+    Args:
+        papers: 论文信息字典列表
+        categories: 本次运行的类别
+        
+    Returns:
+        类别 -> 属于该类别的论文在papers中的位置
+    """
+    groups = {category: [] for category in categories}
+    for i, paper in enumerate(papers):
+        paper_categories = paper.get("categories") or [paper.get("primary_category")]
+        matched = [category for category in categories if category in paper_categories]
+        # 从文件读取的论文缺少类别信息时，归入第一个类别
+        if not matched:
+            matched = categories[:1]
+        for category in matched:
+            groups[category].append(i)
+    return groups
+
+def parse_renditions(value: str) -> List[Dict[str, Any]]:
+    """解析逗号分隔的输出规格列表，视频模块只在需要时导入
+    
+    Raises:
+        ValueError: 无法识别的规格
+    """
+    specs = [spec for spec in value.split(",") if spec.strip()]
+    if not specs:
+        return []
+    from video_generator import parse_rendition
+    return [parse_rendition(spec) for spec in specs]
+
+def create_cache(args: argparse.Namespace) -> Optional[ArtifactCache]:
+    """按参数创建跨运行的产物缓存，--no_cache时返回None"""
+    if args.no_cache:
+        return None
+    return ArtifactCache(
+        cache_dir=args.cache_dir or os.path.join(args.output_dir, "cache"),
+        max_size_gb=args.cache_max_gb,
+        max_age_days=args.cache_max_age_days,
+    )
+
+def output_dirs(output_dir: str, today: str) -> Dict[str, str]:
+    """各后端当天的保存目录"""
+    return {
+        "fetcher": os.path.join(output_dir, "data"),
+        "poster": os.path.join(output_dir, "posters", today),
+        "script": os.path.join(output_dir, "scripts", today),
+        "voice": os.path.join(output_dir, "audios", today),
+        "video": os.path.join(output_dir, "videos", today),
+        # PDF按内容哈希存放，跨天共用
+        "pdf": os.path.join(output_dir, "pdfs"),
+    }
+
+def create_registry(args: argparse.Namespace, cache: Optional[ArtifactCache]) -> BackendRegistry:
+    """注册各阶段的后端，后端在第一次被用到时才导入依赖并初始化
+    
+    Args:
+        args: 命令行参数
+        cache: 产物缓存
+        
+    Returns:
+        后端注册表
+    """
+    registry = BackendRegistry()
+    dirs = output_dirs(args.output_dir, datetime.datetime.now().strftime("%Y-%m-%d"))
+    
+    def create_paper_store():
+        from paper_store import PaperStore
+        return PaperStore(args.paper_db or os.path.join(args.output_dir, "data", "papers.db"))
+    
+    def create_fetcher():
+        from arxiv_daily_papers import ArxivPaperFetcher
+        store = None if args.no_paper_db else registry.get("store")
+        return ArxivPaperFetcher(save_dir=dirs["fetcher"], page_size=args.fetch_page_size,
+                                 delay_seconds=args.fetch_delay, retries=args.fetch_retries, store=store,
+                                 export_json=args.export_json)
+    
+    def create_pdf_downloader():
+        from pdf_downloader import PdfDownloader
+        return PdfDownloader(save_dir=dirs["pdf"], concurrency=args.pdf_workers, rate_limit=args.pdf_rate)
+    
+    def create_poster_generator():
+        from poster_generator import PosterGenerator
+        return PosterGenerator(save_dir=dirs["poster"], use_local_model=args.use_local_model, cache=cache,
+                               device=args.sd_device, dtype=args.sd_dtype, num_inference_steps=args.sd_steps,
+                               scheduler=args.sd_scheduler, seed=args.seed, batch_size=args.poster_batch_size,
+                               cluster_backgrounds=args.poster_clusters, cluster_threshold=args.cluster_threshold,
+                               max_backgrounds=args.max_backgrounds)
+    
+    def create_script_generator():
+        from script_generator import ScriptGenerator
+        return ScriptGenerator(save_dir=dirs["script"], cache=cache, host=args.ollama_host,
+                               stream=not args.no_llm_stream, max_chars=args.script_max_chars or None,
+                               think=args.llm_think, timeout=args.llm_timeout, retries=args.llm_retries)
+    
+    def create_voice_generator():
+        from voice_generator import VoiceGenerator
+        from audio_postprocess import AudioPostProcessor
+        postprocessor = None
+        if args.normalize_audio or args.audio_pad > 0:
+            postprocessor = AudioPostProcessor(target_db=args.audio_target_db, pad_seconds=args.audio_pad)
+        shards = None
+        if args.tts_shards > 0:
+            from tts_shards import ShardedSynthesizer
+            shards = ShardedSynthesizer({"save_dir": dirs["voice"], "speaker": args.speaker,
+                                         "prompt_wav": args.speaker_wav, "prompt_text": args.speaker_text},
+                                        workers=args.tts_shards, threads_per_worker=args.tts_threads)
+        return VoiceGenerator(save_dir=dirs["voice"], cache=cache, speaker=args.speaker,
+                              prompt_wav=args.speaker_wav, prompt_text=args.speaker_text,
+                              stream=args.tts_stream, postprocessor=postprocessor, shards=shards)
+    
+    def create_video_generator():
+        from video_generator import VideoGenerator
+        return VideoGenerator(save_dir=dirs["video"], cache=cache, encode_mode=args.encode_mode,
+                              threads=args.encode_threads)
+    
+    registry.register("store", create_paper_store)
+    registry.register("fetcher", create_fetcher)
+    registry.register("pdf", create_pdf_downloader)
+    registry.register("poster", create_poster_generator)
+    registry.register("script", create_script_generator)
+    registry.register("voice", create_voice_generator)
+    registry.register("video", create_video_generator)
+    return registry
+
+def create_model_manager(args: argparse.Namespace, backend, registry: BackendRegistry,
+                         stages: List[str]) -> Optional["ModelManager"]:
+    """按内存预算创建模型管理器，未设置预算时返回None
+    
+    只管理本次运行的阶段用到的模型。查询和释放只检查已创建的后端，
+    不会为了判断模型是否常驻而创建后端，模型只在管理器的预算检查之后加载。
+    
+    Args:
+        args: 命令行参数
+        backend: 按名称获取后端实例的函数，用于加载模型
+        registry: 后端注册表
+        stages: 本次运行的阶段
+    """
+    if args.memory_budget_mb <= 0:
+        return None
+    from model_manager import ModelManager
+    
+    def is_loaded(name: str, attr: str) -> bool:
+        instance = registry.loaded(name)
+        return instance is not None and getattr(instance, attr) not in (None, False)
+    
+    def unload(name: str) -> bool:
+        instance = registry.loaded(name)
+        return instance is not None and instance.unload_model()
+    
+    manager = ModelManager(budget_mb=args.memory_budget_mb)
+    if args.use_local_model and "poster" in stages:
+        manager.register("poster", load=lambda: backend("poster").load_model(), unload=lambda: unload("poster"),
+                         is_loaded=lambda: is_loaded("poster", "pipe"))
+    # 分片合成时语音模型在工作进程中，不占用本进程的内存
+    if args.tts_shards <= 0 and "voice" in stages:
+        manager.register("voice", load=lambda: backend("voice").load_model(), unload=lambda: unload("voice"),
+                         is_loaded=lambda: is_loaded("voice", "model_loaded"))
+    return manager
+
+def record_run(store, jobs: List[Dict[str, Any]], stage_names: List[str], report_paths: Dict[str, str]):
+    """把每篇论文各阶段的产物和状态写入论文库
+    
+    Args:
+        store: 论文库
+        jobs: 流水线返回的任务字典
+        stage_names: 本次流水线的阶段
+        report_paths: 论文ID -> 包含该论文的每日报告
+    """
+    records = []
+    for job in jobs:
+        arxiv_id = job["paper"]["arxiv_id"]
+        for stage in stage_names:
+            if stage in job:
+                path = job[stage] if isinstance(job[stage], str) else None
+                records.append({"arxiv_id": arxiv_id, "stage": stage, "status": "done" if path else "failed",
+                                "path": path})
+            elif job.get("failed_stage") == stage:
+                records.append({"arxiv_id": arxiv_id, "stage": stage, "status": "failed", "error": str(job["error"])})
+        if arxiv_id in report_paths:
+            records.append({"arxiv_id": arxiv_id, "stage": "report", "status": "done", "path": report_paths[arxiv_id]})
+    store.set_artifacts(records)
+
+def run_daily(args: argparse.Namespace, registry: Optional[BackendRegistry] = None,
+              cache: Optional[ArtifactCache] = None, papers: Optional[List[Dict[str, Any]]] = None,
+              manager: Optional["ModelManager"] = None) -> Dict[str, Any]:
+    """运行一次每日播报流程
+    
+    Args:
+        args: 命令行参数
+        registry: 后端注册表，常驻工作进程传入已加载模型的注册表以跳过模型启动，为None时新建
+        cache: 产物缓存，为None且未指定--no_cache时新建
+        papers: 直接处理的论文列表，传入时跳过fetch阶段
+        manager: 模型管理器，常驻工作进程传入跨运行共用的管理器，为None时按本次运行的阶段新建
+        
+    Returns:
+        本次运行的结果: 论文数、成功和失败的论文、最终视频路径以及运行指标
+        
+    Raises:
+        ValueError: --stages包含未知的阶段
+    """
+    run_start = time.perf_counter()
+    stages_to_run = parse_stages(args.stages)
+    categories = [category.strip() for category in args.category.split(",") if category.strip()]
+    renditions = parse_renditions(args.renditions)
+    if papers is not None and "fetch" in stages_to_run:
+        stages_to_run.remove("fetch")
     
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
     
-    # 设置各模块的保存目录
+    # 设置各模块的保存目录，常驻工作进程跨天运行时每次都按当天日期计算
     today = datetime.datetime.now().strftime("%Y-%m-%d")
-    data_dir = os.path.join(args.output_dir, "data")
-    poster_dir = os.path.join(args.output_dir, "posters", today)
-    script_dir = os.path.join(args.output_dir, "scripts", today)
-    audio_dir = os.path.join(args.output_dir, "audios", today)
-    video_dir = os.path.join(args.output_dir, "videos", today)
+    dirs = output_dirs(args.output_dir, today)
+    poster_dir = dirs["poster"]
+    script_dir = dirs["script"]
+    audio_dir = dirs["voice"]
+    
+    # 记录各阶段耗时、计数器和内存，运行结束时写入指标文件
+    recorder = metrics.reset()
+    recorder.start_sampling()
+    
+    # 跨运行复用相同输入的产物
+    if cache is None:
+        cache = create_cache(args)
+    if registry is None:
+        registry = create_registry(args, cache)
+    
+    # 常驻的后端可能创建于前一天，第一次使用时指向本次运行的输出目录
+    backend_settings = {name: {"save_dir": path} for name, path in dirs.items()}
+    prepared = set()
+    prepare_lock = threading.Lock()
+    
+    def backend(name: str):
+        instance = registry.get(name)
+        if name not in prepared:
+            with prepare_lock:
+                if name not in prepared:
+                    for attr, value in backend_settings[name].items():
+                        setattr(instance, attr, value)
+                    os.makedirs(instance.save_dir, exist_ok=True)
+                    prepared.add(name)
+        return instance
+    
+    # 按内存预算管理海报和语音模型，未设置预算时模型加载后一直常驻
+    if manager is None:
+        manager = create_model_manager(args, backend, registry, stages_to_run)
+    
+    def model(name: str):
+        return manager.use(name) if manager is not None else contextlib.nullcontext()
+    
+    # 批量推理（或模板海报的进程池渲染）需要一次拿到多篇论文，先批量生成所有海报，其余阶段仍以流水线方式执行。
+    # 内存预算放不下SD和语音模型时也先生成全部海报，然后释放SD模型，避免两个模型在流水线中轮流换入换出；
+    # 混合海报需要当天的全部论文才能聚类
+    poster_first = manager is not None and "voice" in stages_to_run and not manager.fits("poster", "voice")
+    clustered = args.use_local_model and args.poster_clusters
+    batch_posters = "poster" in stages_to_run and (args.poster_batch_size > 1 or poster_first or clustered)
+    
+    result = {"date": today, "papers": 0, "succeeded": [], "failed": {}, "final_video": None, "reports": {},
+              "renditions": {}}
     
     # 1. 获取arXiv论文
-    print("正在获取arXiv论文...")
-    fetcher = ArxivPaperFetcher(save_dir=data_dir)
-    papers = fetcher.fetch_daily_papers(category=args.category, max_results=args.max_papers)
+    # 边获取边处理时papers是生成器，论文数在流水线结束后才知道
+    streamed = False
+    fetched = False
+    if papers is not None:
+        papers = papers[:args.max_papers]
+    elif "fetch" in stages_to_run and args.stream_fetch and len(categories) == 1 and not batch_posters:
+        print("正在逐页获取arXiv论文...")
+        fetcher = backend("fetcher")
+        
+        def stream_papers():
+            with metrics.span("fetch", category=args.category, stream=True):
+                yield from fetcher.iter_papers(category=categories[0], max_results=args.max_papers,
+                                               incremental=args.incremental)
+        
+        papers = stream_papers()
+        streamed = fetched = True
+    elif "fetch" in stages_to_run:
+        fetched = True
+        print("正在获取arXiv论文...")
+        with metrics.span("fetch", category=args.category):
+            if len(categories) > 1:
+                papers = backend("fetcher").fetch_categories(categories, max_results=args.max_papers,
+                                                             incremental=args.incremental)
+            else:
+                papers = backend("fetcher").fetch_daily_papers(category=categories[0], max_results=args.max_papers,
+                                                               incremental=args.incremental)
+    elif args.papers_file:
+        from arxiv_daily_papers import load_papers
+        print(f"跳过fetch阶段，从 {args.papers_file} 读取论文")
+        papers = load_papers(args.papers_file)[:args.max_papers]
+    else:
+        # 读取当天获取的论文，有论文库时以论文库为准
+        print(f"跳过fetch阶段，读取 {today} 获取的论文")
+        papers = backend("fetcher").load_daily(today)[:args.max_papers]
     
-    if not papers:
-        print("未获取到论文，程序退出")
-        return
+    if not streamed:
+        if not papers:
+            print("未获取到论文，程序退出")
+            recorder.stop_sampling()
+            return result
+        result["papers"] = len(papers)
     
-    # 2. 为每篇论文生成海报
-    print("\n正在生成论文海报...")
-    poster_generator = PosterGenerator(save_dir=poster_dir, use_local_model=args.use_local_model)
-    poster_paths = []
+    # 2-5. 海报、文案、语音、视频以流水线方式并发执行
+    run_video = "video" in stages_to_run
     
-    for i, paper in enumerate(papers):
-        poster_path = poster_generator.generate_poster(paper, i)
-        poster_paths.append(poster_path)
+    # 在并行编码数和每个编码器的线程数之间分配CPU核心
+    video_workers, encode_threads = 1, 0
+    encode_pool = None
+    if run_video:
+        from video_generator import plan_encode_workers
+        # 边获取边处理时按论文数上限分配
+        video_workers, encode_threads = plan_encode_workers(args.max_papers if streamed else len(papers),
+                                                            args.encode_threads or None)
+        if args.video_workers > 0:
+            video_workers = args.video_workers
+        backend_settings["video"]["threads"] = encode_threads
+        # still模式直接启动ffmpeg子进程，线程即可并行；moviepy模式在Python中逐帧渲染，需要进程池绕开GIL
+        if args.encode_mode == "moviepy" and not args.single_pass:
+            encode_pool = ProcessPoolExecutor(max_workers=video_workers)
     
-    # 3. 为每篇论文生成文案
-    print("\n正在生成播报文案...")
-    script_generator = ScriptGenerator(save_dir=script_dir)
-    script_paths = []
+    batched_posters = None
+    if batch_posters:
+        print("\n正在分批生成论文海报...")
+        with model("poster"):
+            batched_posters = backend("poster").generate_posters(papers)
+        if poster_first:
+            manager.retire("poster")
     
-    for i, paper in enumerate(papers):
-        script_path = script_generator.generate_script(paper, i)
-        script_paths.append(script_path)
+    def download_pdf(job):
+        # 下载失败不影响其他阶段，job["pdf"]为None
+        return backend("pdf").download_paper(job["paper"])
     
-    # 4. 为每篇文案生成语音
-    print("\n正在生成播报语音...")
-    voice_generator = VoiceGenerator(save_dir=audio_dir)
-    audio_paths = []
+    def make_poster(job):
+        if batched_posters is not None:
+            return batched_posters[job["index"]]
+        with model("poster"):
+            return backend("poster").generate_poster(job["paper"], job["index"])
     
-    for i, paper in enumerate(papers):
-        audio_path = voice_generator.generate_voice(script_paths[i], paper["arxiv_id"], i)
-        audio_paths.append(audio_path)
+    def make_script(job):
+        return backend("script").generate_script(job["paper"], job["index"])
     
-    # 5. 为每篇论文生成视频
-    print("\n正在生成单篇论文视频...")
-    video_generator = VideoGenerator(save_dir=video_dir)
-    video_paths = []
+    def make_voice(job):
+        with model("voice"):
+            return backend("voice").generate_voice(job["script"], job["paper"]["arxiv_id"], job["index"])
     
-    for i, paper in enumerate(papers):
-        video_path = video_generator.generate_video(poster_paths[i], audio_paths[i], paper["arxiv_id"], i)
-        if video_path:
-            video_paths.append(video_path)
+    def make_video(job):
+        video_path = backend("video").generate_video(job["poster"], job["voice"], job["paper"]["arxiv_id"],
+                                                          job["index"], executor=encode_pool)
+        if not video_path:
+            raise RuntimeError("视频编码失败")
+        return video_path
+    
+    # 未运行的阶段如果被下游阶段需要，则复用之前生成的产物
+    needs_poster = run_video
+    needs_script = "voice" in stages_to_run
+    needs_voice = run_video
+    stages = []
+    if args.download_pdfs:
+        stages.append(("pdf", download_pdf, args.pdf_workers))
+    if "poster" in stages_to_run:
+        stages.append(("poster", make_poster, args.poster_workers))
+    elif needs_poster:
+        stages.append(("poster", reuse_artifact(poster_dir, "poster", ".png"), 1))
+    if "script" in stages_to_run:
+        stages.append(("script", make_script, args.script_workers))
+    elif needs_script:
+        stages.append(("script", reuse_artifact(script_dir, "script", ".txt"), 1))
+    if "voice" in stages_to_run:
+        stages.append(("voice", make_voice, args.voice_workers))
+    elif needs_voice:
+        stages.append(("voice", reuse_artifact(audio_dir, "audio", ".wav"), 1))
+    # 一次编码模式下不生成单篇视频，报告直接由海报和音频编码
+    if run_video and not args.single_pass:
+        stages.append(("video", make_video, video_workers))
+    
+    print(f"\n启动完成，本次运行用时{time.perf_counter() - run_start:.2f}秒"
+          f"（距进程启动{time.perf_counter() - PROCESS_START:.2f}秒），当前内存{current_rss_mb():.0f}MB")
+    jobs = []
+    if stages:
+        print(f"正在以流水线方式运行: {', '.join(name for name, _, _ in stages)}")
+        pipeline = PaperPipeline(stages, queue_size=args.queue_size)
+        jobs = pipeline.run(papers)
+    elif streamed:
+        jobs = [{"index": index, "paper": paper} for index, paper in enumerate(papers)]
+    if encode_pool is not None:
+        encode_pool.shutdown()
+    if streamed:
+        papers = [job["paper"] for job in jobs]
+        result["papers"] = len(papers)
+        if not papers:
+            print("未获取到论文，程序退出")
+            recorder.stop_sampling()
+            return result
+    if manager is not None:
+        manager.report()
+    
+    failed = [job for job in jobs if "error" in job]
+    if failed:
+        print(f"\n有{len(failed)}篇论文处理失败: " + ", ".join(
+            f"{job['paper']['arxiv_id']}({job['failed_stage']})" for job in failed))
+    succeeded = [job for job in jobs if "error" not in job]
+    result["succeeded"] = [job["paper"]["arxiv_id"] for job in succeeded]
+    result["failed"] = {job["paper"]["arxiv_id"]: job["failed_stage"] for job in failed}
+    
+    # 只有生成了最终视频的论文才算处理完成
+    if args.incremental and "fetch" in stages_to_run and run_video:
+        groups = group_by_category([job["paper"] for job in succeeded], categories)
+        for category, members in groups.items():
+            backend("fetcher").mark_processed(category, [succeeded[i]["paper"] for i in members])
     
     # 6. 合并所有视频
-    if video_paths:
-        print("\n正在合并所有视频...")
-        final_video = video_generator.combine_videos(video_paths)
-        if final_video:
-            print(f"\n视频生成完成! 最终视频: {final_video}")
-        else:
-            print("\n合并视频失败!")
+    report_paths: Dict[str, str] = {}
+    if not run_video:
+        print(f"\n已完成阶段: {', '.join(stages_to_run)}，成功{len(succeeded)}篇")
+    elif succeeded:
+        video_generator = backend("video")
+        # 每个类别一份报告，共用同一批单篇产物
+        groups = group_by_category([job["paper"] for job in succeeded], categories)
+        clipped = set()
+        for category, members in groups.items():
+            if not members:
+                print(f"\n{category} 没有成功生成的论文，跳过该类别的报告")
+                continue
+            category_jobs = [succeeded[i] for i in members]
+            name = category if len(categories) > 1 else None
+            print(f"\n正在合并{category}的{len(category_jobs)}个视频...")
+            with metrics.span("combine", category=category, papers=len(category_jobs), single_pass=args.single_pass):
+                if args.single_pass:
+                    # 交叉列出的论文只从第一份包含它的报告中切出单篇视频
+                    clip_indices = [None if job["index"] in clipped else job["index"] for job in category_jobs]
+                    clipped.update(job["index"] for job in category_jobs)
+                    final_video = video_generator.render_daily_report(
+                        [job["poster"] for job in category_jobs],
+                        [job["voice"] for job in category_jobs],
+                        [job["paper"]["arxiv_id"] for job in category_jobs],
+                        split_clips=args.split_clips,
+                        name=name,
+                        clip_indices=clip_indices,
+                    )
+                else:
+                    final_video = video_generator.combine_videos([job["video"] for job in category_jobs], name=name)
+            if final_video:
+                metrics.record_file("combine", final_video)
+                result["reports"][category] = final_video
+                for job in category_jobs:
+                    report_paths.setdefault(job["paper"]["arxiv_id"], final_video)
+                print(f"\n{category} 视频生成完成! 最终视频: {final_video}")
+                if renditions:
+                    with metrics.span("renditions", category=category, count=len(renditions)):
+                        manifest = video_generator.render_renditions(final_video, renditions)
+                    if manifest:
+                        result["renditions"][category] = manifest
+            else:
+                print(f"\n{category} 合并视频失败!")
+        if len(categories) == 1:
+            result["final_video"] = result["reports"].get(categories[0])
     else:
         print("\n没有生成任何视频!")
+    
+    # 记录各篇论文的产物和状态，获取的论文已由fetcher写入论文库
+    if not args.no_paper_db:
+        store = registry.get("store")
+        if not fetched:
+            store.upsert_papers(papers)
+        record_run(store, jobs, [name for name, _, _ in stages], report_paths)
+    
+    if cache is not None:
+        cache.evict()
+        cache.report()
+    registry.report()
+    
+    recorder.stop_sampling()
+    run_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    result["metrics"] = recorder.write(args.metrics_file or os.path.join(args.output_dir, "metrics", f"run_{run_time}.json"))
+    if args.trace_file:
+        recorder.write_trace(args.trace_file)
+    return result
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    try:
+        parse_stages(args.stages)
+        parse_renditions(args.renditions)
+    except ValueError as e:
+        parser.error(str(e))
+    run_daily(args)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
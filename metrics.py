@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import datetime
+import threading
+import contextlib
+from typing import Any, Dict, List, Optional
+
+from backends import current_rss_mb, peak_rss_mb
+
+def _distribution(values: List[float], total_field: Optional[str] = None) -> Dict[str, float]:
+    """计算一组样本的次数和分位数"""
+    ordered = sorted(values)
+    stats = {"count": len(ordered)}
+    if total_field:
+        stats[total_field] = sum(ordered)
+    stats.update({
+        "p50": ordered[len(ordered) // 2],
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        "max": ordered[-1],
+    })
+    return stats
+
+class MetricsRecorder:
+    def __init__(self):
+        """初始化一次运行的指标记录器
+
+        记录每次阶段调用的耗时区间、计数器、各阶段写出的字节数和内存采样，
+        运行结束后写成结构化的指标文件，也可以导出为Chrome trace供chrome://tracing或Perfetto查看。
+        """
+        self.started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self.bytes_written: Dict[str, int] = {}
+        self.values: List[Dict[str, Any]] = []
+        self.memory: List[List[float]] = []
+        # 正在执行的区间名称及其数量，内存采样同时计入这些区间的峰值
+        self._active: Dict[str, int] = {}
+        self.stage_peak_rss: Dict[str, float] = {}
+        self._thread_ids: Dict[int, int] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampling = threading.Event()
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._start
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any):
+        """记录一段代码的耗时
+
+        Args:
+            name: 区间名称，如 poster、llm、tts、encode
+            args: 附加信息，如论文ID，会写入trace
+        """
+        start = self._now()
+        error = None
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            end = self._now()
+            span = {"name": name, "start": start, "seconds": end - start, "thread": threading.current_thread().name}
+            if args:
+                span["args"] = args
+            if error:
+                span["error"] = error
+            rss = current_rss_mb()
+            with self._lock:
+                self._update_peaks(rss)
+                self._active[name] -= 1
+                if not self._active[name]:
+                    del self._active[name]
+                span["tid"] = self._thread_ids.setdefault(threading.get_ident(), len(self._thread_ids) + 1)
+                self.spans.append(span)
+
+    def _update_peaks(self, rss: float):
+        for name in self._active:
+            self.stage_peak_rss[name] = max(self.stage_peak_rss.get(name, 0.0), rss)
+
+    def count(self, name: str, value: int = 1):
+        """累加计数器，如缓存命中、各种备用方案的使用次数"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, paper: Optional[str] = None):
+        """记录一个观测值，如首token延迟、生成速度"""
+        with self._lock:
+            self.values.append({"name": name, "value": value, "paper": paper})
+
+    def record_file(self, stage: str, path: str):
+        """累计阶段写出的字节数"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self.bytes_written[stage] = self.bytes_written.get(stage, 0) + size
+
+    def sample_memory(self):
+        """记录一次当前进程的内存占用"""
+        sample = [self._now(), current_rss_mb()]
+        with self._lock:
+            self.memory.append(sample)
+            self._update_peaks(sample[1])
+
+    def start_sampling(self, interval: float = 1.0):
+        """在后台线程中按固定间隔采样内存"""
+        if self._sampler is not None:
+            return
+        self._stop_sampling.clear()
+
+        def sample():
+            while not self._stop_sampling.wait(interval):
+                self.sample_memory()
+
+        self.sample_memory()
+        self._sampler = threading.Thread(target=sample, name="metrics-memory", daemon=True)
+        self._sampler.start()
+
+    def stop_sampling(self):
+        """停止后台内存采样"""
+        if self._sampler is None:
+            return
+        self._stop_sampling.set()
+        self._sampler.join()
+        self._sampler = None
+        self.sample_memory()
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总本次运行的指标
+
+        Returns:
+            包含各区间耗时统计、每篇论文的阶段耗时、计数器、写出字节数和内存的字典
+        """
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            bytes_written = dict(self.bytes_written)
+            memory = list(self.memory)
+            values = list(self.values)
+            stage_peak_rss = dict(self.stage_peak_rss)
+
+        by_name: Dict[str, List[float]] = {}
+        papers: Dict[str, Dict[str, float]] = {}
+        for span in spans:
+            by_name.setdefault(span["name"], []).append(span["seconds"])
+            paper = span.get("args", {}).get("paper")
+            if paper:
+                stages = papers.setdefault(paper, {})
+                stages[span["name"]] = stages.get(span["name"], 0.0) + span["seconds"]
+
+        values_by_name: Dict[str, List[float]] = {}
+        for value in values:
+            values_by_name.setdefault(value["name"], []).append(value["value"])
+            if value["paper"]:
+                papers.setdefault(value["paper"], {})[value["name"]] = value["value"]
+
+        stats = {name: _distribution(samples, "total_seconds") for name, samples in by_name.items()}
+
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": self._now(),
+            "spans": stats,
+            "values": {name: _distribution(samples) for name, samples in values_by_name.items()},
+            "papers": papers,
+            "counters": counters,
+            "bytes_written": bytes_written,
+            "memory": {
+                "peak_rss_mb": max([peak_rss_mb()] + [mb for _, mb in memory]),
+                "stage_peak_rss_mb": stage_peak_rss,
+                "samples": memory,
+            },
+        }
+
+    def write(self, path: str) -> Dict[str, Any]:
+        """将指标汇总写入JSON文件"""
+        summary = self.summary()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"已保存运行指标: {path}")
+        return summary
+
+    def write_trace(self, path: str):
+        """导出Chrome trace格式的JSON，每个线程一行，内存作为计数器曲线"""
+        pid = os.getpid()
+        with self._lock:
+            events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "memory"}}]
+            named = set()
+            for span in self.spans:
+                if span["tid"] not in named:
+                    named.add(span["tid"])
+                    events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": span["tid"],
+                                   "args": {"name": span["thread"]}})
+                event = {"name": span["name"], "ph": "X", "pid": pid, "tid": span["tid"],
+                         "ts": span["start"] * 1e6, "dur": span["seconds"] * 1e6}
+                args = dict(span.get("args", {}))
+                if "error" in span:
+                    args["error"] = span["error"]
+                if args:
+                    event["args"] = args
+                events.append(event)
+            for seconds, mb in self.memory:
+                events.append({"name": "rss_mb", "ph": "C", "pid": pid, "tid": 0, "ts": seconds * 1e6,
+                               "args": {"rss_mb": mb}})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        print(f"已保存Chrome trace: {path}")
+
+# 进程内共享的记录器，各模块直接调用下面的函数记录指标，不需要逐层传递
+RECORDER = MetricsRecorder()
+
+def reset() -> MetricsRecorder:
+    """开始新的一次运行，丢弃之前记录的指标"""
+    global RECORDER
+    RECORDER.stop_sampling()
+    RECORDER = MetricsRecorder()
+    return RECORDER
+
+def span(name: str, **args: Any):
+    return RECORDER.span(name, **args)
+
+def count(name: str, value: int = 1):
+    RECORDER.count(name, value)
+
+def observe(name: str, value: float, paper: Optional[str] = None):
+    RECORDER.observe(name, value, paper)
+
+def record_file(stage: str, path: str):
+    RECORDER.record_file(stage, path)
@@ -0,0 +1,193 @@
+import time
+import threading
+import contextlib
+from typing import Callable, Dict, Optional
+import metrics
+from backends import current_rss_mb
+
+# 各模型常驻内存的初始估计（MB），首次加载后按实测的内存增量修正
+DEFAULT_FOOTPRINTS_MB = {
+    # Stable Diffusion 2.1，CPU上fp32权重
+    "poster": 5200.0,
+    # CosyVoice2-0.5B，含前端和声码器
+    "voice": 2600.0,
+}
+
+class _ManagedModel:
+    def __init__(self, name: str, load: Callable[[], None], unload: Callable[[], bool],
+                 is_loaded: Callable[[], bool], footprint_mb: float):
+        self.name = name
+        self.load = load
+        self.unload = unload
+        self.is_loaded = is_loaded
+        self.footprint_mb = footprint_mb
+        self.users = 0
+        self.loading = False
+        self.retired = False
+        self.last_used = 0.0
+        self.loads = 0
+        self.unloads = 0
+        self.load_seconds = 0.0
+
+    def resident(self) -> bool:
+        return self.loading or self.is_loaded()
+
+class ModelManager:
+    def __init__(self, budget_mb: float = 0.0):
+        """初始化模型管理器
+
+        海报和语音阶段的模型都很大，同时常驻时内存峰值是两者之和。管理器记录每个模型的内存占用，
+        加载新模型会超出预算时，先释放空闲的模型（优先释放已退役的，其次是最久未用的），
+        正在使用的模型要等到用完才会被释放。被释放的模型在下次使用时重新加载。
+
+        是否已加载由后端自己报告，模型在管理器之外被加载或释放时状态也是正确的。
+
+        Args:
+            budget_mb: 模型的内存预算（MB），0表示不限
+        """
+        self.budget_mb = budget_mb
+        self._models: Dict[str, _ManagedModel] = {}
+        self._cond = threading.Condition()
+
+    def register(self, name: str, load: Callable[[], None], unload: Callable[[], bool],
+                 is_loaded: Callable[[], bool], footprint_mb: Optional[float] = None):
+        """注册一个模型
+
+        Args:
+            name: 模型名称，与使用它的阶段同名
+            load: 加载模型的函数，已加载时应直接返回
+            unload: 释放模型的函数，返回是否确实释放了内存
+            is_loaded: 返回模型当前是否已加载
+            footprint_mb: 内存占用估计（MB），为None时使用DEFAULT_FOOTPRINTS_MB
+        """
+        if footprint_mb is None:
+            footprint_mb = DEFAULT_FOOTPRINTS_MB.get(name, 0.0)
+        self._models[name] = _ManagedModel(name, load, unload, is_loaded, footprint_mb)
+
+    def fits(self, *names: str) -> bool:
+        """这些模型能否同时放进内存预算"""
+        if self.budget_mb <= 0:
+            return True
+        return sum(self._models[name].footprint_mb for name in names if name in self._models) <= self.budget_mb
+
+    @contextlib.contextmanager
+    def use(self, name: str):
+        """在使用期间保证模型已加载且不会被释放
+
+        Args:
+            name: 模型名称，未注册的名称不做任何管理
+
+        Raises:
+            RuntimeError: 超出预算且空闲的模型无法释放
+        """
+        model = self._models.get(name)
+        if model is None:
+            yield
+            return
+        self._acquire(model)
+        try:
+            yield
+        finally:
+            with self._cond:
+                model.users -= 1
+                model.last_used = time.monotonic()
+                if model.retired and model.users == 0:
+                    self._unload(model)
+                self._cond.notify_all()
+
+    def retire(self, name: str):
+        """声明模型在本次运行中不再需要，空闲时立即释放；之后再次使用会重新加载"""
+        model = self._models.get(name)
+        if model is None:
+            return
+        with self._cond:
+            model.retired = True
+            if model.users == 0 and not model.loading:
+                self._unload(model)
+            self._cond.notify_all()
+
+    def _acquire(self, model: _ManagedModel):
+        with self._cond:
+            model.retired = False
+            while True:
+                if model.loading:
+                    # 其他线程正在加载同一个模型
+                    self._cond.wait()
+                    continue
+                if model.is_loaded():
+                    model.users += 1
+                    return
+                if self._make_room(model):
+                    break
+                print(f"内存预算不足，等待其他模型用完后再加载 {model.name}")
+                self._cond.wait()
+            model.loading = True
+            model.users += 1
+
+        # 加载耗时较长，不持有锁，其他模型可以照常使用和释放
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            with metrics.span("model_load", model=model.name):
+                model.load()
+        except BaseException:
+            with self._cond:
+                model.loading = False
+                model.users -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            model.loading = False
+            model.loads += 1
+            model.load_seconds += time.perf_counter() - start
+            # 重新加载时分配器可能复用已释放的内存，实测增量只用于调大估计
+            model.footprint_mb = max(model.footprint_mb, current_rss_mb() - rss_before)
+            metrics.count(f"model.{model.name}.loads")
+            self._cond.notify_all()
+
+    def _make_room(self, model: _ManagedModel) -> bool:
+        """释放空闲模型直到能放下model，需要等待正在使用的模型时返回False（调用方持有锁）"""
+        if self.budget_mb <= 0:
+            return True
+        others = [other for other in self._models.values() if other is not model and other.resident()]
+        used = sum(other.footprint_mb for other in others)
+        if used + model.footprint_mb <= self.budget_mb:
+            return True
+        idle = sorted((other for other in others if other.users == 0 and not other.loading),
+                      key=lambda other: (not other.retired, other.last_used))
+        for other in idle:
+            # 后端拒绝释放时内存没有腾出来，不能计入
+            if not self._unload(other) or other.resident():
+                continue
+            used -= other.footprint_mb
+            if used + model.footprint_mb <= self.budget_mb:
+                return True
+        residents = [other for other in others if other.resident()]
+        if not residents:
+            # 单个模型就超出预算，只能独占内存运行
+            print(f"警告: 模型 {model.name} 约需{model.footprint_mb:.0f}MB，超出内存预算{self.budget_mb:.0f}MB")
+            return True
+        if not any(other.users or other.loading for other in residents):
+            # 常驻的模型都空闲却释放不了，等待不会有结果
+            raise RuntimeError(f"内存预算不足以加载模型 {model.name}，无法释放模型: "
+                               f"{', '.join(other.name for other in residents)}")
+        return False
+
+    def _unload(self, model: _ManagedModel) -> bool:
+        """释放模型，返回模型是否已不在内存中"""
+        if not model.is_loaded():
+            return True
+        if not model.unload():
+            print(f"模型 {model.name} 未能释放")
+            return False
+        model.unloads += 1
+        metrics.count(f"model.{model.name}.unloads")
+        print(f"已释放模型 {model.name}，当前内存{current_rss_mb():.0f}MB")
+        return True
+
+    def report(self):
+        """打印各模型的加载和释放次数"""
+        print(f"\n模型内存管理（预算{self.budget_mb:.0f}MB）:")
+        for model in self._models.values():
+            print(f"  {model.name}: 约{model.footprint_mb:.0f}MB, 加载{model.loads}次（{model.load_seconds:.1f}秒）, "
+                  f"释放{model.unloads}次")
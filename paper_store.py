@@ -0,0 +1,285 @@
+import os
+import re
+import glob
+import json
+import sqlite3
+import argparse
+import datetime
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    arxiv_id TEXT PRIMARY KEY,
+    version TEXT,
+    title TEXT,
+    published TEXT,
+    published_at TEXT,
+    primary_category TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+CREATE TABLE IF NOT EXISTS paper_categories (
+    category TEXT NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    published TEXT,
+    PRIMARY KEY (category, arxiv_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS paper_categories_published ON paper_categories (category, published);
+CREATE INDEX IF NOT EXISTS paper_categories_id ON paper_categories (arxiv_id);
+CREATE TABLE IF NOT EXISTS artifacts (
+    arxiv_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    path TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (arxiv_id, stage)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS artifacts_status ON artifacts (stage, status);
+CREATE TABLE IF NOT EXISTS daily_papers (
+    day TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    PRIMARY KEY (day, position)
+) WITHOUT ROWID;
+"""
+
+def base_id(arxiv_id: str) -> str:
+    """去掉版本号后的论文ID"""
+    return re.sub(r"v\d+$", "", arxiv_id)
+
+class PaperStore:
+    def __init__(self, db_path: str = "data/papers.db"):
+        """初始化论文库
+
+        论文信息、所属类别以及各阶段的产物路径和状态保存在SQLite中，按论文ID、类别和日期建立索引，
+        查询某篇论文是否处理过或某个类别某段时间的论文时不需要读取每天的JSON文件。
+        论文以去掉版本号的ID为主键，新版本覆盖旧版本。
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        # 流水线的多个线程共用一个连接，由锁保证串行
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert_papers(self, papers: Iterable[Dict[str, Any]]) -> int:
+        """批量写入论文，已有的论文被更新
+
+        Args:
+            papers: 论文信息字典，格式与fetcher返回的相同
+
+        Returns:
+            写入的论文数
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = []
+        categories = []
+        for paper in papers:
+            paper_id = base_id(paper["arxiv_id"])
+            version = paper["arxiv_id"][len(paper_id):] or None
+            rows.append((paper_id, version, paper.get("title"), paper.get("published"), paper.get("published_at"),
+                         paper.get("primary_category"), json.dumps(paper, ensure_ascii=False), now))
+            paper_categories = paper.get("categories") or [paper.get("primary_category")]
+            categories.extend((category, paper_id, paper.get("published"))
+                              for category in dict.fromkeys(paper_categories) if category)
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO papers (arxiv_id, version, title, published, published_at, primary_category, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (arxiv_id) DO UPDATE SET version = excluded.version, title = excluded.title, "
+                "published = excluded.published, published_at = excluded.published_at, "
+                "primary_category = excluded.primary_category, data = excluded.data, updated_at = excluded.updated_at",
+                rows)
+            # 新版本的类别可能变化，先删除旧的类别记录
+            self._conn.executemany("DELETE FROM paper_categories WHERE arxiv_id = ?", [(row[0],) for row in rows])
+            self._conn.executemany("INSERT OR REPLACE INTO paper_categories (category, arxiv_id, published) VALUES (?, ?, ?)",
+                                   categories)
+        return len(rows)
+    
+    def set_daily(self, day: str, papers: Iterable[Dict[str, Any]], append: bool = False):
+        """记录某天获取的论文及其顺序，不运行fetch阶段时作为流水线的输入
+        
+        Args:
+            day: 日期（YYYY-MM-DD）
+            papers: 论文信息字典，应已通过upsert_papers写入
+            append: 追加到当天已有的记录之后，为False时替换当天的记录
+        """
+        ids = [base_id(paper["arxiv_id"]) for paper in papers]
+        with self._lock, self._conn:
+            if append:
+                start = self._conn.execute("SELECT COUNT(*) FROM daily_papers WHERE day = ?", (day,)).fetchone()[0]
+            else:
+                self._conn.execute("DELETE FROM daily_papers WHERE day = ?", (day,))
+                start = 0
+            self._conn.executemany("INSERT INTO daily_papers (day, position, arxiv_id) VALUES (?, ?, ?)",
+                                   [(day, start + i, paper_id) for i, paper_id in enumerate(ids)])
+    
+    def daily(self, day: str) -> List[Dict[str, Any]]:
+        """返回某天获取的论文，按获取时的顺序排列"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.data FROM daily_papers d JOIN papers p ON p.arxiv_id = d.arxiv_id "
+                "WHERE d.day = ? ORDER BY d.position", (day,)).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def get(self, arxiv_id: str) -> Optional[Dict[str, Any]]:
+        """按ID查询论文，带不带版本号均可"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE arxiv_id = ?", (base_id(arxiv_id),)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def known_ids(self, arxiv_ids: Iterable[str]) -> Set[str]:
+        """返回已在库中的论文ID（去掉版本号）"""
+        ids = list(dict.fromkeys(base_id(arxiv_id) for arxiv_id in arxiv_ids))
+        known = set()
+        with self._lock:
+            # SQLite对参数个数有限制，分批查询
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT arxiv_id FROM papers WHERE arxiv_id IN ({','.join('?' * len(chunk))})", chunk)
+                known.update(row["arxiv_id"] for row in rows)
+        return known
+
+    def query(self, category: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按类别和发表日期查询论文
+
+        Args:
+            category: arXiv类别，为None时不限
+            since: 起始日期（YYYY-MM-DD，含）
+            until: 结束日期（YYYY-MM-DD，含）
+            limit: 最多返回的论文数
+
+        Returns:
+            按提交时间倒序排列的论文信息字典列表
+        """
+        conditions = []
+        params: List[Any] = []
+        if category:
+            sql = "SELECT p.data FROM paper_categories c JOIN papers p ON p.arxiv_id = c.arxiv_id"
+            conditions.append("c.category = ?")
+            params.append(category)
+            date_column = "c.published"
+        else:
+            sql = "SELECT p.data FROM papers p"
+            date_column = "p.published"
+        if since:
+            conditions.append(f"{date_column} >= ?")
+            params.append(since)
+        if until:
+            conditions.append(f"{date_column} <= ?")
+            params.append(until)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {date_column} DESC, p.published_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def set_artifacts(self, records: Iterable[Dict[str, Any]]):
+        """批量记录论文在各阶段的产物和状态
+
+        Args:
+            records: 每项包含 arxiv_id、stage、status（done/failed等），以及可选的 path 和 error
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = [(base_id(record["arxiv_id"]), record["stage"], record["status"], record.get("path"),
+                 record.get("error"), now) for record in records]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO artifacts (arxiv_id, stage, status, path, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def set_artifact(self, arxiv_id: str, stage: str, status: str = "done", path: Optional[str] = None,
+                     error: Optional[str] = None):
+        """记录论文在一个阶段的产物和状态"""
+        self.set_artifacts([{"arxiv_id": arxiv_id, "stage": stage, "status": status, "path": path, "error": error}])
+
+    def artifacts(self, arxiv_id: str) -> Dict[str, Dict[str, Any]]:
+        """返回论文各阶段的产物和状态: 阶段名 -> {status, path, error, updated_at}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, status, path, error, updated_at FROM artifacts WHERE arxiv_id = ?",
+                                      (base_id(arxiv_id),)).fetchall()
+        return {row["stage"]: {key: row[key] for key in ("status", "path", "error", "updated_at")} for row in rows}
+
+    def with_status(self, stage: str, status: str) -> List[str]:
+        """返回某阶段处于某状态的论文ID，如 with_status("video", "failed")"""
+        with self._lock:
+            rows = self._conn.execute("SELECT arxiv_id FROM artifacts WHERE stage = ? AND status = ?",
+                                      (stage, status)).fetchall()
+        return [row["arxiv_id"] for row in rows]
+
+    def import_json(self, data_dir: str) -> int:
+        """导入已有的 arxiv_papers_*.json 和 .jsonl 文件，可重复执行
+
+        Args:
+            data_dir: 论文数据目录
+
+        Returns:
+            导入的论文数（含重复）
+        """
+        from arxiv_daily_papers import load_papers
+        paths = sorted(glob.glob(os.path.join(data_dir, "arxiv_papers_*.json")) +
+                       glob.glob(os.path.join(data_dir, "arxiv_papers_*.jsonl")))
+        total = 0
+        for path in paths:
+            try:
+                papers = load_papers(path)
+            except (OSError, ValueError) as e:
+                print(f"读取 {path} 失败，已跳过: {e}")
+                continue
+            total += self.upsert_papers(papers)
+            day = re.search(r"arxiv_papers_(\d{4}-\d{2}-\d{2})", os.path.basename(path))
+            if day:
+                self.set_daily(day.group(1), papers)
+        print(f"已从{len(paths)}个文件导入{total}篇论文到 {self.db_path}")
+        return total
+
+def main():
+    parser = argparse.ArgumentParser(description="论文库: 导入已有的论文数据并查询")
+    parser.add_argument("--db", type=str, default="data/papers.db", help="数据库文件路径")
+    parser.add_argument("--import_dir", type=str, default=None, help="导入该目录下的arxiv_papers_*.json文件")
+    parser.add_argument("--id", type=str, default=None, help="查询一篇论文及其各阶段的产物")
+    parser.add_argument("--day", type=str, default=None, help="列出某天获取的论文（YYYY-MM-DD）")
+    parser.add_argument("--category", type=str, default=None, help="按类别查询")
+    parser.add_argument("--since", type=str, default=None, help="起始日期（YYYY-MM-DD）")
+    parser.add_argument("--until", type=str, default=None, help="结束日期（YYYY-MM-DD）")
+    parser.add_argument("--limit", type=int, default=20, help="最多显示的论文数")
+    args = parser.parse_args()
+
+    store = PaperStore(args.db)
+    if args.import_dir:
+        store.import_json(args.import_dir)
+    if args.id:
+        paper = store.get(args.id)
+        print(json.dumps({"paper": paper, "artifacts": store.artifacts(args.id)}, ensure_ascii=False, indent=2))
+    elif args.day:
+        for paper in store.daily(args.day)[:args.limit]:
+            print(f"{paper['published']}  {paper['arxiv_id']}  {paper['title']}")
+    elif args.category or args.since or args.until:
+        for paper in store.query(args.category, args.since, args.until, args.limit):
+            print(f"{paper['published']}  {paper['arxiv_id']}  {paper['title']}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
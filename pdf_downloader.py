@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from artifact_cache import ArtifactCache
+
+# PDF文件头，arXiv在论文尚未生成PDF时会返回HTML页面
+PDF_MAGIC = b"%PDF"
+
+class _RateLimiter:
+    """多个线程共享的请求间隔限制"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """等待到下一个可以发出请求的时刻"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def defer(self, seconds: float):
+        """服务器要求退避时，推迟所有线程的下一个请求"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+class _RetryLater(Exception):
+    def __init__(self, status: int, seconds: Optional[float]):
+        super().__init__(f"服务器返回{status}")
+        self.seconds = seconds
+
+class PdfDownloader:
+    def __init__(self, save_dir: str = "pdfs", concurrency: int = 4, rate_limit: float = 1.0, timeout: float = 60.0,
+                 retries: int = 3, backoff: float = 2.0, chunk_size: int = 1 << 16,
+                 session: Optional[requests.Session] = None):
+        """初始化论文PDF下载器
+
+        所有下载共用一个保持连接的HTTP会话，连接池大小与并发数一致。请求按rate_limit统一限速，
+        收到429/503时按Retry-After推迟所有线程的请求。中断的下载保留在partial目录中，
+        重试时用Range请求续传。下载完成的文件按内容的sha256存放，同一份PDF只保存一次，
+        URL到内容的对应关系记录在index.json中，跨运行复用。
+
+        Args:
+            save_dir: 保存PDF的目录
+            concurrency: download_all的并发下载数，也是连接池的大小
+            rate_limit: 每秒最多发出的请求数，0表示不限速
+            timeout: 连接和读取的超时时间（秒）
+            retries: 失败后的最大重试次数
+            backoff: 重试的初始等待时间（秒），每次重试翻倍
+            chunk_size: 每次写入磁盘的字节数
+            session: 已配置的HTTP会话，为None时新建
+        """
+        self.save_dir = save_dir
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.session = session or self._create_session()
+        self._limiter = _RateLimiter(rate_limit)
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._index_dir: Optional[str] = None
+        os.makedirs(save_dir, exist_ok=True)
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = "ai-paper-daily/1.0 (paper video digest)"
+        return session
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.save_dir, "objects", digest[:2], f"{digest}.pdf")
+
+    def _partial_path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.save_dir, "partial", f"{name}.part")
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        # 常驻工作进程中save_dir可能被改变，索引跟随目录重新加载
+        if self._index is None or self._index_dir != self.save_dir:
+            path = os.path.join(self.save_dir, "index.json")
+            self._index = {}
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"读取PDF索引失败，将重新下载: {e}")
+            self._index_dir = self.save_dir
+        return self._index
+
+    def _save_index(self):
+        path = os.path.join(self.save_dir, "index.json")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """返回已下载的PDF路径，未下载时返回None"""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry is None:
+            return None
+        path = self._object_path(entry["sha256"])
+        return path if os.path.exists(path) else None
+
+    def download(self, url: str) -> Optional[str]:
+        """下载一个PDF
+
+        Args:
+            url: PDF地址
+
+        Returns:
+            按内容哈希存放的PDF路径，下载失败时返回None
+        """
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        # 同一URL同时只有一个线程下载，避免写坏共用的续传文件
+        with url_lock:
+            path = self.lookup(url)
+            if path:
+                metrics.count("cache.pdf.hits")
+                return path
+            metrics.count("cache.pdf.misses")
+
+            for attempt in range(self.retries + 1):
+                try:
+                    return self._fetch(url)
+                except _RetryLater as e:
+                    wait = e.seconds if e.seconds is not None else self.backoff * 2 ** attempt
+                    self._limiter.defer(wait)
+                    error = e
+                except (requests.RequestException, OSError) as e:
+                    wait = self.backoff * 2 ** attempt
+                    error = e
+                if attempt < self.retries:
+                    print(f"下载 {url} 失败: {error}，{wait:.1f}秒后重试（第{attempt + 1}次）")
+                    time.sleep(wait)
+            print(f"下载 {url} 失败，已重试{self.retries}次: {error}")
+            metrics.count("pdf.failed")
+            return None
+
+    def _fetch(self, url: str) -> Optional[str]:
+        """发出一次请求，从已下载的部分续传
+
+        Raises:
+            _RetryLater: 服务器要求稍后重试
+            requests.RequestException: 网络错误、服务器错误或下载不完整
+        """
+        partial = self._partial_path(url)
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        self._limiter.wait()
+        with metrics.span("pdf_download", url=url, resume_from=offset):
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code in (429, 503):
+                    retry_after = response.headers.get("Retry-After")
+                    raise _RetryLater(response.status_code,
+                                      float(retry_after) if retry_after and retry_after.isdigit() else None)
+                if response.status_code == 416:
+                    # 续传位置无效（文件在服务器上变了），从头下载
+                    os.remove(partial)
+                    raise requests.HTTPError(f"续传位置{offset}无效", response=response)
+                if 400 <= response.status_code < 500:
+                    print(f"下载 {url} 失败: 服务器返回{response.status_code}")
+                    metrics.count("pdf.failed")
+                    return None
+                response.raise_for_status()
+
+                if response.status_code != 206:
+                    # 服务器不支持Range时返回完整内容
+                    offset = 0
+                expected = response.headers.get("Content-Length")
+                expected = offset + int(expected) if expected and expected.isdigit() else None
+                with open(partial, 'ab' if offset else 'wb') as f:
+                    for block in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(block)
+
+        size = os.path.getsize(partial)
+        if expected is not None and size < expected:
+            raise requests.ConnectionError(f"下载不完整: {size}/{expected}字节")
+        return self._store(url, partial)
+
+    def _store(self, url: str, partial: str) -> Optional[str]:
+        """校验下载的文件并按内容哈希存放"""
+        with open(partial, 'rb') as f:
+            head = f.read(len(PDF_MAGIC))
+        if head != PDF_MAGIC:
+            os.remove(partial)
+            print(f"下载 {url} 得到的不是PDF文件，已丢弃")
+            metrics.count("pdf.failed")
+            return None
+
+        digest = ArtifactCache.file_digest(partial)
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # 内容相同的PDF已经存在（如同一论文的不同地址）
+            os.remove(partial)
+        else:
+            os.replace(partial, path)
+            metrics.record_file("pdf", path)
+        with self._lock:
+            self._load_index()[url] = {"sha256": digest, "size": os.path.getsize(path),
+                                       "downloaded_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self._save_index()
+        return path
+
+    def download_paper(self, paper: Dict[str, Any]) -> Optional[str]:
+        """下载一篇论文的PDF"""
+        if not paper.get("pdf_url"):
+            print(f"论文 {paper['arxiv_id']} 没有PDF地址")
+            return None
+        path = self.download(paper["pdf_url"])
+        if path:
+            print(f"已获取论文 {paper['arxiv_id']} 的PDF: {path}")
+        return path
+
+    def download_all(self, papers: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """并发下载多篇论文的PDF
+
+        Args:
+            papers: 论文信息字典列表
+
+        Returns:
+            与papers对应的PDF路径列表，失败的论文为None
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="pdf") as executor:
+            return list(executor.map(self.download_paper, papers))
@@ -0,0 +1,103 @@
+import queue
+import threading
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+import metrics
+
+# 队列结束标记
+_SENTINEL = object()
+
+class PaperPipeline:
+    def __init__(self, stages: List[Tuple[str, Callable[[Dict[str, Any]], Any], int]], queue_size: int = 2):
+        """初始化流水线执行器
+
+        每个阶段由若干工作线程组成，阶段之间通过有界队列连接，
+        因此第1篇论文在编码视频时，第5篇论文可以同时在生成文案。
+
+        Args:
+            stages: 阶段列表，每项为 (阶段名, 处理函数, 工作线程数)。
+                处理函数接收任务字典，返回值保存到 job[阶段名]
+            queue_size: 阶段之间队列的最大长度，0表示不限
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.stages = [(name, func, max(1, workers)) for name, func, workers in stages]
+        self.queue_size = queue_size
+
+    def run(self, papers: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """让所有论文流过各个阶段
+
+        Args:
+            papers: 论文信息字典的可迭代对象
+
+        Returns:
+            按论文顺序排列的任务字典列表。成功的阶段结果保存在 job[阶段名]，
+            失败的任务带有 "error" 和 "failed_stage" 字段
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        results: Dict[int, Dict[str, Any]] = {}
+        threads = []
+
+        def feed():
+            try:
+                for index, paper in enumerate(papers):
+                    queues[0].put({"index": index, "paper": paper})
+            except Exception as e:
+                # 论文来源出错时不再继续投喂，但已投喂的任务照常完成
+                print(f"读取论文列表失败: {e}")
+            finally:
+                for _ in range(self.stages[0][2]):
+                    queues[0].put(_SENTINEL)
+
+        threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+
+        for stage_index, (name, func, workers) in enumerate(self.stages):
+            in_queue = queues[stage_index]
+            out_queue = queues[stage_index + 1]
+            next_workers = self.stages[stage_index + 1][2] if stage_index + 1 < len(self.stages) else 1
+            remaining = [workers]
+            lock = threading.Lock()
+
+            def work(name=name, func=func, in_queue=in_queue, out_queue=out_queue,
+                     next_workers=next_workers, remaining=remaining, lock=lock):
+                while True:
+                    job = in_queue.get()
+                    if job is _SENTINEL:
+                        break
+                    if "error" not in job:
+                        try:
+                            with metrics.span(name, paper=job['paper'].get('arxiv_id')):
+                                job[name] = func(job)
+                        except Exception as e:
+                            # 单篇论文失败不影响其他论文，后续阶段会跳过该任务
+                            job["error"] = e
+                            job["failed_stage"] = name
+                            metrics.count(f"{name}.failed")
+                            print(f"论文 {job['paper'].get('arxiv_id')} 在阶段 {name} 失败: {e}")
+                            traceback.print_exc()
+                    out_queue.put(job)
+                # 本阶段最后一个退出的线程负责通知下一阶段
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        out_queue.put(_SENTINEL)
+
+            for worker_index in range(workers):
+                threads.append(threading.Thread(target=work, name=f"pipeline-{name}-{worker_index}", daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        # 在当前线程收集结果，避免最后一个队列被填满
+        while True:
+            job = queues[-1].get()
+            if job is _SENTINEL:
+                break
+            results[job["index"]] = job
+
+        for thread in threads:
+            thread.join()
+
+        return [results[index] for index in sorted(results)]
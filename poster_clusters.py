@@ -0,0 +1,108 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+# 论文标题和摘要中常见但不区分主题的词
+STOPWORDS = frozenset("""
+a about above across after again against all also although among an and any approach approaches are as at based be
+because been before being between both but by can could data do does done during each either et etc few for from
+further has have having here how however if in into is it its itself large learning may method methods model models
+more most much new not novel of on one only or other our out over paper per present propose proposed provide
+results same several show shows significant significantly such task tasks than that the their them then there these
+they this those through to towards two under up use used uses using various very via was we well were what when where
+whether which while who will with within without work would yet
+""".split())
+
+# 英文单词（允许中间的连字符和数字），至少三个字符
+WORD = re.compile(r"[a-z][a-z0-9]*(?:-[a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为小写单词并去掉停用词"""
+    return [word for word in WORD.findall(text.lower()) if len(word) >= 3 and word not in STOPWORDS]
+
+def tfidf_matrix(texts: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """计算文本的TF-IDF向量
+
+    词频取对数，IDF做平滑，每行按L2归一化，两行的点积即余弦相似度。
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        (形状为 文本数 x 词数 的矩阵, 与列对应的词)
+    """
+    docs = [tokenize(text) for text in texts]
+    vocabulary: Dict[str, int] = {}
+    for doc in docs:
+        for word in doc:
+            vocabulary.setdefault(word, len(vocabulary))
+    counts = np.zeros((len(docs), max(1, len(vocabulary))), dtype=np.float32)
+    for row, doc in enumerate(docs):
+        if doc:
+            counts[row] = np.bincount([vocabulary[word] for word in doc], minlength=counts.shape[1])
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(docs)) / (1 + document_frequency)) + 1
+    matrix = np.log1p(counts) * idf
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix, list(vocabulary)
+
+def cluster_papers(papers: List[Dict[str, Any]], threshold: float = 0.2, max_clusters: Optional[int] = None,
+                   max_keywords: int = 6) -> List[Dict[str, Any]]:
+    """按标题和摘要的TF-IDF相似度把论文聚成主题簇
+
+    每篇论文先自成一簇，反复合并质心余弦相似度最高的两簇，直到最高相似度低于threshold
+    且簇数不超过max_clusters。标题在文本中重复一次，权重高于摘要。
+
+    Args:
+        papers: 论文信息字典列表
+        threshold: 合并两簇所需的最低相似度，越高簇越多
+        max_clusters: 簇数上限，超出时继续合并最相似的簇，为None时不限
+        max_keywords: 每簇提取的关键词数
+
+    Returns:
+        簇列表，每项包含 indices（论文在papers中的下标）和 keywords（按权重排序的关键词），
+        按第一篇论文的下标排序
+    """
+    if not papers:
+        return []
+    matrix, words = tfidf_matrix([f"{paper['title']} {paper['title']} {paper['summary']}" for paper in papers])
+    members = [[i] for i in range(len(papers))]
+    sums = matrix.astype(np.float64)
+    while len(members) > 1:
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        similarity = centroids @ centroids.T
+        np.fill_diagonal(similarity, -1.0)
+        first, second = np.unravel_index(np.argmax(similarity), similarity.shape)
+        if similarity[first, second] < threshold and (max_clusters is None or len(members) <= max_clusters):
+            break
+        first, second = min(first, second), max(first, second)
+        members[first].extend(members.pop(second))
+        sums[first] += sums[second]
+        sums = np.delete(sums, second, axis=0)
+
+    clusters = []
+    for indices, weights in zip(members, sums):
+        top = [int(i) for i in np.argsort(-weights, kind="stable")[:max_keywords] if weights[i] > 0]
+        clusters.append({"indices": sorted(indices), "keywords": [words[i] for i in top]})
+    clusters.sort(key=lambda cluster: cluster["indices"][0])
+    return clusters
+
+def background_prompt(keywords: List[str]) -> str:
+    """构建簇背景图的Stable Diffusion提示词，背景上要叠加文字，要求画面不含文字"""
+    topic = ", ".join(keywords) if keywords else "artificial intelligence research"
+    return (f"Abstract background illustration for AI research about {topic}. "
+            f"Soft colors, clean composition, no text, no letters")
+
+def soften(image: Image.Image, strength: float = 0.6) -> Image.Image:
+    """把背景图与白色混合，使叠加在上面的黑色文字清晰可读
+
+    Args:
+        image: 背景图
+        strength: 白色的比例，0为原图，1为纯白
+
+    Returns:
+        混合后的RGB图像
+    """
+    image = image.convert('RGB')
+    return Image.blend(image, Image.new('RGB', image.size, (255, 255, 255)), strength)
@@ -1,33 +1,134 @@
 import os
-import requests
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
-import torch
-from diffusers import StableDiffusionPipeline
-from typing import Dict, Any
+import gc
+import time
+import threading
+from collections import OrderedDict
+from PIL import Image
+from typing import Dict, Any, List, Optional, Tuple
+import metrics
+from artifact_cache import ArtifactCache
+from poster_template import TemplateRenderer, render_posters
+from poster_clusters import cluster_papers, background_prompt, soften
+
+# --sd_scheduler 可选的采样器名称与diffusers中的类名
+SCHEDULERS = {
+    "dpm": "DPMSolverMultistepScheduler",
+    "euler": "EulerDiscreteScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+    "ddim": "DDIMScheduler",
+    "lms": "LMSDiscreteScheduler",
+    "pndm": "PNDMScheduler",
+}
 
 class PosterGenerator:
-    def __init__(self, save_dir: str = "posters", use_local_model: bool = True, model_id: str = "stabilityai/stable-diffusion-2-1"):
+    def __init__(self, save_dir: str = "posters", use_local_model: bool = True, model_id: str = "stabilityai/stable-diffusion-2-1",
+                 cache: Optional[ArtifactCache] = None, device: Optional[str] = None, dtype: str = "auto",
+                 num_inference_steps: Optional[int] = None, scheduler: Optional[str] = None, seed: Optional[int] = None,
+                 attention_slicing: Optional[bool] = None, batch_size: int = 1, pipe: Any = None,
+                 template_processes: Optional[int] = None, cluster_backgrounds: bool = False,
+                 cluster_threshold: float = 0.2, max_backgrounds: int = 8):
         """初始化海报生成器
         
         Args:
             save_dir: 保存海报的目录
             use_local_model: 是否使用本地模型
             model_id: 使用的模型ID
+            cache: 跨运行的产物缓存，为None时不使用缓存
+            device: 推理设备，为None时有GPU用cuda，否则用cpu
+            dtype: 模型权重精度，"auto"在GPU上用fp16、在CPU上用fp32，也可指定"fp16"/"fp32"/"bf16"
+            num_inference_steps: 采样步数，为None时使用模型默认值
+            scheduler: 采样器名称，见SCHEDULERS，为None时使用模型默认采样器
+            seed: 随机种子，每篇论文使用seed+论文索引，结果与批大小无关
+            attention_slicing: 是否启用注意力切片以降低内存峰值，为None时仅在CPU上启用
+            batch_size: 批量生成时每批的提示词数量
+            pipe: 已构建的推理管线，传入时不再加载模型，可用于替换为轻量的测试管线
+            template_processes: 批量渲染模板海报的进程数，为None时使用CPU核心数
+            cluster_backgrounds: 混合海报模式，按主题聚类论文，每个主题只用模型生成一张背景，
+                再用模板把每篇论文的标题、作者和摘要绘制在背景上；背景按主题关键词缓存，跨运行复用
+            cluster_threshold: 聚类时合并两个主题所需的最低TF-IDF相似度，越高主题越多
+            max_backgrounds: 混合海报模式下每次最多的主题数，即模型最多生成的背景数
         """
         self.save_dir = save_dir
+        self.model_id = model_id
+        self.cache = cache
+        self.num_inference_steps = num_inference_steps
+        self.scheduler = scheduler
+        self.seed = seed
+        self.batch_size = max(1, batch_size)
+        self.height = 768
+        self.width = 512
+        self.template = TemplateRenderer(self.width, self.height)
+        self.template_processes = template_processes
+        self.cluster_backgrounds = cluster_backgrounds
+        self.cluster_threshold = cluster_threshold
+        self.max_backgrounds = max(1, max_backgrounds)
+        # 进程内的背景缓存: 背景缓存键 -> 淡化后的背景图，不使用产物缓存时也能在常驻进程中跨运行复用
+        self._backgrounds: "OrderedDict[str, Image.Image]" = OrderedDict()
+        # 每批推理的耗时记录
+        self.batch_latencies: List[Dict[str, Any]] = []
         os.makedirs(save_dir, exist_ok=True)
         
-        if use_local_model:
-            # 加载本地Stable Diffusion模型
-            self.pipe = StableDiffusionPipeline.from_pretrained(
-                model_id,
-                torch_dtype=torch.float16
+        # torch和diffusers只在使用本地模型时导入，模板海报不需要为它们付出导入时间
+        if device is None:
+            device = "cpu"
+            if use_local_model and pipe is None:
+                import torch
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self.dtype = dtype
+        if dtype == "auto":
+            # CPU上fp16要么不支持要么很慢
+            self.dtype = "fp16" if self.device.startswith("cuda") else "fp32"
+        
+        self.use_local_model = use_local_model or pipe is not None
+        self.attention_slicing = attention_slicing
+        self.pipe = pipe
+        # 传入的管线由调用方管理，unload_model不会释放它
+        self._owns_pipe = pipe is None
+        self._model_lock = threading.Lock()
+        # 模型在第一次推理时才加载，设置了内存预算时由模型管理器在预算内调用load_model
+    
+    def load_model(self):
+        """加载本地Stable Diffusion模型，已加载或不使用本地模型时直接返回"""
+        with self._model_lock:
+            if self.pipe is not None or not self.use_local_model:
+                return
+            import torch
+            import diffusers
+            from diffusers import StableDiffusionPipeline
+            torch_dtype = {"fp16": torch.float16, "fp32": torch.float32, "bf16": torch.bfloat16}[self.dtype]
+            pipe = StableDiffusionPipeline.from_pretrained(
+                self.model_id,
+                torch_dtype=torch_dtype
             )
-            if torch.cuda.is_available():
-                self.pipe = self.pipe.to("cuda")
-        else:
+            if self.scheduler is not None:
+                scheduler_class = getattr(diffusers, SCHEDULERS[self.scheduler])
+                pipe.scheduler = scheduler_class.from_config(pipe.scheduler.config)
+            pipe = pipe.to(self.device)
+            attention_slicing = self.attention_slicing
+            if attention_slicing is None:
+                attention_slicing = self.device == "cpu"
+            if attention_slicing:
+                pipe.enable_attention_slicing()
+            self.pipe = pipe
+            print(f"已加载Stable Diffusion模型 {self.model_id}（{self.device}, {self.dtype}）")
+    
+    def unload_model(self) -> bool:
+        """释放Stable Diffusion模型占用的内存，下次生成海报时重新加载
+        
+        Returns:
+            是否释放了模型，传入的管线和未加载的模型不会被释放
+        """
+        with self._model_lock:
+            if self.pipe is None or not self._owns_pipe:
+                return False
             self.pipe = None
+        gc.collect()
+        if self.device.startswith("cuda"):
+            import torch
+            torch.cuda.empty_cache()
+        print(f"已释放Stable Diffusion模型 {self.model_id}")
+        return True
     
     def generate_poster(self, paper: Dict[str, Any], index: int) -> str:
         """为论文生成海报
@@ -39,28 +140,225 @@ class PosterGenerator:
         Returns:
             海报文件路径
         """
-        # 提取论文标题和摘要的前100个字符作为提示
-        title = paper["title"]
-        summary_short = paper["summary"][:100]
+        if self.use_local_model and self.cluster_backgrounds:
+            return self.generate_posters([paper], start_index=index)[0]
         
-        # 构建提示词
-        prompt = f"Academic poster for AI research paper titled '{title}'. {summary_short}"
+        prompt = self._build_prompt(paper)
+        output_path, cache_key, hit = self._lookup_cache(paper, index, prompt)
+        if hit:
+            return output_path
         
         # 生成图像
-        if self.pipe is not None:
+        if self.use_local_model:
             # 使用本地模型生成
-            image = self.pipe(prompt, height=768, width=512).images[0]
+            image = self._render_batch([prompt], [index])[0]
         else:
             # 使用简单的模板生成
-            image = self._create_template_poster(paper)
+            metrics.count("fallback.template_poster")
+            with metrics.span("template_render", paper=paper["arxiv_id"]):
+                image = self._create_template_poster(paper)
+        
+        return self._save_poster(paper, output_path, image, cache_key)
+    
+    def generate_posters(self, papers: List[Dict[str, Any]], start_index: int = 0) -> List[str]:
+        """批量为论文生成海报
+        
+        缓存未命中的论文按batch_size分批送入推理管线，每批记录一次耗时；
+        不使用模型时在进程池中并行渲染模板海报。
+        
+        Args:
+            papers: 论文信息字典列表
+            start_index: 第一篇论文的索引
+            
+        Returns:
+            与输入论文顺序一致的海报文件路径列表
+        """
+        if self.use_local_model and self.cluster_backgrounds:
+            return self._generate_clustered(papers, start_index)
+        
+        paths = [None] * len(papers)
+        pending = []
+        for i, paper in enumerate(papers):
+            prompt = self._build_prompt(paper)
+            output_path, cache_key, hit = self._lookup_cache(paper, start_index + i, prompt)
+            paths[i] = output_path
+            if not hit:
+                pending.append((i, paper, prompt, output_path, cache_key))
+        
+        if not self.use_local_model:
+            # 模板海报在进程池中并行渲染
+            metrics.count("fallback.template_poster", len(pending))
+            with metrics.span("template_render", papers=len(pending)):
+                render_posters([item[1] for item in pending], [item[3] for item in pending],
+                               self.width, self.height, processes=self.template_processes)
+            for _, paper, _, output_path, cache_key in pending:
+                metrics.record_file("poster", output_path)
+                if cache_key is not None:
+                    self.cache.store("poster", cache_key, output_path)
+            print(f"已用模板生成{len(pending)}张海报")
+            return paths
+        
+        for batch_start in range(0, len(pending), self.batch_size):
+            batch = pending[batch_start:batch_start + self.batch_size]
+            images = self._render_batch([item[2] for item in batch], [start_index + item[0] for item in batch])
+            for (_, paper, _, output_path, cache_key), image in zip(batch, images):
+                self._save_poster(paper, output_path, image, cache_key)
+        
+        return paths
+    
+    def _generate_clustered(self, papers: List[Dict[str, Any]], start_index: int) -> List[str]:
+        """混合海报: 每个主题生成一张背景，每篇论文的文字用模板绘制在所属主题的背景上"""
+        with metrics.span("poster_cluster", papers=len(papers)):
+            clusters = cluster_papers(papers, threshold=self.cluster_threshold, max_clusters=self.max_backgrounds)
+        metrics.count("poster.clusters", len(clusters))
+        print(f"{len(papers)}篇论文分为{len(clusters)}个主题")
+        
+        paths = [None] * len(papers)
+        # 有论文未命中缓存的主题: 背景提示词 -> [(论文下标, 缓存键)]
+        pending: Dict[str, List[Tuple[int, Optional[str]]]] = {}
+        for cluster in clusters:
+            # 提示词只由排序后的关键词决定，主题相同的背景在以后的运行中直接复用
+            prompt = background_prompt(sorted(cluster["keywords"]))
+            for i in cluster["indices"]:
+                output_path, cache_key, hit = self._lookup_cache(papers[i], start_index + i, prompt)
+                paths[i] = output_path
+                if not hit:
+                    pending.setdefault(prompt, []).append((i, cache_key))
+            print(f"  主题 [{', '.join(cluster['keywords'])}]: {len(cluster['indices'])}篇论文")
         
-        # 保存图像
+        backgrounds = self._cluster_backgrounds(list(pending))
+        for prompt, items in pending.items():
+            background = backgrounds[prompt]
+            for i, cache_key in items:
+                with metrics.span("template_render", paper=papers[i]["arxiv_id"]):
+                    image = self.template.render(papers[i], background=background)
+                self._save_poster(papers[i], paths[i], image, cache_key)
+        return paths
+    
+    def _cluster_backgrounds(self, prompts: List[str]) -> Dict[str, Image.Image]:
+        """返回各主题的背景图，缓存中没有的分批用模型生成
+        
+        Args:
+            prompts: 背景提示词
+            
+        Returns:
+            提示词 -> 已淡化、可直接叠加文字的背景图
+        """
+        background_dir = os.path.join(self.save_dir, "backgrounds")
+        os.makedirs(background_dir, exist_ok=True)
+        backgrounds = {}
+        paths = {}
+        missing = []
+        for prompt in prompts:
+            key = ArtifactCache.make_key("background", **self._background_inputs(prompt))
+            if key in self._backgrounds:
+                self._backgrounds.move_to_end(key)
+                backgrounds[prompt] = self._backgrounds[key]
+                continue
+            paths[prompt] = path = os.path.join(background_dir, f"{key}.png")
+            if not (os.path.exists(path) or (self.cache is not None and self.cache.fetch("poster_background", key, path))):
+                missing.append((prompt, key, path))
+        
+        metrics.count("poster.backgrounds_rendered", len(missing))
+        for batch_start in range(0, len(missing), self.batch_size):
+            batch = missing[batch_start:batch_start + self.batch_size]
+            # 所有背景使用同一个种子，结果只取决于提示词
+            images = self._render_batch([item[0] for item in batch], [0] * len(batch))
+            for (_, key, path), image in zip(batch, images):
+                image.save(path)
+                if self.cache is not None:
+                    self.cache.store("poster_background", key, path)
+        print(f"主题背景: 复用{len(prompts) - len(missing)}张，新生成{len(missing)}张")
+        
+        for prompt, path in paths.items():
+            with Image.open(path) as image:
+                backgrounds[prompt] = soften(image)
+            key = os.path.splitext(os.path.basename(path))[0]
+            self._backgrounds[key] = backgrounds[prompt]
+        # 最多保留几天的主题背景
+        while len(self._backgrounds) > self.max_backgrounds * 4:
+            self._backgrounds.popitem(last=False)
+        return backgrounds
+    
+    def _render_batch(self, prompts: List[str], indices: List[int]) -> List[Image.Image]:
+        """用推理管线生成一批图像并记录耗时"""
+        kwargs = {"height": self.height, "width": self.width}
+        if self.num_inference_steps is not None:
+            kwargs["num_inference_steps"] = self.num_inference_steps
+        if self.seed is not None:
+            # 每张图像独立的随机数生成器，同一篇论文在任意批次中结果一致
+            import torch
+            kwargs["generator"] = [torch.Generator(device="cpu").manual_seed(self.seed + index) for index in indices]
+        
+        # 模型可能已被释放，按需重新加载
+        self.load_model()
+        start = time.perf_counter()
+        with metrics.span("sd_inference", batch_size=len(prompts)):
+            images = self.pipe(prompts, **kwargs).images
+        elapsed = time.perf_counter() - start
+        
+        self.batch_latencies.append({
+            "batch": len(self.batch_latencies),
+            "size": len(prompts),
+            "seconds": elapsed,
+            "seconds_per_image": elapsed / len(prompts),
+        })
+        print(f"已生成一批{len(prompts)}张海报，用时{elapsed:.2f}秒（每张{elapsed / len(prompts):.2f}秒）")
+        return images
+    
+    def _build_prompt(self, paper: Dict[str, Any]) -> str:
+        """构建Stable Diffusion的提示词"""
+        # 提取论文标题和摘要的前100个字符作为提示
+        title = paper["title"]
+        summary_short = paper["summary"][:100]
+        
+        # 构建提示词
+        return f"Academic poster for AI research paper titled '{title}'. {summary_short}"
+    
+    def _lookup_cache(self, paper: Dict[str, Any], index: int, prompt: str) -> Tuple[str, Optional[str], bool]:
+        """计算输出路径并查询缓存
+        
+        Returns:
+            (输出路径, 缓存键, 是否命中)
+        """
         output_path = os.path.join(self.save_dir, f"poster_{index+1:02d}_{paper['arxiv_id']}.png")
+        
+        # 输入未变化时直接复用缓存的海报
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(paper["arxiv_id"], **self._cache_inputs(paper, prompt, index))
+            if self.cache.fetch("poster", cache_key, output_path):
+                print(f"已从缓存复用论文 {paper['arxiv_id']} 的海报: {output_path}")
+                return output_path, cache_key, True
+        return output_path, cache_key, False
+    
+    def _save_poster(self, paper: Dict[str, Any], output_path: str, image: Image.Image, cache_key: Optional[str]) -> str:
+        """保存海报并写入缓存"""
         image.save(output_path)
+        metrics.record_file("poster", output_path)
+        if cache_key is not None:
+            self.cache.store("poster", cache_key, output_path)
         
         print(f"已为论文 {paper['arxiv_id']} 生成海报: {output_path}")
         return output_path
     
+    def _cache_inputs(self, paper: Dict[str, Any], prompt: str, index: int) -> Dict[str, Any]:
+        """返回决定海报内容的全部输入，用于计算缓存键"""
+        if self.use_local_model and self.cluster_backgrounds:
+            return {"model": "clustered-v1", "background": self._background_inputs(prompt), "title": paper["title"],
+                    "authors": paper["authors"], "summary": paper["summary"]}
+        if self.use_local_model:
+            return {"prompt": prompt, "model": self.model_id, "size": [self.width, self.height], "dtype": self.dtype,
+                    "steps": self.num_inference_steps, "scheduler": self.scheduler,
+                    "seed": None if self.seed is None else self.seed + index}
+        return {"model": "template-v2", "title": paper["title"], "authors": paper["authors"], "summary": paper["summary"]}
+    
+    def _background_inputs(self, prompt: str) -> Dict[str, Any]:
+        """返回决定主题背景内容的全部输入"""
+        return {"prompt": prompt, "model": self.model_id, "size": [self.width, self.height], "dtype": self.dtype,
+                "steps": self.num_inference_steps, "scheduler": self.scheduler,
+                "seed": self.seed}
+    
     def _create_template_poster(self, paper: Dict[str, Any]) -> Image.Image:
         """创建一个简单的模板海报
         
@@ -70,50 +368,7 @@ class PosterGenerator:
         Returns:
             生成的海报图像
         """
-        # 创建一个空白图像
-        img = Image.new('RGB', (512, 768), color=(240, 248, 255))
-        draw = ImageDraw.Draw(img)
-        
-        # 尝试加载字体，如果失败则使用默认字体
-        try:
-            title_font = ImageFont.truetype("arial.ttf", 24)
-            author_font = ImageFont.truetype("arial.ttf", 18)
-            text_font = ImageFont.truetype("arial.ttf", 16)
-        except IOError:
-            title_font = ImageFont.load_default()
-            author_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-        
-        # 绘制标题
-        title = paper["title"]
-        draw.text((20, 30), title, fill=(0, 0, 0), font=title_font)
-        
-        # 绘制作者
-        authors = ", ".join(paper["authors"])
-        draw.text((20, 100), f"Authors: {authors}", fill=(0, 0, 0), font=author_font)
-        
-        # 绘制摘要
-        summary = paper["summary"]
-        # 简单的文本换行
-        words = summary.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            current_line.append(word)
-            if len(" ".join(current_line)) > 60:  # 简单的换行
-                lines.append(" ".join(current_line[:-1]))
-                current_line = [current_line[-1]]
-        
-        if current_line:
-            lines.append(" ".join(current_line))
-        
-        y_position = 150
-        for line in lines[:20]:  # 限制行数
-            draw.text((20, y_position), line, fill=(0, 0, 0), font=text_font)
-            y_position += 25
-        
-        return img
+        return self.template.render(paper)
 
 if __name__ == "__main__":
     import json
@@ -0,0 +1,249 @@
+import os
+import re
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 按优先级尝试的字体，前几个支持中日韩文字
+FONT_CANDIDATES = [
+    "NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "msyh.ttc",
+    "simhei.ttf",
+    "arial.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+
+# 中日韩文字及全角标点的Unicode范围，这些字符可以在任意两个字符之间换行
+CJK_RANGES = "\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef"
+# 换行的基本单位: 单个中日韩字符，或一个西文单词连同其后的空白
+TOKEN = re.compile(f"[{CJK_RANGES}]|[^\\s{CJK_RANGES}]+\\s*|\\s+")
+
+@functools.lru_cache(maxsize=None)
+def get_font(size: int) -> ImageFont.ImageFont:
+    """加载指定字号的字体，每个进程每个字号只加载一次
+
+    Args:
+        size: 字号
+
+    Returns:
+        字体对象，所有候选字体都不可用时返回默认字体
+    """
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except IOError:
+            continue
+    return ImageFont.load_default()
+
+# 字形缓存: 字号 -> {字符: (字形蒙版, x偏移, y偏移, 步进宽度)}
+_GLYPHS: Dict[int, Dict[str, Tuple[Image.Image, int, int, float]]] = {}
+
+def _glyph(char: str, size: int) -> Tuple[Image.Image, int, int, float]:
+    """返回字符的字形蒙版和度量，每个进程每个字形只光栅化一次"""
+    glyphs = _GLYPHS.setdefault(size, {})
+    glyph = glyphs.get(char)
+    if glyph is None:
+        font = get_font(size)
+        left, top, right, bottom = font.getbbox(char)
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+        glyph = glyphs[char] = (mask, left, top, font.getlength(char))
+    return glyph
+
+def text_width(text: str, size: int) -> float:
+    """用缓存的字宽计算文本的像素宽度
+
+    逐字累加字宽，忽略字距调整，对换行判断足够精确。
+
+    Args:
+        text: 文本
+        size: 字号
+
+    Returns:
+        像素宽度
+    """
+    return sum(_glyph(char, size)[3] for char in text)
+
+def draw_line(img: Image.Image, position: Tuple[int, int], text: str, size: int, fill: Tuple[int, int, int]):
+    """用缓存的字形蒙版绘制一行文字
+
+    逐字贴上预先光栅化的字形，比每行重新调用FreeType渲染快一个数量级。
+
+    Args:
+        img: 目标图像
+        position: 行左上角坐标
+        text: 文本
+        size: 字号
+        fill: 文字颜色
+    """
+    x, y = position
+    for char in text:
+        mask, left, top, advance = _glyph(char, size)
+        if not char.isspace():
+            img.paste(fill, (int(round(x + left)), y + top), mask)
+        x += advance
+
+def wrap_text(text: str, size: int, max_width: float, max_lines: Optional[int] = None) -> List[str]:
+    """按像素宽度换行
+
+    西文在单词之间换行，超长的单词按字符断开；中日韩文字在任意字符之间换行。
+
+    Args:
+        text: 文本
+        size: 字号
+        max_width: 每行最大像素宽度
+        max_lines: 最大行数，超出时最后一行以省略号结尾
+
+    Returns:
+        各行文本
+    """
+    lines = []
+    current = ""
+    current_width = 0.0
+    for token in TOKEN.findall(" ".join(text.split())):
+        token_width = text_width(token, size)
+        if current_width + text_width(token.rstrip(), size) <= max_width:
+            current += token
+            current_width += token_width
+            continue
+        if current.strip():
+            lines.append(current.rstrip())
+        current, current_width = "", 0.0
+        if token.isspace():
+            continue
+        # 单个单词比整行还宽时按字符断开
+        while text_width(token.rstrip(), size) > max_width:
+            split_at = 1
+            while split_at < len(token) and text_width(token[:split_at + 1], size) <= max_width:
+                split_at += 1
+            lines.append(token[:split_at])
+            token = token[split_at:]
+        current = token
+        current_width = text_width(token, size)
+    if current.strip():
+        lines.append(current.rstrip())
+
+    if max_lines is not None and len(lines) > max_lines:
+        lines = lines[:max_lines]
+        last = lines[-1]
+        while last and text_width(last + "…", size) > max_width:
+            last = last[:-1]
+        lines[-1] = last.rstrip() + "…"
+    return lines
+
+class TemplateRenderer:
+    def __init__(self, width: int = 512, height: int = 768, margin: int = 20):
+        """初始化模板海报渲染器
+
+        背景层只渲染一次，每张海报在其副本上用缓存的字形绘制文字。
+
+        Args:
+            width: 海报宽度
+            height: 海报高度
+            margin: 页边距
+        """
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.title_size = 24
+        self.author_size = 18
+        self.text_size = 16
+        self._background: Optional[Image.Image] = None
+
+    def background(self) -> Image.Image:
+        """返回预渲染的背景层"""
+        if self._background is None:
+            # 自上而下的浅色渐变，逐行计算颜色
+            top = np.array([240, 248, 255], dtype=np.float32)
+            bottom = np.array([214, 228, 245], dtype=np.float32)
+            ratio = np.linspace(0.0, 1.0, self.height, dtype=np.float32)[:, None]
+            rows = (top * (1 - ratio) + bottom * ratio).astype(np.uint8)
+            pixels = np.broadcast_to(rows[:, None, :], (self.height, self.width, 3))
+            image = Image.fromarray(np.ascontiguousarray(pixels), 'RGB')
+
+            # 顶部色带
+            draw = ImageDraw.Draw(image)
+            draw.rectangle([0, 0, self.width, 8], fill=(45, 90, 160))
+            self._background = image
+        return self._background
+
+    def render(self, paper: Dict[str, Any], background: Optional[Image.Image] = None) -> Image.Image:
+        """渲染一张模板海报
+
+        Args:
+            paper: 论文信息
+            background: 自定义背景图，为None时使用预渲染的背景层
+
+        Returns:
+            海报图像
+        """
+        if background is None:
+            img = self.background().copy()
+        else:
+            img = background.convert('RGB').resize((self.width, self.height))
+        draw = ImageDraw.Draw(img)
+        content_width = self.width - 2 * self.margin
+        y_position = 30
+
+        # 绘制标题
+        for line in wrap_text(paper["title"], self.title_size, content_width, max_lines=3):
+            draw_line(img, (self.margin, y_position), line, self.title_size, (0, 0, 0))
+            y_position += int(self.title_size * 1.3)
+        y_position += 12
+
+        # 绘制作者
+        authors = "Authors: " + ", ".join(paper["authors"])
+        for line in wrap_text(authors, self.author_size, content_width, max_lines=2):
+            draw_line(img, (self.margin, y_position), line, self.author_size, (40, 40, 40))
+            y_position += int(self.author_size * 1.3)
+        y_position += 8
+        draw.line([self.margin, y_position, self.width - self.margin, y_position], fill=(45, 90, 160), width=2)
+        y_position += 14
+
+        # 绘制摘要，行数以剩余高度为限
+        line_height = int(self.text_size * 1.5)
+        max_lines = max(1, (self.height - self.margin - y_position) // line_height)
+        for line in wrap_text(paper["summary"], self.text_size, content_width, max_lines=max_lines):
+            draw_line(img, (self.margin, y_position), line, self.text_size, (0, 0, 0))
+            y_position += line_height
+
+        return img
+
+# 每个进程复用同一个渲染器，背景层和字体在进程内只准备一次
+_PROCESS_RENDERER: Optional[TemplateRenderer] = None
+
+def _render_to_file(job: Tuple[Dict[str, Any], str, int, int]) -> str:
+    global _PROCESS_RENDERER
+    paper, output_path, width, height = job
+    if _PROCESS_RENDERER is None or (_PROCESS_RENDERER.width, _PROCESS_RENDERER.height) != (width, height):
+        _PROCESS_RENDERER = TemplateRenderer(width, height)
+    _PROCESS_RENDERER.render(paper).save(output_path)
+    return output_path
+
+def render_posters(papers: List[Dict[str, Any]], output_paths: List[str], width: int = 512, height: int = 768,
+                   processes: Optional[int] = None) -> List[str]:
+    """用进程池批量渲染模板海报
+
+    Args:
+        papers: 论文信息字典列表
+        output_paths: 与论文一一对应的输出路径
+        width: 海报宽度
+        height: 海报高度
+        processes: 进程数，为None时使用CPU核心数，为1时在当前进程渲染
+
+    Returns:
+        海报文件路径列表
+    """
+    jobs = [(paper, path, width, height) for paper, path in zip(papers, output_paths)]
+    if processes == 1 or len(jobs) <= 1:
+        return [_render_to_file(job) for job in jobs]
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_render_to_file, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
@@ -1,18 +1,117 @@
 import os
+import re
 import json
-from typing import Dict, Any, List
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
 import ollama
+import metrics
+from artifact_cache import ArtifactCache
+
+# qwen3等推理模型输出的思考内容，未闭合时一直延续到末尾
+THINK_BLOCK = re.compile(r"<think>.*?(?:</think>|$)", re.S)
+# 按字数预算截断文案时优先停在句末
+SENTENCE_ENDS = "。！？!?"
+
+class _ScriptStream:
+    """累积模型的流式输出，去掉思考内容，超出字数预算时通知调用方提前结束"""
+    
+    def __init__(self, max_chars: Optional[int]):
+        self.max_chars = max_chars
+        self.raw = ""
+        self.tokens = 0
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.first_text: Optional[float] = None
+        self.end: Optional[float] = None
+        # 非流式响应由Ollama给出的生成耗时（秒）
+        self.eval_seconds: Optional[float] = None
+        self.stopped_early = False
+    
+    def visible(self) -> str:
+        return THINK_BLOCK.sub("", self.raw).lstrip()
+    
+    def feed(self, piece: str, tokens: int = 1) -> bool:
+        """追加一段输出，返回是否已超出字数预算"""
+        if not piece:
+            return False
+        now = time.perf_counter()
+        self.end = now
+        if self.first_token is None:
+            self.first_token = now
+        self.raw += piece
+        self.tokens += tokens
+        visible = self.visible()
+        if visible and self.first_text is None:
+            self.first_text = now
+        return bool(self.max_chars) and len(visible) > self.max_chars
+    
+    def feed_response(self, response: Dict[str, Any]):
+        """记录非流式的完整响应，token数和生成耗时取Ollama返回的统计"""
+        self.feed(response["message"]["content"], tokens=response.get("eval_count", 0))
+        if response.get("eval_duration"):
+            self.eval_seconds = response["eval_duration"] / 1e9
+    
+    def text(self) -> str:
+        """去掉思考内容并按预算截断后的文案"""
+        text = self.visible().strip()
+        if self.max_chars and len(text) > self.max_chars:
+            text = text[:self.max_chars]
+            cut = max(text.rfind(mark) for mark in SENTENCE_ENDS)
+            if cut >= self.max_chars // 2:
+                text = text[:cut + 1]
+        return text
+    
+    def stats(self) -> Dict[str, Any]:
+        end = self.end or time.perf_counter()
+        if self.eval_seconds is not None:
+            decode_seconds = self.eval_seconds
+        else:
+            decode_seconds = end - self.first_token if self.first_token is not None else 0.0
+        return {
+            "ttft": (self.first_token or end) - self.start,
+            "time_to_text": (self.first_text or end) - self.start,
+            "seconds": end - self.start,
+            "tokens": self.tokens,
+            "tokens_per_sec": self.tokens / decode_seconds if decode_seconds > 0 else 0.0,
+            "thinking_chars": len(self.raw) - len(THINK_BLOCK.sub("", self.raw)),
+            "stopped_early": self.stopped_early,
+        }
 
 class ScriptGenerator:
-    def __init__(self, model_name: str = "qwen3", save_dir: str = "scripts"):
+    def __init__(self, model_name: str = "qwen3", save_dir: str = "scripts", cache: Optional[ArtifactCache] = None,
+                 host: Optional[str] = None, concurrency: int = 4, timeout: float = 120.0,
+                 retries: int = 2, backoff: float = 2.0, stream: bool = True, max_chars: Optional[int] = 300,
+                 think: bool = False):
         """初始化文案生成器
         
         Args:
             model_name: 使用的Ollama模型名称
             save_dir: 保存文案的目录
+            cache: 跨运行的产物缓存，为None时不使用缓存
+            host: Ollama服务地址，为None时使用OLLAMA_HOST环境变量或默认地址
+            concurrency: 批量生成时同时发出的最大请求数
+            timeout: 单次请求的超时时间（秒），流式生成时为整个生成过程的时限
+            retries: 单篇论文失败后的重试次数
+            backoff: 重试的初始等待时间（秒），每次重试翻倍
+            stream: 是否流式接收模型输出，流式时超出字数预算立即断开，不再为多余的token等待
+            max_chars: 文案的字数预算，超出部分在句末截断，为None时不限
+            think: 是否允许qwen3输出思考过程，为False时在提示词末尾加/no_think；思考内容总会从文案中去掉
         """
         self.model_name = model_name
         self.save_dir = save_dir
+        self.cache = cache
+        self.host = host
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stream = stream
+        self.max_chars = max_chars
+        self.think = think
+        # 每篇论文的生成统计: 论文ID -> 首token延迟、生成速度等
+        self.generation_stats: Dict[str, Dict[str, Any]] = {}
+        self.client = ollama.Client(host=host, timeout=timeout)
         os.makedirs(save_dir, exist_ok=True)
     
     def generate_script(self, paper: Dict[str, Any], index: int) -> str:
@@ -25,6 +124,196 @@ class ScriptGenerator:
         Returns:
             文案文件路径
         """
+        prompt = self._build_prompt(paper)
+        output_path, cache_key, hit = self._lookup_cache(paper, index, prompt)
+        if hit:
+            return output_path
+        
+        # 调用Ollama生成文案，带超时和退避重试
+        script = self._chat_with_retry(paper, prompt)
+        if script is None:
+            # 备用文案不写入缓存，下次运行时重新尝试模型
+            metrics.count("fallback.template_script")
+            cache_key = None
+            script = self._fallback_script(paper)
+        
+        return self._save_script(paper, output_path, script, cache_key)
+    
+    def _messages(self, prompt: str) -> List[Dict[str, str]]:
+        """构建对话消息，不需要思考过程时关闭qwen3的思考模式"""
+        if not self.think and self.model_name.startswith("qwen3"):
+            prompt = prompt.rstrip() + " /no_think"
+        return [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def _options(self) -> Dict[str, Any]:
+        """生成参数，关闭思考时按字数预算限制生成的token数，作为流式截断之外的保险"""
+        if self.max_chars and not self.think:
+            return {"num_predict": self.max_chars * 2}
+        return {}
+    
+    def _chat_with_retry(self, paper: Dict[str, Any], prompt: str) -> Optional[str]:
+        """带超时和指数退避重试地请求模型，全部失败时返回None"""
+        for attempt in range(self.retries + 1):
+            try:
+                with metrics.span("llm", paper=paper["arxiv_id"], attempt=attempt):
+                    return self._chat(paper, prompt)
+            except Exception as e:
+                metrics.count("llm.errors")
+                if attempt < self.retries:
+                    delay = self.backoff * (2 ** attempt)
+                    print(f"论文 {paper['arxiv_id']} 调用Ollama模型失败（{e}），{delay:.1f}秒后重试")
+                    time.sleep(delay)
+                else:
+                    print(f"论文 {paper['arxiv_id']} 调用Ollama模型失败: {e}")
+        return None
+    
+    def _chat(self, paper: Dict[str, Any], prompt: str) -> str:
+        """请求模型生成文案并记录生成统计
+        
+        Raises:
+            TimeoutError: 流式生成超过timeout仍未结束
+        """
+        collector = _ScriptStream(self.max_chars)
+        if self.stream:
+            # 客户端的超时只限制单次读取，整个生成过程的时限在这里检查
+            deadline = time.perf_counter() + self.timeout
+            stream = self.client.chat(model=self.model_name, messages=self._messages(prompt), stream=True,
+                                      options=self._options())
+            try:
+                for chunk in stream:
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError("请求超时")
+                    if collector.feed(chunk["message"]["content"]):
+                        # 断开连接后Ollama会停止生成
+                        collector.stopped_early = True
+                        break
+            finally:
+                stream.close()
+        else:
+            response = self.client.chat(model=self.model_name, messages=self._messages(prompt), options=self._options())
+            collector.feed_response(response)
+        return self._finish(paper, collector)
+    
+    async def _chat_async(self, client: "ollama.AsyncClient", paper: Dict[str, Any], prompt: str) -> str:
+        """_chat的异步版本"""
+        collector = _ScriptStream(self.max_chars)
+        if self.stream:
+            stream = await client.chat(model=self.model_name, messages=self._messages(prompt), stream=True,
+                                       options=self._options())
+            try:
+                async for chunk in stream:
+                    if collector.feed(chunk["message"]["content"]):
+                        collector.stopped_early = True
+                        break
+            finally:
+                await stream.aclose()
+        else:
+            response = await client.chat(model=self.model_name, messages=self._messages(prompt),
+                                         options=self._options())
+            collector.feed_response(response)
+        return self._finish(paper, collector)
+    
+    def _finish(self, paper: Dict[str, Any], collector: _ScriptStream) -> str:
+        """记录生成统计，返回最终文案
+        
+        Raises:
+            ValueError: 去掉思考内容后没有文案
+        """
+        stats = collector.stats()
+        self.generation_stats[paper["arxiv_id"]] = stats
+        metrics.observe("llm_ttft", stats["ttft"], paper=paper["arxiv_id"])
+        metrics.observe("llm_tokens_per_sec", stats["tokens_per_sec"], paper=paper["arxiv_id"])
+        if stats["stopped_early"]:
+            metrics.count("llm.stopped_early")
+        script = collector.text()
+        print(f"论文 {paper['arxiv_id']} 的文案: 首token {stats['ttft']:.2f}秒, {stats['tokens']} tokens, "
+              f"{stats['tokens_per_sec']:.1f} tokens/秒{', 超出字数预算提前结束' if stats['stopped_early'] else ''}")
+        if not script:
+            raise ValueError("模型没有输出文案内容")
+        return script
+    
+    def warm_up(self) -> bool:
+        """让Ollama提前把模型加载到内存，空提示词只加载模型不生成内容
+        
+        Returns:
+            是否成功
+        """
+        try:
+            self.client.generate(model=self.model_name, prompt="")
+            print(f"Ollama模型 {self.model_name} 已加载")
+            return True
+        except Exception as e:
+            print(f"预加载Ollama模型失败: {e}")
+            return False
+    
+    def generate_scripts(self, papers: List[Dict[str, Any]], start_index: int = 0) -> List[str]:
+        """并发地为一批论文生成播报文案
+        
+        请求通过异步客户端发出，同时进行的请求数不超过concurrency，
+        每个请求有独立的超时和带退避的重试。
+        
+        Args:
+            papers: 论文信息字典列表
+            start_index: 第一篇论文的索引
+            
+        Returns:
+            与输入论文顺序一致的文案文件路径列表
+        """
+        return asyncio.run(self._generate_scripts_async(papers, start_index))
+    
+    async def _generate_scripts_async(self, papers: List[Dict[str, Any]], start_index: int) -> List[str]:
+        client = ollama.AsyncClient(host=self.host, timeout=self.timeout)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def generate_one(paper: Dict[str, Any], index: int) -> str:
+            prompt = self._build_prompt(paper)
+            output_path, cache_key, hit = self._lookup_cache(paper, index, prompt)
+            if hit:
+                return output_path
+            
+            script = await self._chat_with_retry_async(client, semaphore, paper, prompt)
+            if script is None:
+                metrics.count("fallback.template_script")
+                cache_key = None
+                script = self._fallback_script(paper)
+            return self._save_script(paper, output_path, script, cache_key)
+        
+        try:
+            # gather按传入顺序返回结果，与完成先后无关
+            return await asyncio.gather(*[
+                generate_one(paper, start_index + i) for i, paper in enumerate(papers)
+            ])
+        finally:
+            # ollama 0.1.x的AsyncClient没有提供关闭方法，直接关闭底层的httpx连接池
+            await client._client.aclose()
+    
+    async def _chat_with_retry_async(self, client: "ollama.AsyncClient", semaphore: asyncio.Semaphore,
+                                     paper: Dict[str, Any], prompt: str) -> Optional[str]:
+        """_chat_with_retry的异步版本，只在请求期间占用并发名额，退避等待时让给其他论文"""
+        for attempt in range(self.retries + 1):
+            try:
+                # 多个请求在同一线程中交错执行，trace中这些区间会互相重叠
+                async with semaphore:
+                    with metrics.span("llm", paper=paper["arxiv_id"], attempt=attempt):
+                        return await asyncio.wait_for(self._chat_async(client, paper, prompt), timeout=self.timeout)
+            except Exception as e:
+                reason = "请求超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+                metrics.count("llm.errors")
+                if attempt < self.retries:
+                    delay = self.backoff * (2 ** attempt)
+                    print(f"论文 {paper['arxiv_id']} 调用Ollama模型失败（{reason}），{delay:.1f}秒后重试")
+                    await asyncio.sleep(delay)
+                else:
+                    print(f"论文 {paper['arxiv_id']} 调用Ollama模型失败: {reason}")
+        return None
+    
+    def _build_prompt(self, paper: Dict[str, Any]) -> str:
+        """构建文案生成的提示词"""
         # 提取论文信息
         title = paper["title"]
         authors = ", ".join(paper["authors"])
@@ -32,7 +321,7 @@ class ScriptGenerator:
         summary = paper["summary"]
         
         # 构建提示词
-        prompt = f"""
+        return f"""
         请为以下AI研究论文生成一段简短的播报文案，语言要通俗易懂，适合视频播报：
         
         标题: {title}
@@ -47,29 +336,44 @@ class ScriptGenerator:
         4. 语言要生动有趣，适合视频播报
         5. 只输出文案内容，不要有其他格式或说明
         """
-        
-        # 调用Ollama生成文案
-        try:
-            response = ollama.chat(model=self.model_name, messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ])
-            script = response["message"]["content"].strip()
-        except Exception as e:
-            print(f"调用Ollama模型失败: {e}")
-            # 备用方案：生成一个简单的模板文案
-            script = f"""今天为大家介绍一篇来自{affiliations}的研究论文，标题是《{title}》。
+    
+    def _fallback_script(self, paper: Dict[str, Any]) -> str:
+        """备用方案：生成一个简单的模板文案"""
+        title = paper["title"]
+        authors = ", ".join(paper["authors"])
+        affiliations = ", ".join([a for a in paper["affiliations"] if a])
+        summary = paper["summary"]
+        return f"""今天为大家介绍一篇来自{affiliations}的研究论文，标题是《{title}》。
             
 这篇论文由{authors}等研究者共同完成。论文主要内容是{summary[:150]}...
 
 这项研究对人工智能领域具有重要意义，期待未来有更多相关工作。"""
+    
+    def _lookup_cache(self, paper: Dict[str, Any], index: int, prompt: str) -> Tuple[str, Optional[str], bool]:
+        """计算输出路径并查询缓存
         
-        # 保存文案
+        Returns:
+            (输出路径, 缓存键, 是否命中)
+        """
         output_path = os.path.join(self.save_dir, f"script_{index+1:02d}_{paper['arxiv_id']}.txt")
+        
+        # 提示词和模型未变化时直接复用缓存的文案
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(paper["arxiv_id"], prompt=prompt, model=self.model_name,
+                                            max_chars=self.max_chars, think=self.think)
+            if self.cache.fetch("script", cache_key, output_path):
+                print(f"已从缓存复用论文 {paper['arxiv_id']} 的文案: {output_path}")
+                return output_path, cache_key, True
+        return output_path, cache_key, False
+    
+    def _save_script(self, paper: Dict[str, Any], output_path: str, script: str, cache_key: Optional[str]) -> str:
+        """保存文案，模型生成的文案同时写入缓存"""
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(script)
+        metrics.record_file("script", output_path)
+        if cache_key is not None:
+            self.cache.store("script", cache_key, output_path)
         
         print(f"已为论文 {paper['arxiv_id']} 生成文案: {output_path}")
         return output_path
@@ -83,4 +387,8 @@ if __name__ == "__main__":
     generator = ScriptGenerator()
     for i, paper in enumerate(papers[:2]):  # 只测试前两篇
         script_path = generator.generate_script(paper, i)
+        print(f"生成的文案: {script_path}")
+    
+    # 测试批量并发生成
+    for script_path in generator.generate_scripts(papers[2:6], start_index=2):
         print(f"生成的文案: {script_path}") 
\ No newline at end of file
@@ -0,0 +1,33 @@
+import os
+from artifact_cache import ArtifactCache
+
+def _write(path: str, text: str):
+    # 与各阶段一样原地重写输出文件
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _read(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def test_rewriting_restored_output_keeps_cache_entry(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    output = str(tmp_path / "script_01.txt")
+    long_key = cache.make_key("2501.00001", max_chars=300)
+    short_key = cache.make_key("2501.00001", max_chars=50)
+
+    _write(output, "长" * 289)
+    cache.store("script", long_key, output)
+
+    # 命中后以不同参数未命中，在同一路径写入新内容
+    assert cache.fetch("script", long_key, output)
+    assert not cache.fetch("script", short_key, output)
+    _write(output, "短" * 39)
+    cache.store("script", short_key, output)
+
+    # 再次命中旧键时得到的仍是原来的内容
+    assert cache.fetch("script", long_key, output)
+    assert _read(output) == "长" * 289
+    assert cache.fetch("script", short_key, output)
+    assert _read(output) == "短" * 39
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
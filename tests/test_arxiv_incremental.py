@@ -0,0 +1,36 @@
+import datetime
+from arxiv_daily_papers import ArxivPaperFetcher
+from bench_stubs import FakeArxivServer
+import arxiv
+
+def _papers(count: int):
+    start = datetime.datetime(2025, 5, 1, 8, 0)
+    papers = []
+    for i in range(count):
+        at = start + datetime.timedelta(minutes=10 * i)
+        papers.append({"arxiv_id": f"2505.{i:05d}v1", "title": f"Paper {i}", "authors": ["A. Author"],
+                       "summary": "Summary.", "pdf_url": f"http://arxiv.org/pdf/2505.{i:05d}v1",
+                       "published": at.strftime("%Y-%m-%d"),
+                       "published_at": at.strftime("%Y%m%d%H%M"), "categories": ["cs.AI"]})
+    # 服务按提交时间倒序返回
+    return list(reversed(papers))
+
+def test_incremental_runs_do_not_skip_backlog(tmp_path):
+    papers = _papers(25)
+    server = FakeArxivServer(papers).start()
+    original = server.install()
+    try:
+        fetcher = ArxivPaperFetcher(save_dir=str(tmp_path), page_size=4, delay_seconds=0)
+        # 高水位线早于所有论文，积压的25篇多于每次的max_results
+        fetcher._save_state({"cs.AI": {"high_water_mark": "202505010000", "processed": {}}})
+        fetched = []
+        for _ in range(3):
+            run = fetcher.fetch_daily_papers("cs.AI", max_results=10, incremental=True, save=False)
+            fetcher.mark_processed("cs.AI", run)
+            fetched.extend(paper["arxiv_id"] for paper in run)
+        assert len(fetched) == 25
+        assert sorted(fetched) == sorted(paper["arxiv_id"] for paper in papers)
+        assert fetcher.fetch_daily_papers("cs.AI", max_results=10, incremental=True, save=False) == []
+    finally:
+        arxiv.Client.query_url_format = original
+        server.stop()
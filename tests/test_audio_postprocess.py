@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import audio_postprocess
+from audio_postprocess import AudioPostProcessor
+
+def _tone(path, seconds, rate=48000, amplitude=0.3, frequency=440.0, channels=1):
+    t = np.arange(int(seconds * rate), dtype=np.float32) / rate
+    audio = amplitude * np.sin(2 * np.pi * frequency * t).astype(np.float32)
+    sf.write(str(path), np.repeat(audio[:, None], channels, axis=1), rate, subtype='FLOAT')
+
+def _rms_db(audio):
+    return 20 * np.log10(np.sqrt(np.mean(audio ** 2)))
+
+def test_empty_input_when_downsampling(tmp_path):
+    source = tmp_path / "empty.wav"
+    sf.write(str(source), np.zeros((0, 1), dtype=np.float32), 48000)
+    info = AudioPostProcessor(target_rate=44100, channels=2).process(str(source), str(tmp_path / "out.wav"))
+    assert info["seconds"] == 0
+    with sf.SoundFile(str(tmp_path / "out.wav")) as f:
+        assert (f.frames, f.channels, f.samplerate) == (0, 2, 44100)
+
+def test_downsampled_length_matches_duration(tmp_path):
+    source = tmp_path / "tone.wav"
+    _tone(source, 2.0, rate=48000, channels=2)
+    # 块大小与滤波器长度不对齐，覆盖跨块的滤波和插值
+    processor = AudioPostProcessor(target_rate=16000, channels=1, block_frames=10000)
+    info = processor.process(str(source), str(tmp_path / "out.wav"))
+    audio, rate = sf.read(str(tmp_path / "out.wav"), always_2d=True)
+    assert rate == 16000
+    assert abs(len(audio) - 32000) <= 1
+    assert info["seconds"] == pytest.approx(2.0, abs=1e-3)
+    assert sorted(os.listdir(tmp_path)) == ["out.wav", "tone.wav"]
+
+def test_downsampling_removes_content_above_new_nyquist(tmp_path):
+    source = tmp_path / "high.wav"
+    # 10kHz在16kHz输出中会混叠到6kHz
+    _tone(source, 1.0, rate=48000, amplitude=0.3, frequency=10000.0)
+    processor = AudioPostProcessor(target_rate=16000, channels=1, target_db=-20.0, max_gain_db=0.0)
+    processor.process(str(source), str(tmp_path / "out.wav"))
+    audio, _ = sf.read(str(tmp_path / "out.wav"))
+    assert _rms_db(audio[2000:-2000]) < -60
+
+def test_gain_is_capped(tmp_path):
+    source = tmp_path / "quiet.wav"
+    # RMS约-43dBFS，达到-20dBFS需要23dB增益
+    _tone(source, 1.0, rate=44100, amplitude=0.01)
+    processor = AudioPostProcessor(target_rate=44100, channels=1, max_gain_db=10.0)
+    info = processor.process(str(source), str(tmp_path / "out.wav"))
+    assert info["gain_db"] == pytest.approx(10.0)
+    audio, _ = sf.read(str(tmp_path / "out.wav"))
+    assert _rms_db(audio) == pytest.approx(20 * np.log10(0.01 / np.sqrt(2)) + 10.0, abs=0.2)
+
+def test_failure_removes_temp_file(tmp_path, monkeypatch):
+    source = tmp_path / "tone.wav"
+    _tone(source, 0.5)
+
+    def fail(self, block):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(audio_postprocess._LinearResampler, "process", fail)
+    with pytest.raises(RuntimeError):
+        AudioPostProcessor(target_rate=16000, channels=1).process(str(source), str(tmp_path / "out.wav"))
+    assert os.listdir(tmp_path) == ["tone.wav"]
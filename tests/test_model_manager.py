@@ -0,0 +1,83 @@
+import pytest
+
+from backends import BackendRegistry
+from main import build_parser, create_model_manager
+from model_manager import ModelManager
+from worker import PaperWorker
+
+class FakeModel:
+    def __init__(self):
+        self.model_loaded = False
+        self.pipe = None
+        self.shards = None
+
+    def load_model(self):
+        self.model_loaded = True
+        self.pipe = object()
+
+    def unload_model(self) -> bool:
+        loaded = self.model_loaded
+        self.model_loaded = False
+        self.pipe = None
+        return loaded
+
+def _setup(stages):
+    args = build_parser().parse_args(["--use_local_model", "--memory_budget_mb", "3000", "--stages", ",".join(stages)])
+    created = []
+
+    def factory(name):
+        def create():
+            created.append(name)
+            return FakeModel()
+        return create
+
+    registry = BackendRegistry()
+    registry.register("poster", factory("poster"))
+    registry.register("voice", factory("voice"))
+    return create_model_manager(args, registry.get, registry, stages), registry, created
+
+def test_voice_only_run_does_not_create_poster_backend():
+    manager, registry, created = _setup(["voice"])
+    with manager.use("voice"):
+        assert registry.loaded("voice").model_loaded
+    assert created == ["voice"]
+
+def test_residency_checks_do_not_create_backends():
+    manager, registry, created = _setup(["poster", "voice"])
+    # 预算放不下两个模型，加载语音模型前会检查海报模型是否常驻
+    assert not manager.fits("poster", "voice")
+    with manager.use("voice"):
+        pass
+    assert created == ["voice"]
+    with manager.use("poster"):
+        assert not registry.loaded("voice").model_loaded
+    assert created == ["voice", "poster"]
+
+def test_failed_unload_does_not_count_as_freed():
+    manager = ModelManager(budget_mb=3000)
+    poster, voice = FakeModel(), FakeModel()
+    manager.register("poster", poster.load_model, lambda: False, lambda: poster.model_loaded, footprint_mb=2000)
+    manager.register("voice", voice.load_model, voice.unload_model, lambda: voice.model_loaded, footprint_mb=2000)
+    with manager.use("poster"):
+        pass
+    # 海报模型空闲但拒绝释放，加载语音模型会超出预算
+    with pytest.raises(RuntimeError):
+        with manager.use("voice"):
+            pass
+    assert poster.model_loaded
+    assert not voice.model_loaded
+
+def test_worker_preload_stays_within_budget(tmp_path):
+    args = build_parser().parse_args(["--use_local_model", "--memory_budget_mb", "6000", "--no_cache",
+                                      "--output_dir", str(tmp_path)])
+    worker = PaperWorker(args)
+    models = {"poster": FakeModel(), "voice": FakeModel()}
+    for name, instance in models.items():
+        worker.registry.register(name, lambda instance=instance: instance)
+    worker.preload(["poster", "voice"])
+    # SD和CosyVoice放不下6000MB的预算，只预加载第一个
+    assert models["poster"].pipe is not None
+    assert not models["voice"].model_loaded
+    # 任务复用工作进程的管理器，加载语音模型前先释放海报模型
+    with worker.manager.use("voice"):
+        assert models["poster"].pipe is None
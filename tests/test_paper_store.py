@@ -0,0 +1,67 @@
+import os
+import json
+import datetime
+import arxiv
+import pytest
+from arxiv_daily_papers import ArxivPaperFetcher
+from bench_stubs import FakeArxivServer
+from paper_store import PaperStore
+from test_arxiv_incremental import _papers
+
+@pytest.fixture
+def server():
+    server = FakeArxivServer(_papers(12)).start()
+    original = server.install()
+    yield server
+    arxiv.Client.query_url_format = original
+    server.stop()
+
+def test_store_is_the_paper_index(tmp_path, server):
+    store = PaperStore(str(tmp_path / "papers.db"))
+    fetcher = ArxivPaperFetcher(save_dir=str(tmp_path / "data"), page_size=5, delay_seconds=0, store=store)
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+
+    # 逐页获取时按页写入论文库，当天的论文列表保持获取顺序
+    streamed = list(fetcher.iter_papers("cs.AI", max_results=12))
+    assert [paper["arxiv_id"] for paper in fetcher.load_daily(today)] == [paper["arxiv_id"] for paper in streamed]
+    assert not os.listdir(tmp_path / "data")
+
+    fetched = fetcher.fetch_daily_papers("cs.AI", max_results=4)
+    assert fetcher.load_daily(today) == fetched
+    assert store.known_ids(paper["arxiv_id"] for paper in streamed) == {paper["arxiv_id"][:-2] for paper in streamed}
+
+    # 已处理索引记录在论文库中，增量获取据此跳过
+    fetcher.mark_processed("cs.AI", fetched[1:])
+    assert set(store.with_status("processed", "done")) == {paper["arxiv_id"][:-2] for paper in fetched[1:]}
+    state = fetcher._load_state()["cs.AI"]
+    assert state["processed"] == {}
+    assert state["high_water_mark"] == fetched[0]["published_at"]
+    again = fetcher.fetch_daily_papers("cs.AI", max_results=20, incremental=True)
+    assert again[0] == fetched[0]
+    assert not {paper["arxiv_id"] for paper in again} & {paper["arxiv_id"] for paper in fetched[1:]}
+    assert fetcher.load_daily(today) == again
+
+def test_json_export_matches_store(tmp_path, server):
+    store = PaperStore(str(tmp_path / "papers.db"))
+    fetcher = ArxivPaperFetcher(save_dir=str(tmp_path / "data"), delay_seconds=0, store=store, export_json=True)
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    fetched = fetcher.fetch_daily_papers("cs.AI", max_results=6)
+    without_store = ArxivPaperFetcher(save_dir=str(tmp_path / "data"))
+    assert without_store.load_daily(today) == fetched == store.daily(today)
+
+def test_export_lookup_prefers_newer_file(tmp_path):
+    fetcher = ArxivPaperFetcher(save_dir=str(tmp_path))
+    stale, streamed = _papers(2)
+    json_path = tmp_path / "arxiv_papers_2025-05-01.json"
+    jsonl_path = tmp_path / "arxiv_papers_2025-05-01.jsonl"
+    json_path.write_text(json.dumps([stale]), encoding='utf-8')
+    jsonl_path.write_text(json.dumps(streamed) + "\n", encoding='utf-8')
+    # 同样新时取流式写入的.jsonl
+    os.utime(json_path, (1_000_000_000, 1_000_000_000))
+    os.utime(jsonl_path, (1_000_000_000, 1_000_000_000))
+    assert fetcher.load_daily("2025-05-01") == [streamed]
+    # 早先非流式运行留下的.json不会盖过之后流式写入的.jsonl，反之亦然
+    os.utime(json_path, (900_000_000, 900_000_000))
+    assert fetcher.load_daily("2025-05-01") == [streamed]
+    os.utime(json_path, (1_100_000_000, 1_100_000_000))
+    assert fetcher.load_daily("2025-05-01") == [stale]
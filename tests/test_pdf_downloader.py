@@ -0,0 +1,46 @@
+import os
+
+from bench_stubs import FakePdfServer
+from pdf_downloader import PdfDownloader
+
+def _downloader(save_dir, retries=2):
+    return PdfDownloader(save_dir=str(save_dir), rate_limit=0, timeout=10, retries=retries, backoff=0.01)
+
+def test_resumes_after_truncated_response(tmp_path):
+    with FakePdfServer(size=256 * 1024, truncate_first=True) as server:
+        path = _downloader(tmp_path).download(f"{server.url}/pdf/2401.00001")
+        assert server.attempts["/pdf/2401.00001"] == 2
+        # 第二次请求从已下载的一半续传
+        assert server.range_requests == 1
+        with open(path, 'rb') as f:
+            assert f.read() == server.document("/pdf/2401.00001")
+    assert not os.listdir(tmp_path / "partial")
+
+def test_waits_and_retries_after_429(tmp_path):
+    with FakePdfServer(size=4096, throttle_first=True) as server:
+        path = _downloader(tmp_path).download(f"{server.url}/pdf/2401.00002")
+        assert server.attempts["/pdf/2401.00002"] == 2
+        assert server.range_requests == 0
+        with open(path, 'rb') as f:
+            assert f.read() == server.document("/pdf/2401.00002")
+
+def test_rejects_non_pdf_body(tmp_path):
+    with FakePdfServer(html=True) as server:
+        url = f"{server.url}/pdf/2401.00003"
+        downloader = _downloader(tmp_path)
+        assert downloader.download(url) is None
+        # 不是网络错误，不重试
+        assert server.requests == 1
+    assert downloader.lookup(url) is None
+    assert not os.listdir(tmp_path / "partial")
+    assert not os.path.exists(tmp_path / "objects")
+
+def test_second_run_served_from_index(tmp_path):
+    with FakePdfServer(size=4096) as server:
+        url = f"{server.url}/pdf/2401.00004"
+        first = _downloader(tmp_path).download(url)
+        assert server.requests == 1
+        # 新的下载器（下一次运行）从index.json找到已下载的文件
+        second = _downloader(tmp_path).download(url)
+        assert second == first
+        assert server.requests == 1
@@ -0,0 +1,50 @@
+import os
+import time
+
+from bench_stubs import FakeOllamaServer
+from script_generator import ScriptGenerator
+
+def _papers(count):
+    return [{"arxiv_id": f"2401.{i:05d}", "title": f"Paper {i}", "authors": ["Alice", "Bob"],
+             "affiliations": ["University"], "summary": f"We study problem {i}."} for i in range(count)]
+
+def _generator(server, save_dir, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return ScriptGenerator(model_name="stub", save_dir=str(save_dir), host=server.url, **kwargs)
+
+def _is_fallback(path):
+    with open(path, encoding="utf-8") as f:
+        return "期待未来有更多相关工作" in f.read()
+
+def test_retries_until_server_recovers(tmp_path):
+    with FakeOllamaServer(latency=0, fail_first=2) as server:
+        paths = _generator(server, tmp_path, retries=2).generate_scripts(_papers(1))
+        assert server.requests == 3
+    assert not _is_fallback(paths[0])
+
+def test_falls_back_when_retries_run_out(tmp_path):
+    with FakeOllamaServer(latency=0, fail_first=2) as server:
+        paths = _generator(server, tmp_path, retries=1).generate_scripts(_papers(1))
+        assert server.requests == 2
+    assert _is_fallback(paths[0])
+
+def test_slow_generation_times_out(tmp_path):
+    # 每个token都很快到达，但整个生成远超时限
+    with FakeOllamaServer(latency=0, token_delay=0.05, script_chars=400) as server:
+        generator = _generator(server, tmp_path, timeout=0.3, retries=1, max_chars=None)
+        start = time.perf_counter()
+        batch = generator.generate_scripts(_papers(1))
+        single = generator.generate_script(_papers(2)[1], 1)
+        assert time.perf_counter() - start < 3.0
+        assert server.requests == 4
+    assert _is_fallback(batch[0])
+    assert _is_fallback(single)
+
+def test_batch_respects_concurrency_and_keeps_order(tmp_path):
+    papers = _papers(8)
+    with FakeOllamaServer(latency=0.2) as server:
+        paths = _generator(server, tmp_path, concurrency=3).generate_scripts(papers, start_index=5)
+        assert server.max_active == 3
+    assert [os.path.basename(path) for path in paths] == [
+        f"script_{i + 6:02d}_{paper['arxiv_id']}.txt" for i, paper in enumerate(papers)]
+    assert not any(_is_fallback(path) for path in paths)
@@ -0,0 +1,28 @@
+import os
+import signal
+import functools
+from bench_stubs import SyntheticTTS
+from tts_shards import ShardedSynthesizer
+
+CHUNKS = [f"第{i}句测试文本，用来检查分片合成。" for i in range(8)]
+
+def test_crashed_worker_is_replaced_with_full_pool(tmp_path):
+    settings = {"save_dir": str(tmp_path), "speaker_file": str(tmp_path / "spk2info.pt")}
+    synthesizer = ShardedSynthesizer(settings, workers=2, threads_per_worker=1,
+                                     model_factory=functools.partial(SyntheticTTS, realtime_factor=0.1))
+    try:
+        timings = synthesizer.synthesize_to_file(CHUNKS, "default", str(tmp_path / "a.wav"))
+        before = {timing["worker"] for timing in timings}
+        assert len(before) == 2
+
+        os.kill(next(iter(before)), signal.SIGKILL)
+        timings = synthesizer.synthesize_to_file(CHUNKS, "default", str(tmp_path / "b.wav"))
+        assert len(timings) == len(CHUNKS)
+        # 之后的合成仍由两个新进程并行完成
+        after = {timing["worker"] for timing in synthesizer.synthesize_to_file(CHUNKS, "default",
+                                                                                 str(tmp_path / "c.wav"))}
+        assert len(after) == 2
+        assert not after & before
+        assert os.path.getsize(tmp_path / "b.wav") == os.path.getsize(tmp_path / "a.wav")
+    finally:
+        synthesizer.shutdown()
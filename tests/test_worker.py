@@ -0,0 +1,42 @@
+import json
+import os
+
+import pytest
+import requests
+
+from main import build_parser
+from worker import PaperWorker, serve
+
+def _worker(tmp_path, job_dir=None):
+    args = build_parser().parse_args(["--no_cache", "--output_dir", str(tmp_path / "output")])
+    return PaperWorker(args, job_dir=job_dir)
+
+@pytest.mark.parametrize("options", [{"category": 5}, {"max_papers": "x"}, {"max_papers": True},
+                                     {"incremental": 1}, {"stages": ["poster"]}])
+def test_submit_rejects_mistyped_options(tmp_path, options):
+    worker = _worker(tmp_path)
+    with pytest.raises(ValueError):
+        worker.submit(options)
+    assert not worker.jobs
+
+def test_http_returns_400_for_mistyped_option(tmp_path):
+    worker = _worker(tmp_path)
+    server = serve(worker, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/jobs"
+        response = requests.post(url, json={"max_papers": "x"}, timeout=5)
+        assert response.status_code == 400
+        assert "max_papers" in response.json()["error"]
+        assert requests.post(url, json={"max_papers": 3, "category": "cs.CL"}, timeout=5).status_code == 202
+    finally:
+        server.shutdown()
+
+def test_mistyped_job_file_moves_to_failed(tmp_path):
+    job_dir = tmp_path / "jobs"
+    worker = _worker(tmp_path, job_dir=str(job_dir))
+    with open(job_dir / "bad.json", 'w', encoding='utf-8') as f:
+        json.dump({"category": 5}, f)
+    worker._scan_job_dir()
+    assert not worker.jobs
+    assert os.listdir(job_dir / "failed") == ["bad.json"]
+    assert not os.listdir(job_dir / "processing")
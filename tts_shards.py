@@ -0,0 +1,276 @@
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import soundfile as sf
+import metrics
+
+# 吞吐探测使用的句子，长度与文案中的句子相当
+PROBE_SENTENCES = [
+    "今天为大家介绍一篇关于大语言模型推理效率的新论文。",
+    "作者提出了一种在不损失精度的前提下减少计算量的方法。",
+    "实验表明，该方法在多个基准上都取得了明显的速度提升。",
+    "这项工作对在普通服务器上部署大模型很有参考价值。",
+]
+
+# 工作进程中的语音合成器，每个进程一份
+_WORKER = None
+
+def _init_worker(settings: Dict[str, Any], threads: int, model_factory: Optional[Callable[[], Any]]):
+    """工作进程的初始化: 限制算子内线程数并加载自己的模型"""
+    global _WORKER
+    # 在导入torch之前设置，OpenMP按环境变量决定线程池大小
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from voice_generator import VoiceGenerator
+    model = model_factory() if model_factory is not None else None
+    _WORKER = VoiceGenerator(**settings, model=model)
+    _WORKER.load_model()
+
+def _worker_info() -> Dict[str, Any]:
+    return {"pid": os.getpid(), "loaded": _WORKER.model_loaded, "sample_rate": _WORKER.sample_rate}
+
+def _synthesize(text: str, speaker: str) -> Tuple[np.ndarray, float, int]:
+    start = time.perf_counter()
+    audio = _WORKER.synthesize_text(text, speaker)
+    return audio, time.perf_counter() - start, os.getpid()
+
+class ShardedSynthesizer:
+    def __init__(self, settings: Dict[str, Any], workers: int = 2, threads_per_worker: int = 0,
+                 model_factory: Optional[Callable[[], Any]] = None):
+        """初始化分片语音合成
+
+        启动多个工作进程，每个进程加载自己的TTS模型并只使用指定数量的算子内线程。
+        句子提交到共享的任务队列，由空闲的进程领取，结果按原顺序写回，
+        多篇论文同时合成时它们的句子也会交错分配给所有进程。
+
+        每个进程各持有一份模型，内存占用约为单个模型的workers倍。
+        某个工作进程意外退出（如内存不足被杀）时整个进程池不可用，会重建同样数量的进程并重新提交未完成的句子。
+
+        Args:
+            settings: 工作进程中VoiceGenerator的参数，如model_path、prompt_wav、prompt_text、speaker
+            workers: 工作进程数
+            threads_per_worker: 每个进程的算子内线程数，0表示按CPU核心数平均分配
+            model_factory: 在工作进程中创建模型的函数，必须可以pickle，为None时加载CosyVoice
+        """
+        self.settings = settings
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.model_factory = model_factory
+        self.available: Optional[bool] = None
+        self.sample_rate = 24000
+        self.startup_seconds = 0.0
+        # 各工作进程合成的句数和耗时: 进程ID -> 统计
+        self.worker_stats: Dict[int, Dict[str, float]] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """启动工作进程并等待模型加载完成，多次调用只启动一次
+
+        Returns:
+            工作进程是否成功加载了模型
+        """
+        with self._lock:
+            if self.available is not None:
+                return self.available
+            start = time.perf_counter()
+            # 使用spawn，子进程不继承父进程中torch的线程池状态
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(self.settings, self.threads_per_worker, self.model_factory))
+            try:
+                # 每个进程领取一个任务，确保所有模型都已加载
+                infos = [future.result() for future in [self._executor.submit(_worker_info) for _ in range(self.workers)]]
+            except Exception as e:
+                print(f"启动语音合成工作进程失败: {e}")
+                self._shutdown()
+                self.available = False
+                return False
+            self.available = all(info["loaded"] for info in infos)
+            self.sample_rate = infos[0]["sample_rate"]
+            self.startup_seconds = time.perf_counter() - start
+            if self.available:
+                print(f"已启动{self.workers}个语音合成工作进程（每个{self.threads_per_worker}线程），"
+                      f"用时{self.startup_seconds:.1f}秒")
+            else:
+                print("语音合成工作进程未能加载TTS模型")
+                self._shutdown()
+            return self.available
+
+    def submit(self, text: str, speaker: str) -> Future:
+        """提交一句文本，返回 (音频, 合成耗时, 进程ID) 的Future"""
+        for attempt in range(2):
+            if not self.start():
+                raise RuntimeError("语音合成工作进程不可用")
+            try:
+                return self._executor.submit(_synthesize, text, speaker)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                self._restart()
+    
+    def _restart(self):
+        """重建已损坏的进程池，恢复全部工作进程；其他线程已经重建过时不再重复"""
+        with self._lock:
+            # ProcessPoolExecutor在工作进程意外退出后设置_broken
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                print(f"语音合成工作进程意外退出，正在重启全部{self.workers}个进程")
+                metrics.count("tts.shard_restarts")
+                self._shutdown()
+                self.available = None
+        self.start()
+
+    def synthesize_to_file(self, chunks: List[str], speaker: str, output_path: str) -> List[Dict[str, Any]]:
+        """并行合成各段文本并按顺序写入WAV文件
+
+        所有段落立即提交，写入按段落顺序进行，后面的段落在等待期间已经在其他进程中合成。
+
+        Args:
+            chunks: 要合成的文本段
+            speaker: 说话人名称
+            output_path: 输出路径
+
+        Returns:
+            每段文本的耗时记录，格式与VoiceGenerator逐段合成时相同，另有worker字段
+        """
+        start = time.perf_counter()
+        futures = [self.submit(text, speaker) for text in chunks]
+        timings = []
+        restarted = False
+        try:
+            with sf.SoundFile(output_path, 'w', samplerate=self.sample_rate, channels=1, subtype='PCM_16') as f:
+                for chunk_index, text in enumerate(chunks):
+                    try:
+                        audio, seconds, pid = futures[chunk_index].result()
+                    except BrokenProcessPool:
+                        # 只重启一次，模型本身导致进程崩溃时不会无限重试
+                        if restarted:
+                            raise
+                        restarted = True
+                        self._restart()
+                        futures[chunk_index:] = [self.submit(later, speaker) for later in chunks[chunk_index:]]
+                        audio, seconds, pid = futures[chunk_index].result()
+                    f.write(audio)
+                    timings.append({
+                        "chunk": chunk_index,
+                        "chars": len(text),
+                        "seconds": seconds,
+                        "first_audio_latency": time.perf_counter() - start,
+                        "audio_seconds": len(audio) / self.sample_rate,
+                        "worker": pid,
+                    })
+                    with self._lock:
+                        stats = self.worker_stats.setdefault(pid, {"chunks": 0, "seconds": 0.0, "audio_seconds": 0.0})
+                        stats["chunks"] += 1
+                        stats["seconds"] += seconds
+                        stats["audio_seconds"] += len(audio) / self.sample_rate
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return timings
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def shutdown(self):
+        """停止工作进程，之后再次使用会重新启动"""
+        with self._lock:
+            self._shutdown()
+            self.available = None
+
+def probe(settings: Dict[str, Any], worker_counts: List[int], model_factory: Optional[Callable[[], Any]] = None,
+          sentences: int = 16, speaker: str = "default") -> List[Dict[str, Any]]:
+    """测量不同工作进程数下的合成吞吐，用于选择--tts_shards
+
+    模型加载时间单独统计，不计入吞吐。
+
+    Args:
+        settings: 工作进程中VoiceGenerator的参数
+        worker_counts: 要测量的工作进程数
+        model_factory: 在工作进程中创建模型的函数
+        sentences: 每次测量合成的句数
+        speaker: 说话人名称
+
+    Returns:
+        每个进程数的测量结果
+    """
+    texts = [PROBE_SENTENCES[i % len(PROBE_SENTENCES)] for i in range(sentences)]
+    results = []
+    for workers in worker_counts:
+        synthesizer = ShardedSynthesizer(settings, workers=workers, model_factory=model_factory)
+        try:
+            if not synthesizer.start():
+                raise RuntimeError("工作进程未能加载TTS模型")
+            start = time.perf_counter()
+            outputs = [future.result() for future in [synthesizer.submit(text, speaker) for text in texts]]
+            seconds = time.perf_counter() - start
+        finally:
+            synthesizer.shutdown()
+        audio_seconds = sum(len(audio) for audio, _, _ in outputs) / synthesizer.sample_rate
+        result = {
+            "workers": workers,
+            "threads_per_worker": synthesizer.threads_per_worker,
+            "startup_seconds": synthesizer.startup_seconds,
+            "seconds": seconds,
+            "sentences_per_sec": len(texts) / seconds,
+            "audio_seconds_per_sec": audio_seconds / seconds,
+        }
+        results.append(result)
+        print(f"{workers}个进程 x {result['threads_per_worker']}线程: {result['sentences_per_sec']:.2f}句/秒, "
+              f"每秒合成{result['audio_seconds_per_sec']:.2f}秒音频（启动{result['startup_seconds']:.1f}秒）")
+    return results
+
+def recommend(results: List[Dict[str, Any]], tolerance: float = 0.05) -> Dict[str, Any]:
+    """选择吞吐在最高值tolerance以内、进程数最少的配置，进程越少占用内存越少"""
+    best = max(result["audio_seconds_per_sec"] for result in results)
+    candidates = [result for result in results if result["audio_seconds_per_sec"] >= best * (1 - tolerance)]
+    return min(candidates, key=lambda result: result["workers"])
+
+def main():
+    parser = argparse.ArgumentParser(description="测量分片语音合成在不同进程数下的吞吐")
+    parser.add_argument("--workers", type=str, default=None, help="要测量的进程数，逗号分隔，默认为1、2、4...直到CPU核心数")
+    parser.add_argument("--sentences", type=int, default=16, help="每次测量合成的句数")
+    parser.add_argument("--model_path", type=str, default="pretrained_models/CosyVoice2-0.5B", help="CosyVoice模型路径")
+    parser.add_argument("--speaker_wav", type=str, default="./asset/zero_shot_prompt.wav", help="说话人的参考音频")
+    parser.add_argument("--speaker_text", type=str, default="希望你以后能够做的比我还好呦。", help="参考音频对应的文本")
+    parser.add_argument("--synthetic", type=float, default=None, metavar="RTF",
+                        help="使用指定实时率的合成替身代替CosyVoice，用于检查分片本身的开销")
+    args = parser.parse_args()
+
+    if args.workers:
+        worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+    else:
+        cores = os.cpu_count() or 1
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cores:
+            worker_counts.append(worker_counts[-1] * 2)
+
+    model_factory = None
+    if args.synthetic is not None:
+        import functools
+        from bench_stubs import SyntheticTTS
+        model_factory = functools.partial(SyntheticTTS, realtime_factor=args.synthetic)
+    settings = {"model_path": args.model_path, "save_dir": "audios", "prompt_wav": args.speaker_wav,
+                "prompt_text": args.speaker_text}
+    results = probe(settings, worker_counts, model_factory=model_factory, sentences=args.sentences)
+    best = recommend(results)
+    print(f"\n建议: --tts_shards {best['workers']} --tts_threads {best['threads_per_worker']}"
+          f"（每个进程各加载一份模型，内存约为单个模型的{best['workers']}倍）")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,111 @@
 import os
 import json
+import math
+import tempfile
 import subprocess
-from typing import Dict, Any, List
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple
 import datetime
-from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
+import soundfile as sf
+from PIL import Image
+import metrics
+from artifact_cache import ArtifactCache
+
+# 预设的输出规格，--renditions 也可以直接写 宽x高@码率，如 1280x720@2M
+RENDITIONS = {
+    "1080p": {"width": 1920, "height": 1080, "video_bitrate": "3M"},
+    "720p": {"width": 1280, "height": 720, "video_bitrate": "1500k"},
+    "480p": {"width": 854, "height": 480, "video_bitrate": "800k"},
+    "vertical": {"width": 1080, "height": 1920, "video_bitrate": "3M"},
+    "square": {"width": 1080, "height": 1080, "video_bitrate": "2M"},
+}
+
+def parse_rendition(spec: str) -> Dict[str, Any]:
+    """解析输出规格
+    
+    Args:
+        spec: RENDITIONS中的名称，或 宽x高@码率 形式的自定义规格
+        
+    Returns:
+        包含name、width、height、video_bitrate的字典
+        
+    Raises:
+        ValueError: 无法识别的规格
+    """
+    spec = spec.strip()
+    if spec in RENDITIONS:
+        return {"name": spec, **RENDITIONS[spec]}
+    try:
+        size, bitrate = spec.split("@")
+        width, height = (int(v) for v in size.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"无法识别的输出规格: {spec}，可选 {', '.join(RENDITIONS)} 或 宽x高@码率")
+    return {"name": f"{width}x{height}", "width": width, "height": height, "video_bitrate": bitrate}
+
+def plan_encode_workers(num_jobs: int, threads_per_job: Optional[int] = None,
+                        cpu_count: Optional[int] = None) -> Tuple[int, int]:
+    """在并行编码进程和每个编码器的线程之间分配CPU核心
+    
+    静态图视频帧率低，单个x264编码器内部的并行度有限，
+    多个编码进程各用少量线程比一个编码器用满所有核心更快。
+    
+    Args:
+        num_jobs: 待编码的视频数
+        threads_per_job: 每个编码器的线程数，为None时自动选择
+        cpu_count: 可用的CPU核心数，为None时自动检测
+        
+    Returns:
+        (并行编码进程数, 每个编码器的线程数)
+    """
+    cores = cpu_count
+    if cores is None:
+        # 优先使用当前进程可用的核心数，容器中可能少于机器总核心数
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    if threads_per_job is None:
+        threads_per_job = 2 if cores >= 4 else 1
+    threads_per_job = max(1, min(threads_per_job, cores))
+    workers = max(1, min(num_jobs, cores // threads_per_job))
+    return workers, threads_per_job
+
+def _encode_in_worker(config: Dict[str, Any], poster_path: str, audio_path: str, output_path: str):
+    """在编码进程中执行一次编码，进程池要求该函数位于模块顶层"""
+    generator = VideoGenerator(**config)
+    generator._encode(poster_path, audio_path, output_path)
 
 class VideoGenerator:
-    def __init__(self, save_dir: str = "videos"):
+    def __init__(self, save_dir: str = "videos", cache: Optional[ArtifactCache] = None, encode_mode: str = "still",
+                 still_fps: int = 2, preset: str = "veryfast", crf: int = 23, threads: int = 0):
         """初始化视频生成器
         
         Args:
             save_dir: 保存视频的目录
+            cache: 跨运行的产物缓存，为None时不使用缓存
+            encode_mode: 编码方式，"still"为直接调用ffmpeg的静态图快速编码，"moviepy"为逐帧渲染编码
+            still_fps: 静态图编码的帧率，画面不变时低帧率即可
+            preset: 静态图编码的x264预设
+            crf: 静态图编码的x264质量参数
+            threads: 每个编码器使用的线程数，0表示由ffmpeg自动决定
         """
+        if encode_mode not in ("still", "moviepy"):
+            raise ValueError(f"不支持的编码方式: {encode_mode}")
         self.save_dir = save_dir
+        self.cache = cache
+        self.encode_mode = encode_mode
+        self.still_fps = still_fps
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
         os.makedirs(save_dir, exist_ok=True)
     
-    def generate_video(self, poster_path: str, audio_path: str, paper_id: str, index: int) -> str:
+    def encode_settings(self) -> Dict[str, Any]:
+        """返回决定视频内容的编码参数"""
+        if self.encode_mode == "still":
+            return {"mode": "still", "fps": self.still_fps, "codec": "libx264", "preset": self.preset,
+                    "crf": self.crf, "audio_codec": "aac"}
+        return {"mode": "moviepy", "fps": 24, "codec": "libx264", "audio_codec": "aac"}
+    
+    def generate_video(self, poster_path: str, audio_path: str, paper_id: str, index: int,
+                       executor: Optional[Executor] = None) -> str:
         """为单篇论文生成视频
         
         Args:
@@ -23,6 +113,7 @@ class VideoGenerator:
             audio_path: 音频文件路径
             paper_id: 论文ID
             index: 论文索引
+            executor: 执行编码的进程池，为None时在当前进程编码
             
         Returns:
             视频文件路径
@@ -30,46 +121,266 @@ class VideoGenerator:
         output_path = os.path.join(self.save_dir, f"video_{index+1:02d}_{paper_id}.mp4")
         
         try:
-            # 加载音频和图像
-            audio_clip = AudioFileClip(audio_path)
-            image_clip = ImageClip(poster_path).set_duration(audio_clip.duration)
+            # 海报、音频和编码参数未变化时直接复用缓存的视频
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.cache.make_key(
+                    paper_id,
+                    poster=self.cache.file_digest(poster_path),
+                    audio=self.cache.file_digest(audio_path),
+                    encode=self.encode_settings(),
+                )
+                if self.cache.fetch("video", cache_key, output_path):
+                    print(f"已从缓存复用论文 {paper_id} 的视频: {output_path}")
+                    return output_path
             
-            # 将图像和音频合成视频
-            video_clip = image_clip.set_audio(audio_clip)
+            with metrics.span("encode", paper=paper_id, mode=self.encode_mode):
+                if executor is not None:
+                    # 缓存在父进程中读写，编码进程只负责编码
+                    executor.submit(_encode_in_worker, self._worker_config(), poster_path, audio_path, output_path).result()
+                else:
+                    self._encode(poster_path, audio_path, output_path)
+            metrics.record_file("video", output_path)
             
-            # 导出视频
+            if cache_key is not None:
+                self.cache.store("video", cache_key, output_path)
+            
+            print(f"已为论文 {paper_id} 生成视频: {output_path}")
+            return output_path
+        
+        except Exception as e:
+            print(f"生成视频失败: {e}")
+            return None
+    
+    def _worker_config(self) -> Dict[str, Any]:
+        """编码进程重建生成器所需的参数，缓存不跨进程传递"""
+        return {"save_dir": self.save_dir, "encode_mode": self.encode_mode, "still_fps": self.still_fps,
+                "preset": self.preset, "crf": self.crf, "threads": self.threads}
+    
+    def _encode(self, poster_path: str, audio_path: str, output_path: str):
+        """按编码方式编码单篇视频"""
+        if self.encode_mode == "still":
+            self._encode_still(poster_path, audio_path, output_path)
+        else:
+            self._encode_moviepy(poster_path, audio_path, output_path)
+    
+    def _encode_still(self, poster_path: str, audio_path: str, output_path: str):
+        """直接调用ffmpeg将静态海报和音频编码为视频
+        
+        单张图片循环输入，使用x264的stillimage调优和低帧率，
+        音频直接从原文件读取编码，不经过临时文件。
+        """
+        subprocess.run([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-loop', '1', '-framerate', str(self.still_fps), '-i', poster_path,
+            '-i', audio_path,
+            '-map', '0:v', '-map', '1:a',
+            # libx264要求宽高为偶数
+            '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+            '-c:v', 'libx264', '-tune', 'stillimage', '-preset', self.preset, '-crf', str(self.crf),
+            '-pix_fmt', 'yuv420p', '-r', str(self.still_fps), '-threads', str(self.threads),
+            # 统一音频参数，保证后续可以直接拼接
+            '-c:a', 'aac', '-b:a', '128k', '-ar', '44100', '-ac', '2',
+            '-shortest', '-movflags', '+faststart',
+            output_path
+        ], check=True)
+    
+    def _encode_moviepy(self, poster_path: str, audio_path: str, output_path: str):
+        """使用moviepy逐帧渲染并编码视频"""
+        # moviepy.editor导入较慢，只在使用该编码方式时导入
+        from moviepy.editor import ImageClip, AudioFileClip
+        
+        # 加载音频和图像
+        audio_clip = AudioFileClip(audio_path)
+        image_clip = ImageClip(poster_path).set_duration(audio_clip.duration)
+        
+        # 将图像和音频合成视频
+        video_clip = image_clip.set_audio(audio_clip)
+        
+        # 导出视频，每个任务使用独立的临时音频文件，可以安全地并行编码
+        with tempfile.TemporaryDirectory(prefix="encode_") as temp_dir:
             video_clip.write_videofile(
                 output_path,
                 fps=24,
                 codec='libx264',
                 audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True
+                temp_audiofile=os.path.join(temp_dir, 'temp-audio.m4a'),
+                remove_temp=True,
+                threads=self.threads or None
             )
+    
+    def render_daily_report(self, poster_paths: List[str], audio_paths: List[str], paper_ids: List[str],
+                            split_clips: bool = False, name: Optional[str] = None,
+                            clip_indices: Optional[List[Optional[int]]] = None) -> Optional[str]:
+        """直接由海报和音频一次编码生成每日视频报告
+        
+        所有海报和音频作为输入，经同一个filtergraph按时间线拼接后只编码一次，
+        不再生成中间的单篇视频。需要单篇视频时，在每篇论文的起点强制插入关键帧，
+        再从报告中无损切出。
+        
+        Args:
+            poster_paths: 海报文件路径列表
+            audio_paths: 音频文件路径列表，与海报一一对应
+            paper_ids: 论文ID列表
+            split_clips: 是否同时切出每篇论文的单独视频
+            name: 报告名称（如类别），会加在文件名末尾，用于同一天生成多份报告
+            clip_indices: 切出的单篇视频使用的论文编号，为None的论文不切出，默认按报告中的顺序编号
             
-            print(f"已为论文 {paper_id} 生成视频: {output_path}")
-            return output_path
+        Returns:
+            每日视频报告路径，失败时返回None
+        """
+        output_path = self._report_path(name)
+        fps = self.still_fps
         
+        try:
+            # 以帧为单位对齐每段时长，保证音视频在每篇论文的边界处同步
+            durations = []
+            for audio_path in audio_paths:
+                frames = max(1, math.ceil(sf.info(audio_path).duration * fps))
+                durations.append(frames / fps)
+            starts = [sum(durations[:i]) for i in range(len(durations))]
+            
+            # 画布尺寸取第一张海报，其余海报等比缩放后居中
+            with Image.open(poster_paths[0]) as first_poster:
+                width, height = (first_poster.width // 2) * 2, (first_poster.height // 2) * 2
+            
+            inputs = []
+            filters = []
+            segments = []
+            for i, (poster_path, audio_path, duration) in enumerate(zip(poster_paths, audio_paths, durations)):
+                inputs += ['-loop', '1', '-framerate', str(fps), '-t', f"{duration:.3f}", '-i', poster_path,
+                           '-i', audio_path]
+                filters.append(
+                    f"[{2 * i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=white,setsar=1,fps={fps},format=yuv420p[v{i}]"
+                )
+                filters.append(
+                    f"[{2 * i + 1}:a]aresample=44100,aformat=channel_layouts=stereo,"
+                    f"apad=whole_dur={duration:.3f},atrim=0:{duration:.3f}[a{i}]"
+                )
+                segments.append(f"[v{i}][a{i}]")
+            filters.append(f"{''.join(segments)}concat=n={len(segments)}:v=1:a=1[v][a]")
+            
+            subprocess.run([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                *inputs,
+                '-filter_complex', ';'.join(filters),
+                '-map', '[v]', '-map', '[a]',
+                '-c:v', 'libx264', '-tune', 'stillimage', '-preset', self.preset, '-crf', str(self.crf),
+                # 不使用B帧，流复制切分时每篇论文的时间戳从关键帧开始连续
+                '-r', str(fps), '-bf', '0', '-force_key_frames', ','.join(f"{start:.3f}" for start in starts),
+                '-c:a', 'aac', '-b:a', '128k',
+                '-movflags', '+faststart',
+                output_path
+            ], check=True)
+            print(f"已一次编码生成每日视频报告: {output_path}")
         except Exception as e:
-            print(f"生成视频失败: {e}")
+            print(f"一次编码生成每日视频报告失败: {e}")
+            return None
+        
+        if split_clips:
+            if clip_indices is None:
+                clip_indices = list(range(len(paper_ids)))
+            for i, paper_id, start, duration in zip(clip_indices, paper_ids, starts, durations):
+                if i is None:
+                    continue
+                clip_path = os.path.join(self.save_dir, f"video_{i+1:02d}_{paper_id}.mp4")
+                try:
+                    # 论文起点处都是关键帧，可以直接流复制切分
+                    subprocess.run([
+                        'ffmpeg', '-y', '-loglevel', 'error',
+                        '-ss', f"{start:.3f}", '-i', output_path, '-t', f"{duration:.3f}",
+                        '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+                        clip_path
+                    ], check=True)
+                    print(f"已切出论文 {paper_id} 的视频: {clip_path}")
+                except Exception as e:
+                    print(f"切出论文 {paper_id} 的视频失败: {e}")
+        
+        return output_path
+    
+    def _report_path(self, name: Optional[str] = None) -> str:
+        """当天视频报告的路径"""
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        suffix = f"_{name}" if name else ""
+        return os.path.join(self.save_dir, f"daily_arxiv_report_{today}{suffix}.mp4")
+    
+    def render_renditions(self, input_path: str, renditions: List[Dict[str, Any]]) -> Optional[str]:
+        """在一次ffmpeg调用中把报告转成多种分辨率和码率
+        
+        输入只解码一次，解码后的画面经split分给各个输出分别缩放、补边和编码，
+        各编码器在ffmpeg内部并行运行；音频直接复制，所有输出共用同一条音轨。
+        完成后在报告旁边写入记录所有输出的清单文件。
+        
+        Args:
+            input_path: 报告视频路径
+            renditions: 输出规格列表，见parse_rendition
+            
+        Returns:
+            清单文件路径，失败时返回None
+        """
+        stem = os.path.splitext(input_path)[0]
+        outputs = []
+        filters = [f"[0:v]split={len(renditions)}" + "".join(f"[s{i}]" for i in range(len(renditions)))]
+        for i, rendition in enumerate(renditions):
+            width, height = rendition["width"], rendition["height"]
+            # 等比缩放后居中补白边，竖屏和方形输出同样适用
+            filters.append(
+                f"[s{i}]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=white,setsar=1,format=yuv420p[v{i}]"
+            )
+            outputs.append((rendition, f"{stem}_{rendition['name']}.mp4"))
+        
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-i', input_path, '-filter_complex', ';'.join(filters)]
+        for i, (rendition, output_path) in enumerate(outputs):
+            bitrate = rendition["video_bitrate"]
+            command += [
+                '-map', f'[v{i}]', '-map', '0:a?',
+                '-c:v', 'libx264', '-tune', 'stillimage', '-preset', self.preset,
+                '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate,
+                '-threads', str(self.threads),
+                '-c:a', 'copy', '-movflags', '+faststart',
+                output_path,
+            ]
+        
+        try:
+            subprocess.run(command, check=True)
+        except Exception as e:
+            print(f"生成多规格视频失败: {e}")
             return None
+        
+        manifest = {
+            "source": os.path.abspath(input_path),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "renditions": [
+                {**rendition, "path": os.path.abspath(output_path), "bytes": os.path.getsize(output_path)}
+                for rendition, output_path in outputs
+            ],
+        }
+        manifest_path = f"{stem}_renditions.json"
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        for rendition, output_path in outputs:
+            metrics.record_file("renditions", output_path)
+        print(f"已生成{len(outputs)}种规格的视频，清单: {manifest_path}")
+        return manifest_path
     
-    def combine_videos(self, video_paths: List[str]) -> str:
+    def combine_videos(self, video_paths: List[str], name: Optional[str] = None) -> str:
         """将多个视频合并为一个
         
         Args:
             video_paths: 视频文件路径列表
+            name: 报告名称（如类别），会加在文件名末尾，用于同一天生成多份报告
             
         Returns:
             合并后的视频文件路径
         """
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        output_path = os.path.join(self.save_dir, f"daily_arxiv_report_{today}.mp4")
+        output_path = self._report_path(name)
         
         try:
             # 使用FFmpeg合并视频
             # 创建一个包含所有视频文件的列表文件
-            list_file_path = os.path.join(self.save_dir, "video_list.txt")
+            list_file_path = os.path.splitext(output_path)[0] + "_list.txt"
             with open(list_file_path, 'w', encoding='utf-8') as f:
                 for video_path in video_paths:
                     if os.path.exists(video_path):
@@ -77,7 +388,7 @@ class VideoGenerator:
             
             # 使用FFmpeg合并视频
             subprocess.run([
-                'ffmpeg',
+                'ffmpeg', '-y',
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', list_file_path,
@@ -96,10 +407,10 @@ class VideoGenerator:
             
             # 尝试使用moviepy作为备用方案
             try:
+                from moviepy.editor import VideoFileClip, concatenate_videoclips
                 clips = []
                 for video_path in video_paths:
                     if os.path.exists(video_path):
-                        from moviepy.editor import VideoFileClip
                         clip = VideoFileClip(video_path)
                         clips.append(clip)
                 
@@ -1,24 +1,135 @@
 import os
+import gc
+import re
 import json
+import time
 import subprocess
+import threading
 import numpy as np
-from typing import Dict, Any
-import torch
-import torchaudio
+from typing import Dict, Any, List, Optional
 import soundfile as sf
+import metrics
+from artifact_cache import ArtifactCache
+from audio_postprocess import AudioPostProcessor
+
+# 句末标点，流式合成时按句切分文案
+SENTENCE_END = re.compile(r'(?<=[。！？；!?;\n])')
+
+def split_sentences(text: str, max_chars: int = 80) -> List[str]:
+    """将文案切分为适合逐段合成的句子
+    
+    Args:
+        text: 文案内容
+        max_chars: 单段最大字符数，过短的句子会与下一句合并，过长的句子按逗号再切分
+        
+    Returns:
+        句子列表
+    """
+    sentences = []
+    current = ""
+    for piece in SENTENCE_END.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if len(piece) > max_chars:
+            # 过长的句子按逗号再切分
+            piece_parts = [p for p in re.split(r'(?<=[，,、])', piece) if p]
+        else:
+            piece_parts = [piece]
+        for part in piece_parts:
+            if current and len(current) + len(part) > max_chars:
+                sentences.append(current)
+                current = ""
+            current += part
+            # 足够长的完整句子单独成段，尽快产出首段音频
+            if len(current) >= max_chars // 4 and current[-1] in "。！？；!?;":
+                sentences.append(current)
+                current = ""
+    if current:
+        sentences.append(current)
+    return sentences
 
 class VoiceGenerator:
-    def __init__(self, model_path: str = "pretrained_models/CosyVoice2-0.5B", save_dir: str = "audios"):
+    def __init__(self, model_path: str = "pretrained_models/CosyVoice2-0.5B", save_dir: str = "audios",
+                 prompt_wav: str = "./asset/zero_shot_prompt.wav", prompt_text: str = "希望你以后能够做的比我还好呦。",
+                 cache: Optional[ArtifactCache] = None, speaker: str = "default", speaker_file: Optional[str] = None,
+                 stream: bool = False, model: Any = None, postprocessor: Optional[AudioPostProcessor] = None,
+                 shards: Any = None):
         """初始化语音合成器
         
         Args:
             model_path: CosyVoice模型路径
             save_dir: 保存音频的目录
+            prompt_wav: zero-shot模式使用的参考音频
+            prompt_text: 参考音频对应的文本
+            cache: 跨运行的产物缓存，为None时不使用缓存
+            speaker: 默认使用的说话人名称，首次使用时用prompt_wav注册
+            speaker_file: 说话人特征文件，默认为模型目录下的spk2info.pt
+            stream: 是否按句切分文案并流式合成
+            model: 已构建的TTS模型，传入时不再加载CosyVoice，可用于替换为轻量的测试模型
+            postprocessor: 音频后处理，对包括备用方案在内的所有音频统一响度、采样率并裁剪静音，为None时不处理
+            shards: 分片合成器（tts_shards.ShardedSynthesizer），传入时由多个工作进程按句并行合成，
+                本进程不加载模型
         """
         self.model_path = model_path
         self.save_dir = save_dir
+        self.prompt_wav = prompt_wav
+        self.prompt_text = prompt_text
+        self.cache = cache
+        self.speaker = speaker
+        self.speaker_file = speaker_file or os.path.join(model_path, "spk2info.pt")
+        # 说话人注册表: 名称 -> 参考音频信息，特征本身保存在speaker_file中
+        self.speakers: Dict[str, Dict[str, Any]] = {}
+        self.stream = stream
+        self.postprocessor = postprocessor
+        self.shards = shards
+        # 每篇论文的分段合成耗时: 论文ID -> 每段的耗时记录
+        self.chunk_timings: Dict[str, List[Dict[str, Any]]] = {}
         os.makedirs(save_dir, exist_ok=True)
         
+        # CosyVoice在第一次合成时才加载，只运行部分阶段或全部命中缓存时不付出加载开销
+        self.model = None
+        self.model_loaded = False
+        self.default_prompt_speech = None
+        self.sample_rate = 24000  # 默认采样率
+        self._model_checked = False
+        self._model_lock = threading.RLock()
+        self._injected_model = model is not None
+        self._load_speaker_registry()
+        if model is not None:
+            self.model = model
+            self.model_loaded = True
+            self.sample_rate = getattr(model, "sample_rate", self.sample_rate)
+            self._model_checked = True
+    
+    def load_model(self):
+        """加载CosyVoice模型、默认提示音频和已注册的说话人，多次调用只加载一次"""
+        with self._model_lock:
+            if self._model_checked:
+                return
+            self._model_checked = True
+            self._load_model()
+    
+    def unload_model(self) -> bool:
+        """释放CosyVoice模型占用的内存，下次合成时重新加载，说话人特征已保存在speaker_file中
+        
+        Returns:
+            是否释放了模型，传入的模型和未加载的模型不会被释放
+        """
+        with self._model_lock:
+            if not self.model_loaded or self._injected_model:
+                return False
+            self.model = None
+            self.model_loaded = False
+            self.default_prompt_speech = None
+            self._model_checked = False
+        gc.collect()
+        print(f"已释放CosyVoice模型: {self.model_path}")
+        return True
+    
+    def _load_model(self):
+        model_path = self.model_path
+        
         # 尝试导入CosyVoice模块
         try:
             import sys
@@ -38,64 +149,165 @@ class VoiceGenerator:
             self.model_loaded = True
             self.sample_rate = self.model.sample_rate  # 通常是24000
             
-            # 加载默认提示音频
+            # 加载默认提示音频，CosyVoice的前端要求16kHz的参考音频
             try:
-                self.default_prompt_speech = self.load_wav('./asset/zero_shot_prompt.wav', self.sample_rate)
+                self.default_prompt_speech = self.load_wav(self.prompt_wav, 16000)
                 print("已加载默认提示音频")
             except Exception as e:
                 print(f"加载默认提示音频失败: {e}")
                 self.default_prompt_speech = None
+            
+            # 恢复已保存的说话人特征，并确保默认说话人已注册
+            self._load_speakers()
+            if self.default_prompt_speech is not None:
+                try:
+                    self.register_speaker(self.speaker, self.prompt_wav, self.prompt_text)
+                except Exception as e:
+                    print(f"注册默认说话人失败: {e}")
                 
         except ImportError as e:
             print(f"警告: 无法导入CosyVoice模块: {e}")
             self.model_loaded = False
             self.sample_rate = 24000  # 默认采样率
     
-    def generate_voice(self, script_path: str, paper_id: str, index: int) -> str:
+    def register_speaker(self, name: str, prompt_wav: str, prompt_text: str) -> bool:
+        """提取参考音频的说话人特征并保存到注册表
+        
+        特征（语音token、说话人向量等）只在参考音频或文本变化时重新提取，
+        之后的调用和后续运行都直接使用保存的特征。
+        
+        Args:
+            name: 说话人名称
+            prompt_wav: 参考音频路径
+            prompt_text: 参考音频对应的文本
+            
+        Returns:
+            是否重新提取了特征
+        """
+        self.load_model()
+        if not self.model_loaded or not hasattr(self.model, 'add_zero_shot_spk'):
+            raise RuntimeError("当前CosyVoice版本不支持说话人注册")
+        
+        info = self._speaker_info(prompt_wav, prompt_text)
+        if self.speakers.get(name) == info and name in self.model.frontend.spk2info:
+            return False
+        
+        prompt_speech = self.load_wav(prompt_wav, 16000)
+        self.model.add_zero_shot_spk(prompt_text, prompt_speech, name)
+        self.speakers[name] = info
+        self._save_speakers()
+        print(f"已注册说话人 {name}: {prompt_wav}")
+        return True
+    
+    def _load_speaker_registry(self):
+        """读取说话人注册表，不需要加载模型"""
+        meta_file = os.path.splitext(self.speaker_file)[0] + ".json"
+        if not os.path.exists(meta_file):
+            return
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                self.speakers = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取说话人注册表失败: {e}")
+            self.speakers = {}
+    
+    def _load_speakers(self):
+        """将保存的说话人特征加载到模型中"""
+        if not (self.speakers and os.path.exists(self.speaker_file)):
+            return
+        if not hasattr(self.model, 'frontend'):
+            return
+        try:
+            import torch
+            self.model.frontend.spk2info.update(torch.load(self.speaker_file, map_location='cpu'))
+            print(f"已加载{len(self.speakers)}个已注册的说话人")
+        except Exception as e:
+            print(f"加载说话人特征失败: {e}")
+            self.speakers = {}
+    
+    def _save_speakers(self):
+        """保存说话人特征和注册表
+        
+        先写临时文件再替换，分片合成的多个工作进程同时注册说话人时不会写坏文件。
+        """
+        meta_file = os.path.splitext(self.speaker_file)[0] + ".json"
+        import torch
+        os.makedirs(os.path.dirname(self.speaker_file) or ".", exist_ok=True)
+        temp_file = f"{self.speaker_file}.{os.getpid()}.tmp"
+        torch.save(self.model.frontend.spk2info, temp_file)
+        os.replace(temp_file, self.speaker_file)
+        temp_file = f"{meta_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.speakers, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, meta_file)
+    
+    @staticmethod
+    def _speaker_info(prompt_wav: str, prompt_text: str) -> Dict[str, Any]:
+        """说话人的参考音频信息，参考音频或文本变化时需要重新提取特征"""
+        return {
+            "prompt_wav": os.path.abspath(prompt_wav),
+            "prompt_text": prompt_text,
+            "mtime": os.path.getmtime(prompt_wav),
+        }
+    
+    def generate_voice(self, script_path: str, paper_id: str, index: int, speaker: Optional[str] = None) -> str:
         """为文案生成语音
         
         Args:
             script_path: 文案文件路径
             paper_id: 论文ID
             index: 论文索引
+            speaker: 使用的已注册说话人，默认为初始化时指定的说话人
             
         Returns:
             音频文件路径
         """
+        speaker = speaker or self.speaker
         # 读取文案
         with open(script_path, 'r', encoding='utf-8') as f:
             script = f.read()
         
         output_path = os.path.join(self.save_dir, f"audio_{index+1:02d}_{paper_id}.wav")
         
-        if self.model_loaded:
+        # 文案和参考音色未变化时直接复用缓存的音频
+        cache_key = None
+        if self.cache is not None:
+            # 默认说话人的信息直接由参考音频计算，缓存键与模型是否已加载无关
+            if speaker == self.speaker and os.path.exists(self.prompt_wav):
+                voice = self._speaker_info(self.prompt_wav, self.prompt_text)
+            else:
+                voice = self.speakers.get(speaker)
+            inputs = {"script": script, "model": self.model_path, "speaker": speaker, "voice": voice}
+            if self.postprocessor is not None:
+                inputs["postprocess"] = self.postprocessor.settings()
+            cache_key = self.cache.make_key(paper_id, **inputs)
+            if self.cache.fetch("voice", cache_key, output_path):
+                print(f"已从缓存复用论文 {paper_id} 的语音: {output_path}")
+                return output_path
+        
+        if self.shards is not None:
+            model_ready = self.shards.start()
+        else:
+            self.load_model()
+            model_ready = self.model_loaded
+        synthesized = False
+        if model_ready:
             try:
-                # 使用CosyVoice生成语音
-                if hasattr(self.model, 'inference_zero_shot') and self.default_prompt_speech is not None:
-                    # 使用zero-shot模式
-                    for i, result in enumerate(self.model.inference_zero_shot(
-                        script, 
-                        '希望你以后能够做的比我还好呦。', 
-                        self.default_prompt_speech, 
-                        stream=False
-                    )):
-                        # 只取第一个结果
-                        if i == 0:
-                            audio = result['tts_speech']
-                            torchaudio.save(output_path, audio, self.sample_rate)
-                            print(f"已为论文 {paper_id} 生成语音: {output_path}")
-                            break
-                elif hasattr(self.model, 'inference_sft'):
-                    # 使用SFT模式
-                    for i, result in enumerate(self.model.inference_sft(script, '中文男', stream=False)):
-                        # 只取第一个结果
-                        if i == 0:
-                            audio = result['tts_speech']
-                            torchaudio.save(output_path, audio, self.sample_rate)
-                            print(f"已为论文 {paper_id} 生成语音: {output_path}")
-                            break
-                else:
-                    raise Exception("不支持的CosyVoice模型类型")
+                # 使用CosyVoice生成语音，每段音频生成后立即追加写入文件
+                with metrics.span("tts", paper=paper_id, stream=self.stream):
+                    if self.shards is not None:
+                        # 各句分发给空闲的工作进程，按原顺序写入
+                        timings = self.shards.synthesize_to_file(split_sentences(script), speaker, output_path)
+                    elif self.stream:
+                        timings = self._synthesize_to_file(split_sentences(script), speaker, output_path, stream=True)
+                    else:
+                        timings = self._synthesize_to_file([script], speaker, output_path, stream=False)
+                metrics.record_file("voice", output_path)
+                self.chunk_timings[paper_id] = timings
+                audio_seconds = sum(t["audio_seconds"] for t in timings)
+                print(f"已为论文 {paper_id} 生成语音: {output_path} "
+                      f"({len(timings)}段, 共{audio_seconds:.1f}秒, 首段音频用时{timings[0]['first_audio_latency']:.2f}秒)")
+                synthesized = True
                 
             except Exception as e:
                 print(f"使用CosyVoice生成语音失败: {e}")
@@ -104,8 +316,89 @@ class VoiceGenerator:
             # 使用备用方案
             self._generate_fallback_audio(script, output_path)
         
+        if self.postprocessor is not None:
+            try:
+                with metrics.span("audio_postprocess", paper=paper_id):
+                    info = self.postprocessor.process(output_path)
+                print(f"已处理论文 {paper_id} 的音频: 裁剪{info['trimmed_seconds']:.1f}秒静音, "
+                      f"增益{info['gain_db']:+.1f}dB, 时长{info['seconds']:.1f}秒")
+            except Exception as e:
+                print(f"音频后处理失败，使用原始音频: {e}")
+        
+        # 备用音频不写入缓存，下次运行时重新尝试模型
+        if synthesized and cache_key is not None:
+            self.cache.store("voice", cache_key, output_path)
+        
         return output_path
     
+    def _inference(self, text: str, speaker: str, stream: bool):
+        """根据模型能力选择推理方式，返回CosyVoice推理结果的迭代器"""
+        if hasattr(self.model, 'inference_zero_shot') and speaker in self.speakers:
+            # 使用已注册说话人的特征，跳过参考音频的前端处理
+            return self.model.inference_zero_shot(text, '', '', zero_shot_spk_id=speaker, stream=stream)
+        if hasattr(self.model, 'inference_zero_shot') and self.default_prompt_speech is not None:
+            # 使用zero-shot模式
+            return self.model.inference_zero_shot(text, self.prompt_text, self.default_prompt_speech, stream=stream)
+        if hasattr(self.model, 'inference_sft'):
+            # 使用SFT模式
+            return self.model.inference_sft(text, '中文男', stream=stream)
+        raise Exception("不支持的CosyVoice模型类型")
+    
+    def synthesize_text(self, text: str, speaker: Optional[str] = None) -> np.ndarray:
+        """合成一段文本，返回单声道float32音频，采样率为self.sample_rate
+        
+        Raises:
+            RuntimeError: 模型未加载
+        """
+        self.load_model()
+        if not self.model_loaded:
+            raise RuntimeError("TTS模型未加载")
+        pieces = [self._to_numpy(result['tts_speech']) for result in self._inference(text, speaker or self.speaker, stream=False)]
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+    
+    @staticmethod
+    def _to_numpy(audio) -> np.ndarray:
+        if hasattr(audio, 'cpu'):
+            audio = audio.cpu().numpy()
+        return np.asarray(audio, dtype=np.float32).reshape(-1)
+    
+    def _synthesize_to_file(self, chunks: List[str], speaker: str, output_path: str, stream: bool) -> List[Dict[str, Any]]:
+        """逐段合成并追加写入WAV文件
+        
+        每段推理产出的音频立即写入磁盘后丢弃，内存占用与文案长度无关。
+        
+        Args:
+            chunks: 要合成的文本段
+            speaker: 说话人名称
+            output_path: 输出路径
+            stream: 是否使用CosyVoice的流式推理
+            
+        Returns:
+            每段文本的耗时记录
+        """
+        timings = []
+        start = time.perf_counter()
+        with sf.SoundFile(output_path, 'w', samplerate=self.sample_rate, channels=1, subtype='PCM_16') as f:
+            for chunk_index, text in enumerate(chunks):
+                chunk_start = time.perf_counter()
+                first_audio = None
+                samples = 0
+                for result in self._inference(text, speaker, stream=stream):
+                    audio = self._to_numpy(result['tts_speech'])
+                    f.write(audio)
+                    samples += len(audio)
+                    if first_audio is None:
+                        first_audio = time.perf_counter()
+                end = time.perf_counter()
+                timings.append({
+                    "chunk": chunk_index,
+                    "chars": len(text),
+                    "seconds": end - chunk_start,
+                    "first_audio_latency": (first_audio or end) - start,
+                    "audio_seconds": samples / self.sample_rate,
+                })
+        return timings
+    
     def _generate_fallback_audio(self, script: str, output_path: str):
         """生成备用音频（当CosyVoice不可用时）
         
@@ -137,6 +430,8 @@ class VoiceGenerator:
                 if os.path.exists(temp_txt):
                     os.remove(temp_txt)
             
+            metrics.count("fallback.system_tts")
+            metrics.record_file("voice", output_path)
             print(f"已使用系统TTS生成备用音频: {output_path}")
         except Exception as e:
             print(f"生成备用音频失败: {e}")
@@ -145,6 +440,8 @@ class VoiceGenerator:
             duration = 5  # 5秒
             silence = np.zeros(sample_rate * duration)
             sf.write(output_path, silence, sample_rate)
+            metrics.count("fallback.silent_audio")
+            metrics.record_file("voice", output_path)
             print(f"已生成静音音频: {output_path}")
 
 if __name__ == "__main__":
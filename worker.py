@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import argparse
+import datetime
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+from backends import current_rss_mb, peak_rss_mb
+from main import (STAGES, build_parser, create_cache, create_model_manager, create_registry, parse_renditions,
+                  parse_stages, run_daily)
+
+# 任务可以覆盖的参数，模型、设备、缓存等其余参数在工作进程启动时确定
+JOB_OPTIONS = {"category", "max_papers", "stages", "incremental", "single_pass", "split_clips", "papers_file",
+               "trace_file", "renditions", "download_pdfs"}
+# 表示文件路径的任务选项，只能指向任务目录之内，没有任务目录时不可用
+PATH_OPTIONS = {"papers_file", "trace_file"}
+# 任务选项的类型，取自命令行参数的默认值，默认值为None时取参数的type
+JOB_OPTION_TYPES = {action.dest: type(action.default) if action.default is not None else action.type
+                    for action in build_parser()._actions if action.dest in JOB_OPTIONS}
+# 保留的已完成任务数
+MAX_FINISHED_JOBS = 100
+
+class PaperWorker:
+    def __init__(self, args: argparse.Namespace, job_dir: Optional[str] = None, daily_at: Optional[str] = None,
+                 poll_interval: float = 5.0):
+        """初始化常驻工作进程
+
+        Stable Diffusion管线、CosyVoice模型和Ollama客户端只加载一次，之后的每个任务
+        直接复用，按需运行和定时运行都不再付出模型启动的时间。任务逐个执行。
+
+        Args:
+            args: main.py的命令行参数，作为每个任务的默认参数
+            job_dir: 任务目录，放入其中的JSON文件会被当作任务执行，为None时不监视
+            daily_at: 每天自动运行一次的时间（HH:MM），为None时不定时运行
+            poll_interval: 检查任务目录和定时任务的间隔（秒）
+        """
+        self.args = args
+        self.cache = create_cache(args)
+        self.registry = create_registry(args, self.cache)
+        # 管理器跨运行共用，预加载和每个任务都经过同一份内存预算
+        self.manager = create_model_manager(args, self.registry.get, self.registry, STAGES)
+        self.job_dir = job_dir
+        self.daily_at = datetime.datetime.strptime(daily_at, "%H:%M").time() if daily_at else None
+        self.poll_interval = poll_interval
+        self.started_at = time.time()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.current_job: Optional[str] = None
+        self.last_metrics: Optional[Dict[str, Any]] = None
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_scheduled: Optional[datetime.date] = None
+        if job_dir:
+            for sub_dir in ("processing", "done", "failed"):
+                os.makedirs(os.path.join(job_dir, sub_dir), exist_ok=True)
+
+    def preload(self, names: List[str]):
+        """预先加载后端和模型
+
+        设置了内存预算时，模型经过模型管理器加载，与已预加载的模型一起放不下预算的模型跳过，
+        留到任务中按需加载。
+
+        Args:
+            names: 要预加载的后端，可选 poster、script、voice、video
+        """
+        preloaded: List[str] = []
+        for name in names:
+            if name in ("poster", "voice") and self.manager is not None:
+                if not self.manager.fits(*preloaded, name):
+                    print(f"内存预算放不下 {name} 模型，跳过预加载")
+                    continue
+                preloaded.append(name)
+            instance = self.registry.get(name)
+            if name == "poster":
+                self._preload_model(name, instance)
+            elif name == "voice":
+                if instance.shards is not None:
+                    instance.shards.start()
+                else:
+                    self._preload_model(name, instance)
+            elif name == "script":
+                instance.warm_up()
+
+    def _preload_model(self, name: str, instance: Any):
+        if self.manager is None:
+            instance.load_model()
+            return
+        with self.manager.use(name):
+            pass
+
+    def submit(self, options: Dict[str, Any], source: str = "http", job_file: Optional[str] = None) -> Dict[str, Any]:
+        """提交一个任务
+
+        Args:
+            options: 覆盖默认参数的选项，见JOB_OPTIONS；也可以用papers直接给出论文列表。
+                PATH_OPTIONS中的路径相对于任务目录解析
+            source: 任务来源，http、job_dir或schedule
+            job_file: 任务目录中的任务文件，完成后移到done或failed目录
+
+        Returns:
+            任务信息
+
+        Raises:
+            ValueError: 选项不合法或类型与命令行参数不一致，或路径选项指向任务目录之外
+        """
+        unknown = set(options) - JOB_OPTIONS - {"papers"}
+        if unknown:
+            raise ValueError(f"不支持的任务选项: {', '.join(sorted(unknown))}")
+        for name, value in options.items():
+            expected = JOB_OPTION_TYPES.get(name)
+            # bool是int的子类，单独区分，避免max_papers接受true或开关选项接受1
+            if expected is not None and (isinstance(value, bool) != (expected is bool)
+                                         or not isinstance(value, expected)):
+                raise ValueError(f"任务选项{name}必须是{expected.__name__}类型")
+        options = dict(options)
+        for name in PATH_OPTIONS & set(options):
+            options[name] = self._resolve_job_path(name, options[name])
+        if "stages" in options:
+            parse_stages(options["stages"])
+        if "renditions" in options:
+            parse_renditions(options["renditions"])
+        if "papers" in options and not isinstance(options["papers"], list):
+            raise ValueError("papers必须是论文信息的列表")
+
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "source": source,
+            "options": {k: v for k, v in options.items() if k != "papers"},
+            "papers": options.get("papers"),
+            "submitted_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        if job_file:
+            job["file"] = job_file
+        with self._lock:
+            self.jobs[job["id"]] = job
+            self._prune_jobs()
+        self._queue.put(job["id"])
+        print(f"已接收任务 {job['id']}（来源: {source}）")
+        return self.job_info(job["id"])
+
+    def _resolve_job_path(self, name: str, value: Any) -> str:
+        """把任务给出的路径解析到任务目录之内，拒绝绝对路径、..和指向目录之外的符号链接"""
+        if not self.job_dir:
+            raise ValueError(f"{name}只能在设置了--job_dir时使用")
+        if not isinstance(value, str) or not value:
+            raise ValueError(f"{name}必须是任务目录中的相对路径")
+        base = os.path.realpath(self.job_dir)
+        path = os.path.realpath(os.path.join(base, value))
+        if os.path.isabs(value) or os.path.commonpath([base, path]) != base:
+            raise ValueError(f"{name}必须位于任务目录之内: {value}")
+        return path
+
+    def job_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """返回任务的状态和结果，不包含输入的论文列表"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k != "papers"}
+
+    def _prune_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def run_forever(self):
+        """逐个执行队列中的任务，直到stop被调用"""
+        threading.Thread(target=self._poll, name="worker-poll", daemon=True).start()
+        while not self._stop.is_set():
+            try:
+                job_id = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            self._run_job(job_id)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_job(self, job_id: str):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = "running"
+            job["started_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+            self.current_job = job_id
+
+        args = argparse.Namespace(**vars(self.args))
+        for key, value in job["options"].items():
+            setattr(args, key, value)
+        start = time.perf_counter()
+        try:
+            result = run_daily(args, registry=self.registry, cache=self.cache, papers=job["papers"],
+                               manager=self.manager)
+            self.last_metrics = result.pop("metrics", None)
+            status, job_result = "done", result
+        except Exception as e:
+            traceback.print_exc()
+            status, job_result = "failed", {"error": f"{type(e).__name__}: {e}"}
+
+        with self._lock:
+            job.update(status=status, result=job_result, seconds=time.perf_counter() - start,
+                       finished_at=datetime.datetime.now().isoformat(timespec="seconds"))
+            job["papers"] = None
+            self.current_job = None
+        print(f"任务 {job_id} {'完成' if status == 'done' else '失败'}，用时{job['seconds']:.1f}秒")
+        if job.get("file"):
+            self._finish_job_file(job)
+
+    def _poll(self):
+        """定期检查任务目录和每日定时任务"""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.job_dir:
+                    self._scan_job_dir()
+                if self.daily_at:
+                    self._check_schedule()
+            except Exception as e:
+                print(f"检查任务失败: {e}")
+
+    def _scan_job_dir(self):
+        for name in sorted(os.listdir(self.job_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.job_dir, name)
+            processing = os.path.join(self.job_dir, "processing", name)
+            try:
+                # 先移走再读取，避免同一个文件被提交两次
+                os.replace(path, processing)
+                with open(processing, 'r', encoding='utf-8') as f:
+                    options = json.load(f)
+                if not isinstance(options, dict):
+                    raise ValueError("任务必须是JSON对象")
+                self.submit(options, source="job_dir", job_file=processing)
+            except (OSError, ValueError) as e:
+                print(f"无效的任务文件 {name}: {e}")
+                if os.path.exists(processing):
+                    shutil.move(processing, os.path.join(self.job_dir, "failed", name))
+
+    def _finish_job_file(self, job: Dict[str, Any]):
+        """把任务文件移到done或failed目录，并在旁边写入结果"""
+        target_dir = os.path.join(self.job_dir, job["status"])
+        name = os.path.basename(job["file"])
+        shutil.move(job["file"], os.path.join(target_dir, name))
+        with open(os.path.join(target_dir, os.path.splitext(name)[0] + ".result.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.job_info(job["id"]), f, ensure_ascii=False, indent=2)
+
+    def _check_schedule(self):
+        now = datetime.datetime.now()
+        if now.time() >= self.daily_at and self._last_scheduled != now.date():
+            self._last_scheduled = now.date()
+            self.submit({}, source="schedule")
+
+    def health(self) -> Dict[str, Any]:
+        """工作进程的存活状态"""
+        with self._lock:
+            queued = sum(1 for job in self.jobs.values() if job["status"] == "queued")
+            current_job = self.current_job
+        return {
+            "status": "ok",
+            "uptime_seconds": time.time() - self.started_at,
+            "loaded_backends": [name for name in ("fetcher", "pdf", "poster", "script", "voice", "video")
+                                if self.registry.loaded(name) is not None],
+            "queued_jobs": queued,
+            "current_job": current_job,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        """工作进程的累计指标和最近一次运行的指标"""
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for job in self.jobs.values():
+                statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        return {
+            "jobs": statuses,
+            "backend_load": self.registry.load_stats,
+            "cache": self.cache.stats if self.cache is not None else None,
+            "rss_mb": current_rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "last_run": self.last_metrics,
+        }
+
+class _WorkerHandler(BaseHTTPRequestHandler):
+    worker: PaperWorker = None
+
+    def _send_json(self, status: int, body: Any):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, self.worker.health())
+        elif path == "/metrics":
+            self._send_json(200, self.worker.metrics())
+        elif path == "/jobs":
+            with self.worker._lock:
+                job_ids = list(self.worker.jobs)
+            self._send_json(200, [self.worker.job_info(job_id) for job_id in job_ids])
+        elif path.startswith("/jobs/"):
+            info = self.worker.job_info(path[len("/jobs/"):])
+            self._send_json(200 if info else 404, info or {"error": "任务不存在"})
+        else:
+            self._send_json(404, {"error": "未知的路径"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "未知的路径"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            options = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(options, dict):
+                raise ValueError("任务必须是JSON对象")
+            self._send_json(202, self.worker.submit(options))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(worker: PaperWorker, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """在后台线程中启动HTTP接口
+
+    Args:
+        worker: 工作进程
+        host: 监听地址，默认只接受本机连接
+        port: 监听端口
+
+    Returns:
+        HTTP服务对象
+    """
+    handler = type("WorkerHandler", (_WorkerHandler,), {"worker": worker})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="worker-http", daemon=True).start()
+    print(f"工作进程已在 http://{host}:{server.server_address[1]} 上等待任务")
+    return server
+
+def main():
+    parser = build_parser()
+    parser.description = "常驻的AI论文视频播报工作进程，模型只加载一次"
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="HTTP接口的监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP接口的监听端口")
+    parser.add_argument("--job_dir", type=str, default=None, help="任务目录，放入的JSON文件会被当作任务执行")
+    parser.add_argument("--daily_at", type=str, default=None, help="每天自动运行一次的时间，如08:00")
+    parser.add_argument("--preload", type=str, default="poster,script,voice", help="启动时预加载的后端，逗号分隔")
+    args = parser.parse_args()
+    try:
+        parse_stages(args.stages)
+        parse_renditions(args.renditions)
+    except ValueError as e:
+        parser.error(str(e))
+
+    worker = PaperWorker(args, job_dir=args.job_dir, daily_at=args.daily_at)
+    worker.preload([name.strip() for name in args.preload.split(",") if name.strip()])
+    server = serve(worker, args.host, args.port)
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        print("\n工作进程退出")
+    finally:
+        worker.stop()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()